@@ -0,0 +1,44 @@
+'''
+can be compiled by neo3-boa==0.8.2
+A minimal receiver of `flashLoan` in `ruler.py`, for tests and the fuzzer. DO NOT deploy it on the mainnet.
+It does nothing with the loan. The ruler transfers the loan and the fee back from this contract after `onFlashLoan`,
+    so this contract must hold enough tokens for the fee, and sign the transaction with a scope allowing the transfer.
+'''
+
+from typing import Any
+
+from boa3.builtin import NeoMetadata, metadata, public
+from boa3.builtin.type import UInt160
+
+
+# -------------------------------------------
+# METADATA
+# -------------------------------------------
+
+@metadata
+def manifest_metadata() -> NeoMetadata:
+    meta = NeoMetadata()
+    meta.author = "github.com/Hecate2"
+    meta.description = "Flash loan receiver for the tests of ruler"
+    meta.email = "chenxinhao@ngd.neo.org"
+    return meta
+
+
+# -------------------------------------------
+# Methods
+# -------------------------------------------
+
+
+@public
+def onFlashLoan(initiator: UInt160, token: UInt160, amount: int, fee: int, data: Any) -> bool:
+    """
+    Called by the ruler after transferring the loan to this contract
+    :return: True, to let the ruler take back the loan and the fee
+    """
+    return True
+
+
+@public
+def onNEP17Payment(from_address: UInt160, amount: int, data: Any):
+    # accept the loans and the funding for fees
+    pass
@@ -1 +1,2 @@
-from neo_test_with_vm.test_engine import TestEngine
\ No newline at end of file
+from neo_test_with_vm.test_engine import TestEngine
+from neo_test_with_vm.scenario_runner import run_scenarios, ScenarioResult
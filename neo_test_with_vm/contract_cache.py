@@ -0,0 +1,100 @@
+"""
+A process-wide cache of parsed contracts, so that constructing TestEngines many times for the same .nef and
+.manifest.json never parses them again. Refer to `TestEngine.contract_cache`
+"""
+import hashlib
+import json
+import os
+import pickle
+from typing import Dict, Tuple, Optional
+
+from neo3 import contracts
+
+ParsedContract = Tuple[bytes, dict, contracts.NEF, contracts.manifest.ContractManifest]
+
+
+def default_manifest_path(nef_path: str) -> str:
+    """
+    :return: {name}.manifest.json beside {name}.nef
+    """
+    file_path, fullname = os.path.split(nef_path)
+    nef_name, _ = os.path.splitext(fullname)
+    return os.path.join(file_path, nef_name + '.manifest.json')
+
+
+class ContractCache:
+    """
+    Parsed NEF and manifests, keyed by the sha256 of the contents of both files.
+        A recompiled contract gets a new key, so the cache never has to be invalidated.
+    The cached objects are shared by all the engines. Do not modify them.
+    :param cache_dir: if given, parsed contracts are also pickled into this directory, and reused between runs
+    """
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.contracts: Dict[str, ParsedContract] = dict()
+        self.hits = 0
+        self.misses = 0  # how many times the files were parsed
+
+    @staticmethod
+    def content_key(raw_nef: bytes, manifest_bytes: bytes) -> str:
+        return hashlib.sha256(len(raw_nef).to_bytes(8, 'little') + raw_nef + manifest_bytes).hexdigest()
+
+    def pickle_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def load(self, nef_path: str, manifest_path: str = '') -> ParsedContract:
+        """
+        :return: (raw nef, raw manifest, nef, manifest). Files are read to be hashed, but parsed only once
+        """
+        with open(nef_path, 'rb') as f:
+            raw_nef = f.read()
+        with open(manifest_path or default_manifest_path(nef_path), 'rb') as f:
+            manifest_bytes = f.read()
+        key = self.content_key(raw_nef, manifest_bytes)
+        parsed = self.contracts.get(key)
+        if parsed is not None:
+            self.hits += 1
+            return parsed
+        parsed = self.load_pickle(key)
+        if parsed is None:
+            self.misses += 1
+            raw_manifest = json.loads(manifest_bytes)
+            parsed = (raw_nef, raw_manifest, contracts.NEF.deserialize_from_bytes(raw_nef),
+                      contracts.manifest.ContractManifest.from_json(raw_manifest))
+            self.dump_pickle(key, parsed)
+        else:
+            self.hits += 1
+        self.contracts[key] = parsed
+        return parsed
+
+    def load_pickle(self, key: str) -> Optional[ParsedContract]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self.pickle_path(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None  # parse the files again, and overwrite the broken cache
+
+    def dump_pickle(self, key: str, parsed: ParsedContract):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.pickle_path(key)
+        temp_path = f'{path}.{os.getpid()}.tmp'  # other processes may read or write the same key
+        try:
+            with open(temp_path, 'wb') as f:
+                pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            print(f'Warning: unable to cache the parsed contract in {path}: {e}')
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def clear(self, remove_files: bool = False):
+        self.contracts.clear()
+        self.hits = self.misses = 0
+        if remove_files and self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pickle'):
+                    os.remove(os.path.join(self.cache_dir, name))
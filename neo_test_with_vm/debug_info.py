@@ -0,0 +1,69 @@
+import json
+import os
+import re
+import zipfile
+from bisect import bisect_right
+from typing import List, Dict, Tuple, Optional
+
+SEQUENCE_POINT = re.compile(r'(\d+)\[(\d+)\](\d+):(\d+)-(\d+):(\d+)')
+
+
+class DebugInfo:
+    """
+    Debug info of a contract emitted by the compiler, e.g. `neo3-boa compile ruler.py -d`.
+    Maps instruction pointers of the contract script to the methods and lines of its source files.
+    :param raw_debug_info: the parsed .debug.json
+    :param source_dir: where to look for the documents if their paths in the debug info do not exist
+    """
+    def __init__(self, raw_debug_info: dict, source_dir: str = ''):
+        self.documents: List[str] = [self.locate_document(document, source_dir)
+                                     for document in raw_debug_info.get('documents', [])]
+        self.method_starts: Dict[int, str] = dict()  # {offset: method name}
+        sequence_points: List[Tuple[int, int, int]] = []  # [(ip, document index, line)]
+        for method in raw_debug_info.get('methods', []):
+            start = int(method['range'].split('-')[0])
+            self.method_starts[start] = method['name'].split(',')[-1]
+            for sequence_point in method.get('sequence-points', []):
+                match = SEQUENCE_POINT.match(sequence_point)
+                if match:
+                    sequence_points.append((int(match.group(1)), int(match.group(2)), int(match.group(3))))
+        sequence_points.sort()
+        self._ips = [ip for ip, _, _ in sequence_points]
+        self._lines = [(document, line) for _, document, line in sequence_points]
+
+    @staticmethod
+    def locate_document(document: str, source_dir: str) -> str:
+        if os.path.exists(document) or not source_dir:
+            return document
+        return os.path.join(source_dir, os.path.basename(document.replace('\\', '/')))
+
+    @classmethod
+    def from_nef_path(cls, nef_path: str) -> Optional['DebugInfo']:
+        """
+        :return: debug info in {name}.nefdbgnfo (zipped) or {name}.debug.json beside {name}.nef,
+            or None if there is none
+        """
+        file_path, fullname = os.path.split(nef_path)
+        nef_name, _ = os.path.splitext(fullname)
+        zipped_path = os.path.join(file_path, nef_name + '.nefdbgnfo')
+        json_path = os.path.join(file_path, nef_name + '.debug.json')
+        if os.path.exists(zipped_path):
+            with zipfile.ZipFile(zipped_path) as f:
+                name = next(name for name in f.namelist() if name.endswith('.json'))
+                raw_debug_info = json.loads(f.read(name))
+        elif os.path.exists(json_path):
+            with open(json_path, 'r') as f:
+                raw_debug_info = json.loads(f.read())
+        else:
+            return None
+        return cls(raw_debug_info, file_path)
+
+    def source_line(self, ip: int) -> Optional[Tuple[str, int]]:
+        """
+        :return: (document, line) of the last sequence point at or before ip
+        """
+        i = bisect_right(self._ips, ip) - 1
+        if i < 0:
+            return None
+        document, line = self._lines[i]
+        return self.documents[document], line
@@ -0,0 +1,71 @@
+"""
+Decode VM stack items directly into Python objects, without any trip through strings
+"""
+from typing import Any, Iterator, Union
+
+from neo3 import vm, contracts
+from neo3.contracts import ContractParameterType
+from neo3.contracts.interop.enumerator import StorageIterator
+from neo3.core.types import UInt160, UInt256
+
+from tests.utils import Hash160Str, Hash256Str
+
+BYTES_TYPES = {vm.StackItemType.BYTESTRING, vm.StackItemType.BUFFER}
+ARRAY_TYPES = {vm.StackItemType.ARRAY, vm.StackItemType.STRUCT}
+
+
+def iterate_storage(iterator: StorageIterator) -> Iterator[Union[bytes, tuple]]:
+    """
+    Lazily go through the storage iterator returned by a contract (e.g. by `find` in `getFeesMap`),
+        without building stack items. The iterator is shared with the engine, and can only be consumed once.
+    :return: generator of (key, value) as bytes, or only keys or values, according to the FindOptions of the iterator
+    """
+    options = iterator.options
+    prefix_length = iterator.prefix_len if contracts.FindOptions.REMOVE_PREFIX in options else 0
+    if contracts.FindOptions.KEYS_ONLY in options:
+        return (k.key[prefix_length:] for k, _ in iterator.it)
+    if contracts.FindOptions.VALUES_ONLY in options:
+        return (v.value for _, v in iterator.it)
+    return ((k.key[prefix_length:], v.value) for k, v in iterator.it)
+
+
+def decode_bytes(value: bytes, return_type: ContractParameterType) -> Any:
+    if return_type == ContractParameterType.HASH160:
+        return Hash160Str.from_UInt160(UInt160(value))
+    if return_type == ContractParameterType.HASH256:
+        return Hash256Str.from_UInt256(UInt256(value))
+    if return_type == ContractParameterType.STRING:
+        return value.decode()
+    if return_type == ContractParameterType.INTEGER:
+        return int.from_bytes(value, 'little', signed=True)
+    if return_type == ContractParameterType.BOOLEAN:
+        return any(value)
+    return value
+
+
+def decode_stack_item(item: vm.StackItem, return_type: ContractParameterType = ContractParameterType.ANY) -> Any:
+    """
+    :param item: a result of an engine
+    :param return_type: the return type in the contract manifest, for items returned as bytes (e.g. Hash160).
+        Items in arrays and maps are decoded by their own types
+    :return: int for Integer, bool for Boolean, bytes for ByteString or Buffer unless return_type says otherwise,
+        list for Array or Struct, dict for Map, None for Null,
+        a lazy generator for storage iterators (refer to `iterate_storage`), or the object of other InteropInterfaces
+    """
+    item_type = item.get_type()
+    if item_type == vm.StackItemType.INTEGER:
+        return int(item.to_biginteger())
+    if item_type in BYTES_TYPES:
+        return decode_bytes(item.to_array(), return_type)
+    if item_type == vm.StackItemType.BOOLEAN:
+        return item.to_boolean()
+    if item_type in ARRAY_TYPES:
+        return [decode_stack_item(i) for i in item]
+    if item_type == vm.StackItemType.MAP:
+        return {decode_stack_item(k): decode_stack_item(v) for k, v in zip(item.keys(), item.values())}
+    if isinstance(item, vm.NullStackItem):
+        return None
+    if isinstance(item, vm.InteropStackItem):
+        obj = item.get_object()
+        return iterate_storage(obj) if isinstance(obj, StorageIterator) else obj
+    return item
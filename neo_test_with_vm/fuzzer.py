@@ -0,0 +1,466 @@
+"""
+Randomized invariant fuzzer of the state transitions of ruler, on top of TestEngine.
+Random sequences of addPair/deposit/mmDeposit/repay/redeem/collect/flashLoan/collectFee/settle,
+    and moves of the virtual clock, are executed by many accounts on many pairs.
+    Economic invariants are checked after the steps (refer to `INVARIANTS`).
+    A failing sequence is shrunk to a minimal reproduction, by replaying parts of it from the state after setup.
+Faulted steps are expected (e.g. repaying more than borrowed), and their state changes are discarded
+    like on the blockchain (refer to `TestEngine.rollback_faults`).
+Amounts are biased to edge values like 1 and DECIMAL_BASE +- 1, to stress the rounding of
+    `_getRTokenAmtFromColAmt`, `_getColAmtFromRTokenAmt` and the fees.
+Flash loans are received by `flashLoanReceiver.py`, deployed and funded in setup. Compile it beside `ruler.py`.
+The state for the invariants is read directly from the storage (refer to `storage_layout`), without executing any script.
+    About 10,000 steps per minute are executed with the invariants checked after every step,
+    with the default 8 accounts and 2 to 6 pairs on a single core.
+
+Command line:
+    python -m neo_test_with_vm.fuzzer --steps 20000 --seed 1
+"""
+from typing import List, Dict, Tuple, Callable, Optional, Any
+import argparse
+import random
+import time
+
+from neo3 import vm
+from neo3.contracts import NeoToken, GasToken
+from neo3.core import types
+from neo3.core.types import UInt160
+
+from neo_test_with_vm.test_engine import TestEngine, PreparedCall
+from neo_test_with_vm.storage_layout import PAIR_TOKEN_ATTRIBUTES
+
+DECIMAL_BASE = 100_000_000
+START_TIME = 1_700_000_000_000  # virtual time in milliseconds after setup, so that runs do not depend on the clock
+neo, gas = NeoToken(), GasToken()
+TOKENS = [neo.hash, gas.hash]
+
+Action = Tuple[str, tuple]  # (name, args), e.g. ('deposit', (account, pair, amount)). Refer to `RulerFuzzer.apply`
+PAIR_METHODS = {  # actions on a pair, by the account, with an amount
+    'deposit': 'depositByIndex',
+    'mmDeposit': 'mmDepositByIndex',
+    'repay': 'repayByIndex',
+    'redeem': 'redeemByIndex',
+    'collect': 'collectByIndex',
+}
+ACTION_WEIGHTS = {
+    'deposit': 20, 'mmDeposit': 8, 'repay': 12, 'redeem': 10, 'collect': 12,
+    'flashLoan': 3, 'collectFee': 3, 'settle': 2, 'addPair': 2, 'advance': 4,
+}
+EDGE_AMOUNTS = (-1, 0, 1, 2, 3, 7, 99, DECIMAL_BASE - 1, DECIMAL_BASE, DECIMAL_BASE + 1)
+MINT_RATIOS = (7 * DECIMAL_BASE, DECIMAL_BASE // 3, 3 * DECIMAL_BASE + 1, DECIMAL_BASE, 1)
+ADVANCE_SECONDS = (60, 3600, 86400, 7 * 86400)
+
+
+class FuzzState:
+    """
+    The state of ruler read after a step
+    """
+    def __init__(self, pairs: List[Dict[str, Any]], balances: Dict[Tuple[bytes, bytes], int],
+                 ruler_balances: Dict[bytes, int], fees: Dict[bytes, int]):
+        """
+        :param pairs: the fields of getPairSnapshot of each pair, with tokens as bytes. Refer to `RulerFuzzer.read_pair`
+        :param balances: {(token, account): balance} of the accounts, in collateral, paired, rc and rr tokens
+        :param ruler_balances: {token: balance} of ruler, in collateral and paired tokens
+        :param fees: {token: amount} in feesMap
+        """
+        self.pairs = pairs
+        self.balances = balances
+        self.ruler_balances = ruler_balances
+        self.fees = fees
+
+
+def rTokenAmtFromColAmt(pair: Dict[str, Any], colAmt: int) -> int:
+    """
+    the same as `_getRTokenAmtFromColAmt` in ruler.py
+    """
+    return colAmt * pair['mintRatio'] * pair['colToRMultiplier'] // pair['colToRDivisor']
+
+
+def colAmtFromRTokenAmt(pair: Dict[str, Any], rTokenAmt: int) -> int:
+    """
+    the same as `_getColAmtFromRTokenAmt` in ruler.py
+    """
+    return rTokenAmt * pair['rToColMultiplier'] // (pair['mintRatio'] * pair['rToColDivisor'])
+
+
+def no_negative_balances(state: FuzzState) -> str:
+    for (token, account), balance in state.balances.items():
+        if balance < 0:
+            return f'account {account.hex()} holds {balance} of token {token.hex()}'
+    for token, balance in state.ruler_balances.items():
+        if balance < 0:
+            return f'ruler holds {balance} of token {token.hex()}'
+    for token, amount in state.fees.items():
+        if amount < 0:
+            return f'fees of token {token.hex()} is {amount}'
+    for pair in state.pairs:
+        for field in ('colTotal', 'rcTotalSupply', 'rrTotalSupply'):
+            if pair[field] < 0:
+                return f'{field} of pair {pair["index"]} is {pair[field]}'
+    return ''
+
+
+def rToken_supplies_backed(state: FuzzState) -> str:
+    """
+    rrTokens are only minted with collateral, and no rcToken is burned before expiry without an rrToken
+    """
+    for pair in state.pairs:
+        rc, rr, colTotal = pair['rcTotalSupply'], pair['rrTotalSupply'], pair['colTotal']
+        if rr > rTokenAmtFromColAmt(pair, colTotal):
+            return f'pair {pair["index"]}: rr supply {rr} > rTokens of colTotal {colTotal}'
+        if not pair['expired'] and rr > rc:
+            return f'pair {pair["index"]}: rr supply {rr} > rc supply {rc} before expiry'
+        if pair['settled'] and pair['defaultedLoanAmt'] > pair['rcTokensEligibleAtExpiry']:
+            return f'pair {pair["index"]}: defaultedLoanAmt {pair["defaultedLoanAmt"]} ' \
+                   f'> rcTokensEligibleAtExpiry {pair["rcTokensEligibleAtExpiry"]}'
+    return ''
+
+
+def token_solvency(state: FuzzState) -> str:
+    """
+    ruler holds enough of each token for feesMap plus everything that can still be claimed:
+        before expiry, collateral for all the rrTokens to be repaid, and paired tokens for the rcTokens not backed by rrTokens
+        after expiry, the paired tokens and collateral for all the rcTokens to be collected
+    Paired tokens are paid after fees, which have been accrued into feesMap already.
+        Collateral is paid after fees, which are accrued into feesMap when paid.
+    """
+    obligations: Dict[bytes, int] = dict()
+    for pair in state.pairs:
+        rc, rr = pair['rcTotalSupply'], pair['rrTotalSupply']
+        if pair['expired']:
+            defaulted = pair['defaultedLoanAmt'] if pair['settled'] else rr
+            eligible = pair['rcTokensEligibleAtExpiry'] if pair['settled'] \
+                else rTokenAmtFromColAmt(pair, pair['colTotal'])
+            paired_owed = rc * (eligible - defaulted) // eligible if eligible > 0 else 0
+            col_owed = colAmtFromRTokenAmt(pair, rc) * defaulted // eligible if eligible > 0 else 0
+        else:
+            paired_owed = rc - rr
+            col_owed = colAmtFromRTokenAmt(pair, rr)
+        paired_owed -= paired_owed * pair['feeRate'] // DECIMAL_BASE
+        obligations[pair['pairedToken']] = obligations.get(pair['pairedToken'], 0) + paired_owed
+        obligations[pair['collateralToken']] = obligations.get(pair['collateralToken'], 0) + col_owed
+    for token, balance in state.ruler_balances.items():
+        fees, owed = state.fees.get(token, 0), obligations.get(token, 0)
+        if balance < fees + owed:
+            return f'ruler holds {balance} of token {token.hex()} < fees {fees} + obligations {owed}'
+    return ''
+
+
+Invariant = Callable[[FuzzState], str]  # returns a message if violated, else ''
+INVARIANTS: List[Invariant] = [no_negative_balances, rToken_supplies_backed, token_solvency]
+
+
+class Violation:
+    def __init__(self, invariant: str, message: str, actions: List[Action], shrunk: List[Action]):
+        """
+        :param invariant: name of the violated invariant
+        :param message: what is violated, after the last of `shrunk`
+        :param actions: all the steps executed until the violation was found
+        :param shrunk: a minimal sequence of steps from the state after setup, still violating the invariant
+        """
+        self.invariant = invariant
+        self.message = message
+        self.actions = actions
+        self.shrunk = shrunk
+
+    def __repr__(self):
+        steps = ''.join(f'\n    {action},' for action in self.shrunk)
+        return f'Violation of {self.invariant} after {len(self.actions)} steps: {self.message}\n' \
+               f'  minimal reproduction ({len(self.shrunk)} steps): [{steps}\n  ]'
+
+
+class FuzzReport:
+    def __init__(self, steps: int, halted_actions: Dict[str, int], seconds: float, violation: Optional[Violation]):
+        """
+        :param halted_actions: {name of action: how many steps of it HALTed}
+        """
+        self.steps = steps
+        self.halted_actions = halted_actions
+        self.halted = sum(halted_actions.values())
+        self.seconds = seconds
+        self.violation = violation
+
+    def __repr__(self):
+        halted = ', '.join(f'{name} {count}' for name, count in sorted(self.halted_actions.items()))
+        result = f'{self.steps} steps ({self.halted} HALT: {halted}) in {self.seconds:.1f}s, ' \
+                 f'{self.steps / max(self.seconds, 1e-9) * 60:.0f} steps per minute'
+        if self.violation:
+            result += f'\n{self.violation}'
+        return result
+
+
+class RulerFuzzer:
+    def __init__(self, nef_path: str = 'ruler.nef', accounts: int = 8, pairs: int = 2, max_pairs: int = 6,
+                 fee_rates: Tuple[int, ...] = (0, DECIMAL_BASE // 200), flash_loan_rate: int = DECIMAL_BASE // 1000,
+                 flash_loan_receiver: Optional[str] = 'flashLoanReceiver.nef', invariants: List[Invariant] = None,
+                 check_every: int = 1, seed: int = None):
+        """
+        :param accounts: how many funded accounts act randomly
+        :param pairs: pairs added in setup. More pairs may be added by the random steps, up to max_pairs
+        :param fee_rates: fee rates of the pairs, chosen randomly
+        :param flash_loan_receiver: nef path of a contract with `onFlashLoan`, e.g. flashLoanReceiver.py.
+            It is deployed and funded in setup, and signs the flash loans, so that the ruler can take back the loans.
+            None to lend to the accounts instead, which is expected to fault
+        :param invariants: default to INVARIANTS
+        :param check_every: check invariants every this many steps (and after the last step), for higher throughput.
+            Shrinking always checks after every step
+        """
+        self.rng = random.Random(seed)
+        self.fee_rates = fee_rates
+        self.max_pairs = max_pairs
+        self.invariants = invariants or INVARIANTS
+        self.check_every = check_every
+        self.owner = types.UInt160(b'\x6d' * 20)
+        self.accounts = [types.UInt160((i + 1).to_bytes(20, 'little')) for i in range(accounts)]
+        self.engine = TestEngine(nef_path, signers=[self.owner])
+        self.engine.rollback_faults = True
+        self.ruler = self.engine.contract.hash
+        self.ruler_storage = self.engine.ruler_storage()
+        self._prepared_calls: Dict[Tuple[str, int], PreparedCall] = dict()
+        self.pairs: List[Dict[str, Any]] = []  # {'index', 'rcToken', 'rrToken', 'rcStorage', 'rrStorage'}
+
+        engine = self.engine
+        self.flash_loan_receiver = engine.deploy_another_contract(flash_loan_receiver) if flash_loan_receiver else None
+        engine.set_time(START_TIME)
+        engine.invoke_method('deploy', [self.owner])
+        engine.invoke_method('setFlashLoanRate', [flash_loan_rate])
+        funded = self.accounts + ([self.flash_loan_receiver] if self.flash_loan_receiver else [])
+        engine.set_NEP17_token_balances([(token, account, amount) for account in funded
+                                         for token, amount in ((neo, 1_000_000), (gas, 2_000_000_000))])
+        for _ in range(10 * pairs):
+            if len(self.pairs) >= pairs:
+                break
+            self.apply(self.random_add_pair())  # faults if the random pair exists
+        assert len(self.pairs) == pairs, f'Failed to add pairs: {engine.fault_messages}'
+        self.setup_pairs = list(self.pairs)
+        self.setup_checkpoint = engine.checkpoint()
+
+    def reset(self):
+        """
+        go back to the state after setup
+        """
+        self.engine.restore(self.setup_checkpoint)
+        self.engine.fault_messages.clear()
+        self.pairs = list(self.setup_pairs)
+
+    def prepared_call(self, method: str, account: int = -1) -> PreparedCall:
+        """
+        :param account: index in self.accounts of the signer; -1 for the owner of ruler
+        """
+        call = self._prepared_calls.get((method, account))
+        if call is None:
+            signers = [self.owner if account < 0 else self.accounts[account]]
+            if method == 'flashLoan' and self.flash_loan_receiver:
+                signers.append(self.flash_loan_receiver)  # to transfer the loan and the fee back to the ruler
+            call = self._prepared_calls[(method, account)] = self.engine.prepare(method, signers=signers)
+        return call
+
+    def random_amount(self) -> int:
+        if self.rng.random() < 0.3:
+            return self.rng.choice(EDGE_AMOUNTS)
+        return self.rng.randint(1, 10 ** self.rng.randint(1, 9))
+
+    def random_add_pair(self) -> Action:
+        return 'addPair', (self.rng.randrange(len(TOKENS)), self.rng.randrange(len(MINT_RATIOS)),
+                           self.rng.randrange(len(self.fee_rates)), self.rng.randint(3600, 30 * 86400))
+
+    def random_action(self) -> Action:
+        name = self.rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+        account = self.rng.randrange(len(self.accounts))
+        if name in PAIR_METHODS:
+            return name, (account, self.rng.randrange(self.max_pairs), self.random_amount())
+        if name == 'flashLoan':
+            return name, (account, self.rng.randrange(len(TOKENS)), self.random_amount())
+        if name == 'collectFee':
+            return name, (self.rng.randrange(len(TOKENS)),)
+        if name == 'settle':
+            return name, (self.rng.randrange(self.max_pairs),)
+        if name == 'addPair':
+            return self.random_add_pair()
+        return 'advance', (self.rng.choice(ADVANCE_SECONDS),)
+
+    def apply(self, action: Action) -> vm.VMState:
+        """
+        Execute a step. Steps on pairs refer to self.pairs modulo its length, so that they are still valid
+            when the pairs they used to refer to are removed by shrinking
+        """
+        name, args = action
+        engine = self.engine
+        if name == 'advance':
+            engine.advance(args[0])
+            return vm.VMState.HALT
+        if name in PAIR_METHODS or name == 'settle':
+            if not self.pairs:
+                return vm.VMState.FAULT
+        if name in PAIR_METHODS:
+            account, pair, amount = args
+            pair_index = self.pairs[pair % len(self.pairs)]['index']
+            return self.prepared_call(PAIR_METHODS[name], account)(self.accounts[account], pair_index, amount).state
+        if name == 'flashLoan':
+            account, token, amount = args
+            receiver = self.flash_loan_receiver or self.accounts[account]
+            return self.prepared_call(name, account)(receiver, TOKENS[token], amount, b'fuzz').state
+        if name == 'collectFee':
+            return self.prepared_call(name)(TOKENS[args[0]]).state
+        if name == 'settle':
+            return self.prepared_call(name)(self.pairs[args[0] % len(self.pairs)]['index']).state
+        if name == 'addPair':
+            if len(self.pairs) >= self.max_pairs:
+                return vm.VMState.HALT
+            col, mint_ratio, fee_rate, expiry_seconds = args
+            expiry = engine.time + expiry_seconds * 1000
+            mint_ratio = MINT_RATIOS[mint_ratio]
+            executed_engine = self.prepared_call(name)(TOKENS[col], TOKENS[1 - col], expiry, str(expiry),
+                                                       mint_ratio, str(mint_ratio), self.fee_rates[fee_rate])
+            if executed_engine.state == vm.VMState.HALT:
+                pair_index = self.stack_item_to_int(executed_engine.result_stack.peek())
+                pair = self.ruler_storage.pair(pair_index)
+                rcToken, rrToken = pair['rcToken'].to_UInt160(), pair['rrToken'].to_UInt160()
+                self.pairs.append({'index': pair_index, 'rcToken': rcToken, 'rrToken': rrToken,
+                                   'rcStorage': engine.rToken_storage(rcToken),
+                                   'rrStorage': engine.rToken_storage(rrToken)})
+            return executed_engine.state
+        raise ValueError(f'Unknown action {action}')
+
+    @staticmethod
+    def stack_item_to_int(item: vm.StackItem) -> int:
+        return int.from_bytes(item.to_array(), 'little', signed=True)
+
+    def read_pair(self, pair: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        The same fields as `getPairSnapshot`, read directly from the storage
+        :param pair: an item of self.pairs
+        :return: {field: value}, with tokens as bytes
+        """
+        snapshot = {attribute: value.to_UInt160().to_array() if attribute in PAIR_TOKEN_ATTRIBUTES else value
+                    for attribute, value in self.ruler_storage.pair(pair['index']).items()}
+        snapshot['index'] = pair['index']
+        snapshot['rcTotalSupply'] = pair['rcStorage'].total_supply()
+        snapshot['rrTotalSupply'] = pair['rrStorage'].total_supply()
+        snapshot['pairedFees'] = self.ruler_storage.fees(snapshot['pairedToken'])
+        snapshot['expired'] = self.engine.time > snapshot['expiry']
+        return snapshot
+
+    def read_state(self) -> FuzzState:
+        """
+        Read everything for the invariants directly from the storage, without executing any script
+        """
+        engine = self.engine
+        pairs = [self.read_pair(pair) for pair in self.pairs]
+        ruler_balances = {token.to_array(): engine.read_NEP17_token_balance(token, self.ruler) for token in TOKENS}
+        fees = {token.to_array(): self.ruler_storage.fees(token) for token in TOKENS}
+        balances = dict()
+        for account in self.accounts:
+            for token in TOKENS:
+                balances[(token.to_array(), account.to_array())] = engine.read_NEP17_token_balance(token, account)
+            for pair in self.pairs:
+                for leg in ('rc', 'rr'):
+                    balances[(pair[leg + 'Token'].to_array(), account.to_array())] = \
+                        pair[leg + 'Storage'].balance_of(account)
+        return FuzzState(pairs, balances, ruler_balances, fees)
+
+    def check(self) -> Optional[Tuple[str, str]]:
+        """
+        :return: (name of the first violated invariant, message), or None
+        """
+        state = self.read_state()
+        for invariant in self.invariants:
+            message = invariant(state)
+            if message:
+                return invariant.__name__, message
+        return None
+
+    def run(self, steps: int, shrink: bool = True) -> FuzzReport:
+        """
+        Execute random steps from the state after setup, until an invariant is violated
+        """
+        self.reset()
+        actions: List[Action] = []
+        halted_actions: Dict[str, int] = dict()
+        start = time.perf_counter()
+        for step in range(steps):
+            action = self.random_action()
+            actions.append(action)
+            if self.apply(action) == vm.VMState.HALT:
+                halted_actions[action[0]] = halted_actions.get(action[0], 0) + 1
+            if (step + 1) % self.check_every == 0 or step + 1 == steps:
+                failure = self.check()
+                if failure:
+                    invariant, message = failure
+                    seconds = time.perf_counter() - start
+                    shrunk = self.shrink(actions, invariant) if shrink else actions
+                    message = (self.replay(shrunk)[2] if shrink else '') or message
+                    return FuzzReport(step + 1, halted_actions, seconds, Violation(invariant, message, actions, shrunk))
+        return FuzzReport(steps, halted_actions, time.perf_counter() - start, None)
+
+    def replay(self, actions: List[Action]) -> Tuple[int, str, str]:
+        """
+        Execute the steps from the state after setup, checking the invariants after each step
+        :return: (number of steps executed until an invariant is violated, name of the invariant, message),
+            or (len(actions), '', '') if no invariant is violated
+        """
+        self.reset()
+        for step, action in enumerate(actions):
+            self.apply(action)
+            failure = self.check()
+            if failure:
+                return step + 1, failure[0], failure[1]
+        return len(actions), '', ''
+
+    def shrink(self, actions: List[Action], invariant: str, max_replays: int = 500) -> List[Action]:
+        """
+        Remove steps and lower amounts, as long as the same invariant is still violated
+        """
+        replays = 0
+
+        def fails(candidate: List[Action]) -> int:
+            """
+            :return: the number of steps to violate the invariant, or 0
+            """
+            nonlocal replays
+            replays += 1
+            steps, violated, _ = self.replay(candidate)
+            return steps if violated == invariant else 0
+
+        steps = fails(actions)
+        if not steps:
+            return actions  # not reproducible, e.g. only violated between checks with check_every > 1
+        actions = actions[:steps]
+        chunk = max(len(actions) // 2, 1)
+        while chunk >= 1 and replays < max_replays:
+            i = 0
+            while i < len(actions) and replays < max_replays:
+                candidate = actions[:i] + actions[i + chunk:]
+                steps = fails(candidate) if candidate else 0
+                if steps:
+                    actions = candidate[:steps]
+                else:
+                    i += chunk
+            chunk //= 2
+        for i, (name, args) in enumerate(actions):
+            if name not in PAIR_METHODS and name != 'flashLoan':
+                continue
+            for smaller in (1, args[-1] // 2):
+                if replays >= max_replays or not 0 < smaller < args[-1]:
+                    continue
+                candidate = actions[:i] + [(name, args[:-1] + (smaller,))] + actions[i + 1:]
+                if fails(candidate):
+                    actions = candidate
+                    args = actions[i][1]
+        return actions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Randomized invariant fuzzer of ruler')
+    parser.add_argument('--nef', default='ruler.nef')
+    parser.add_argument('--flash-loan-receiver', default='flashLoanReceiver.nef')
+    parser.add_argument('--steps', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--accounts', type=int, default=8)
+    parser.add_argument('--pairs', type=int, default=2)
+    parser.add_argument('--check-every', type=int, default=1)
+    parser.add_argument('--no-shrink', action='store_true')
+    args = parser.parse_args()
+    fuzzer = RulerFuzzer(args.nef, accounts=args.accounts, pairs=args.pairs,
+                         flash_loan_receiver=args.flash_loan_receiver, check_every=args.check_every, seed=args.seed)
+    print(fuzzer.run(args.steps, shrink=not args.no_shrink))
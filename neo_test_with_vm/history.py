@@ -0,0 +1,63 @@
+"""
+Compact records of executed invocations, kept by TestEngine instead of the engines themselves.
+Refer to `TestEngine.history`
+"""
+from typing import Any, List, Tuple
+
+from neo3 import vm
+from neo3.contracts import ApplicationEngine
+
+from neo_test_with_vm.decoder import decode_stack_item
+from tests.utils import Hash160Str
+
+
+def compact_stack_item(item: vm.StackItem) -> Any:
+    """
+    Decode a stack item into plain Python objects that do not refer to the engine.
+        InteropInterfaces (e.g. storage iterators) are only read once and bound to their engines,
+        so they are recorded by their type names
+    """
+    if isinstance(item, vm.InteropStackItem):
+        return type(item.get_object()).__name__
+    if isinstance(item, (vm.ArrayStackItem, vm.StructStackItem)):
+        return [compact_stack_item(i) for i in item]
+    if isinstance(item, vm.MapStackItem):
+        return {compact_stack_item(k): compact_stack_item(v) for k, v in zip(item.keys(), item.values())}
+    return decode_stack_item(item)
+
+
+class InvocationRecord:
+    """
+    What remains of an executed engine: state, GAS, results, notifications and exception.
+        Results and the states of notifications are decoded by `compact_stack_item`
+    """
+    __slots__ = ('method', 'state', 'gas_consumed', 'results', 'notifications', 'exception')
+
+    def __init__(self, method: str, state: vm.VMState, gas_consumed: int, results: List[Any],
+                 notifications: List[Tuple[Hash160Str, str, Any]], exception: str = ''):
+        self.method = method
+        self.state = state
+        self.gas_consumed = gas_consumed
+        self.results = results  # the result stack, the top at the end
+        self.notifications = notifications  # [(contract hash, event name, state)]
+        self.exception = exception
+
+    @classmethod
+    def from_engine(cls, engine: ApplicationEngine, method: str) -> 'InvocationRecord':
+        return cls(method, engine.state, engine.gas_consumed,
+                   [compact_stack_item(engine.result_stack.peek(i)) for i in reversed(range(len(engine.result_stack)))],
+                   [(Hash160Str.from_UInt160(script_hash), event_name.decode() if type(event_name) is bytes else event_name,
+                     compact_stack_item(state))
+                    for _, script_hash, event_name, state in engine.notifications],
+                   (engine.exception_message or '') if engine.state == vm.VMState.FAULT else '')
+
+    @property
+    def result(self) -> Any:
+        """
+        the top of the result stack, as `TestEngine.analyze_results`; None if there is no result
+        """
+        return self.results[-1] if self.results else None
+
+    def __repr__(self):
+        return f'InvocationRecord({self.method}: {self.state}, gas={self.gas_consumed}, result={self.result}, ' \
+               f'{len(self.notifications)} notifications{", " + self.exception if self.exception else ""})'
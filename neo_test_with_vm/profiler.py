@@ -0,0 +1,255 @@
+import json
+import os
+from typing import List, Dict, Tuple, Optional
+
+from neo3 import vm, contracts
+from neo3.contracts import ApplicationEngine, interop
+from neo3.core import types
+from neo_test_with_vm.debug_info import DebugInfo
+
+SYSCALL_OPCODE = int(vm.OpCode.SYSCALL)
+
+
+class CostCounter:
+    """
+    count of executions and GAS charged, of an opcode, a syscall or a method
+    """
+    __slots__ = ('count', 'gas')
+
+    def __init__(self):
+        self.count = 0
+        self.gas = 0
+
+    def add(self, gas: int, count: int = 1):
+        self.count += count
+        self.gas += gas
+
+    def to_json(self) -> dict:
+        return {'count': self.count, 'gas': self.gas}
+
+
+class MethodProfile:
+    """
+    opcodes and syscalls executed in the frames of a method. GAS is in the smallest unit (1e-8 GAS).
+    The GAS of a SYSCALL instruction includes the price of the syscall and the fees charged by its handler,
+        e.g. the storage fee of System.Storage.Put, or the price of a native method for System.Contract.CallNative
+    """
+    def __init__(self):
+        self.total = CostCounter()
+        self.opcodes: Dict[str, CostCounter] = dict()
+        self.syscalls: Dict[str, CostCounter] = dict()
+
+    def add(self, opcode: str, syscall: Optional[str], gas: int):
+        self.total.add(gas)
+        self.opcodes.setdefault(opcode, CostCounter()).add(gas)
+        if syscall:
+            self.syscalls.setdefault(syscall, CostCounter()).add(gas)
+
+    def merge(self, other: 'MethodProfile'):
+        self.total.add(other.total.gas, other.total.count)
+        for mine, others in ((self.opcodes, other.opcodes), (self.syscalls, other.syscalls)):
+            for name, counter in others.items():
+                mine.setdefault(name, CostCounter()).add(counter.gas, counter.count)
+
+    def to_json(self) -> dict:
+        return {
+            'instructions': self.total.count, 'gas': self.total.gas,
+            'opcodes': {k: v.to_json() for k, v in sorted(self.opcodes.items(), key=lambda kv: -kv[1].gas)},
+            'syscalls': {k: v.to_json() for k, v in sorted(self.syscalls.items(), key=lambda kv: -kv[1].gas)},
+        }
+
+
+class InvocationProfile:
+    """
+    everything executed by one engine of a TestEngine invocation
+    :param method: the invoked method, as recorded in TestEngine.fault_messages
+    """
+    def __init__(self, method: str):
+        self.method = method
+        self.state: str = ''
+        self.gas_consumed = 0
+        self.methods: Dict[str, MethodProfile] = dict()  # {'contract.method': MethodProfile}
+        self.stacks: Dict[str, int] = dict()  # {'frame;frame;OPCODE': gas}
+
+    def to_json(self) -> dict:
+        return {
+            'method': self.method, 'state': self.state, 'gas_consumed': self.gas_consumed,
+            'methods': {k: v.to_json() for k, v in sorted(self.methods.items(), key=lambda kv: -kv[1].total.gas)},
+        }
+
+
+class Profiler:
+    """
+    Opt-in profiler of the opcodes, syscalls and GAS of TestEngine invocations.
+        profiler = engine.enable_profiling()
+        engine.invoke_method('deposit', [...])
+        profiler.dump('deposit.json', 'deposit.folded')  # flamegraph.pl deposit.folded > deposit.svg
+    Each instruction is attributed to the frame it is executed in, named {contract name}.{method name}
+        by the offsets of the methods in the ABI of the contract manifest.
+        Frames of private functions are named {contract name}.offset_{instruction pointer at entry}.
+        The script loaded by TestEngine itself is named `script`.
+    With the debug info of a contract loaded by `load_debug_info`, private functions are named as in the source,
+        and GAS is also attributed to the source lines of the contract. Refer to `annotated_lines`.
+    The engine is executed instruction by instruction in Python, so profiled invocations are much slower.
+    """
+    def __init__(self):
+        self.invocations: List[InvocationProfile] = []
+        self._method_offsets: Dict[bytes, Tuple[str, Dict[int, str]]] = dict()  # {script hash: (name, {offset: method})}
+        self.debug_infos: Dict[bytes, DebugInfo] = dict()  # {script hash: DebugInfo}
+        self.lines: Dict[Tuple[str, int], CostCounter] = dict()  # {(document, line): CostCounter} of all invocations
+
+    def load_debug_info(self, contract_hash: types.UInt160, nef_path: str) -> bool:
+        """
+        :return: whether the debug info beside the nef file is found
+        """
+        debug_info = DebugInfo.from_nef_path(nef_path)
+        if debug_info is None:
+            return False
+        self.debug_infos[contract_hash.to_array()] = debug_info
+        self._method_offsets.pop(contract_hash.to_array(), None)
+        return True
+
+    def _contract_names(self, engine: ApplicationEngine, scripthash_bytes: bytes) -> Tuple[str, Dict[int, str]]:
+        names = self._method_offsets.get(scripthash_bytes)
+        if names is None:
+            contract = contracts.ManagementContract().get_contract(engine.snapshot, types.UInt160(scripthash_bytes)) \
+                if scripthash_bytes else None
+            if contract is None:
+                names = ('script', dict())
+            else:
+                offsets = dict()
+                if scripthash_bytes in self.debug_infos:
+                    offsets.update(self.debug_infos[scripthash_bytes].method_starts)
+                offsets.update({method.offset: method.name for method in contract.manifest.abi.methods})
+                names = (contract.manifest.name, offsets)
+            self._method_offsets[scripthash_bytes] = names
+        return names
+
+    def _frame_name(self, engine: ApplicationEngine, context: vm.ExecutionContext) -> str:
+        contract_name, offsets = self._contract_names(engine, bytes(context.scripthash_bytes))
+        method_name = offsets.get(context.ip)
+        if method_name is None:
+            method_name = f'offset_{context.ip}'
+        return f'{contract_name}.{method_name}'
+
+    @staticmethod
+    def _instruction_names(context: vm.ExecutionContext) -> Tuple[str, Optional[str]]:
+        """
+        :return: (opcode name, syscall name or None) of the instruction at the instruction pointer
+        """
+        script: bytes = context.script._value
+        ip = context.ip
+        if ip >= len(script):
+            return 'RET', None  # implicit return at the end of a script
+        opcode = script[ip]
+        if opcode != SYSCALL_OPCODE:
+            return vm.OpCode(opcode).name, None
+        descriptor = interop.InteropService.get_descriptor(int.from_bytes(script[ip + 1:ip + 5], 'little'))
+        return 'SYSCALL', descriptor.method if descriptor else 'unknown'
+
+    def execute(self, engine: ApplicationEngine, method: str) -> InvocationProfile:
+        """
+        Execute an engine with its script loaded, like engine.execute(), and profile it
+        """
+        profile = InvocationProfile(method)
+        frames: List[str] = []
+        while engine.state != vm.VMState.HALT and engine.state != vm.VMState.FAULT:
+            depth = len(engine.invocation_stack)
+            if depth == 0:
+                engine._execute_next()  # halts
+                break
+            context = engine.current_context
+            del frames[depth:]  # returned or unwound by exceptions
+            if len(frames) < depth:  # contexts loaded together, e.g. _initialize above the called method
+                invocation_stack = engine.invocation_stack
+                while len(frames) < depth:
+                    frames.append(self._frame_name(engine, invocation_stack[len(frames)]))
+            opcode, syscall = self._instruction_names(context)
+            debug_info = self.debug_infos.get(bytes(context.scripthash_bytes)) if self.debug_infos else None
+            source_line = debug_info.source_line(context.ip) if debug_info else None
+            gas_before = engine.gas_consumed
+            engine._execute_next()
+            gas = engine.gas_consumed - gas_before
+            method_profile = profile.methods.get(frames[-1])
+            if method_profile is None:
+                method_profile = profile.methods[frames[-1]] = MethodProfile()
+            method_profile.add(opcode, syscall, gas)
+            stack = ';'.join(frames) + ';' + (syscall or opcode)
+            profile.stacks[stack] = profile.stacks.get(stack, 0) + gas
+            if source_line:
+                line_counter = self.lines.get(source_line)
+                if line_counter is None:
+                    line_counter = self.lines[source_line] = CostCounter()
+                line_counter.add(gas)
+        profile.state = engine.state.name
+        profile.gas_consumed = engine.gas_consumed
+        self.invocations.append(profile)
+        return profile
+
+    def methods(self) -> Dict[str, MethodProfile]:
+        """
+        :return: profiles of each contract method summed over all the invocations
+        """
+        merged: Dict[str, MethodProfile] = dict()
+        for invocation in self.invocations:
+            for name, method_profile in invocation.methods.items():
+                merged.setdefault(name, MethodProfile()).merge(method_profile)
+        return merged
+
+    def to_json(self) -> dict:
+        return {
+            'gas_consumed': sum(invocation.gas_consumed for invocation in self.invocations),
+            'methods': {k: v.to_json() for k, v in sorted(self.methods().items(), key=lambda kv: -kv[1].total.gas)},
+            'invocations': [invocation.to_json() for invocation in self.invocations],
+        }
+
+    def collapsed_stacks(self) -> str:
+        """
+        :return: lines of `frame;frame;OPCODE gas` for flamegraph.pl, speedscope, etc.
+            Stacks of all the invocations are merged, rooted at the invoked method
+        """
+        merged: Dict[str, int] = dict()
+        for invocation in self.invocations:
+            for stack, gas in invocation.stacks.items():
+                stack = f"{invocation.method.replace(' ', '')};{stack}"
+                merged[stack] = merged.get(stack, 0) + gas
+        return ''.join(f'{stack} {gas}\n' for stack, gas in merged.items() if gas > 0)
+
+    def dump(self, json_path: str = '', collapsed_path: str = ''):
+        if json_path:
+            with open(json_path, 'w') as f:
+                json.dump(self.to_json(), f, indent=2)
+        if collapsed_path:
+            with open(collapsed_path, 'w') as f:
+                f.write(self.collapsed_stacks())
+
+    def annotated_lines(self, top: int = 0) -> str:
+        """
+        :param top: only the most expensive lines; all the executed lines by default
+        :return: the executed source lines with their GAS and instruction counts, most expensive first
+        """
+        sources: Dict[str, List[str]] = dict()
+        total_gas = sum(counter.gas for counter in self.lines.values()) or 1
+        lines = sorted(self.lines.items(), key=lambda kv: (-kv[1].gas, -kv[1].count))
+        if top:
+            lines = lines[:top]
+        annotated = [f'{"GAS":>14} {"%":>6} {"instructions":>12}  source']
+        for (document, line), counter in lines:
+            if document not in sources:
+                try:
+                    with open(document, 'r') as f:
+                        sources[document] = f.read().splitlines()
+                except OSError:
+                    sources[document] = []
+            source = sources[document]
+            text = source[line - 1].strip() if 0 < line <= len(source) else ''
+            annotated.append(f'{counter.gas:>14} {100 * counter.gas / total_gas:>6.2f} {counter.count:>12}  '
+                             f'{os.path.basename(document)}:{line}  {text}')
+        return '\n'.join(annotated)
+
+    def print_annotated_lines(self, top: int = 0):
+        print(self.annotated_lines(top))
+
+    def clear(self):
+        self.invocations.clear()
+        self.lines.clear()
@@ -0,0 +1,153 @@
+"""
+Run many test scenarios in parallel processes.
+The Blockchain singleton of neo-mamba prevents TestEngine from being used in threads,
+    so each worker process holds its own TestEngine.
+
+A scenario is either
+    a picklable callable (e.g. a module-level function), called with the TestEngine of the worker: scenario(engine).
+        The engine is restored to the state after `setup` before each scenario,
+        so the contract is deployed only once per worker.
+    or the path of a test script like `tests/redeem_test.py`, executed in the worker.
+        The script builds its own TestEngine(s), which are found in its globals after execution.
+
+Command line:
+    python -m neo_test_with_vm.scenario_runner tests/redeem_test.py tests/pause_test.py --workers 4
+"""
+from typing import List, Union, Callable, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+import pickle
+import runpy
+import time
+import traceback
+
+from neo_test_with_vm.test_engine import TestEngine
+
+Scenario = Union[Callable[[TestEngine], Any], str]
+
+
+class ScenarioResult:
+    """
+    Picklable record of a scenario executed by a worker
+    """
+    def __init__(self, name: str, state: str, fault_messages: List[str], gas_consumed: int,
+                 result: Any = None, error: str = '', seconds: float = 0.0):
+        """
+        :param name: the path of the script, or module.qualname of the callable
+        :param state: 'HALT' or 'FAULT' of the last invocation; 'ERROR' if the scenario raised a Python exception
+        :param fault_messages: exception messages of all the faulted invocations, including expected ones
+        :param gas_consumed: GAS consumed by all the invocations of the scenario
+        :param result: the return value of a callable scenario. repr() of it if it cannot be pickled
+        :param error: the traceback if the scenario raised a Python exception (e.g. a failed assertion)
+        :param seconds: wall time of the scenario in the worker
+        """
+        self.name = name
+        self.state = state
+        self.fault_messages = fault_messages
+        self.gas_consumed = gas_consumed
+        self.result = result
+        self.error = error
+        self.seconds = seconds
+    
+    @property
+    def passed(self) -> bool:
+        return self.state != 'ERROR'
+    
+    def __repr__(self):
+        return f'ScenarioResult({self.name}: {self.state}, gas_consumed={self.gas_consumed}, ' \
+               f'faults={len(self.fault_messages)}, seconds={self.seconds:.3f})'
+
+
+# state of each worker process
+_worker_engine: Optional[TestEngine] = None
+_worker_checkpoint = None
+
+
+def _init_worker(nef_path: str, manifest_path: str, signers: List, setup: Optional[Callable[[TestEngine], Any]]):
+    global _worker_engine, _worker_checkpoint
+    if not nef_path:
+        return
+    _worker_engine = TestEngine(nef_path, manifest_path, signers=signers)
+    if setup:
+        setup(_worker_engine)
+    _worker_checkpoint = _worker_engine.checkpoint()
+
+
+def _scenario_name(scenario: Scenario) -> str:
+    if type(scenario) is str:
+        return scenario
+    return f'{getattr(scenario, "__module__", "")}.{getattr(scenario, "__qualname__", repr(scenario))}'
+
+
+def _picklable(result: Any) -> Any:
+    try:
+        pickle.dumps(result)
+        return result
+    except Exception:
+        return repr(result)
+
+
+def _run_scenario(scenario: Scenario) -> ScenarioResult:
+    name = _scenario_name(scenario)
+    start_time = time.perf_counter()
+    result, error = None, ''
+    if type(scenario) is str:
+        engines: List[TestEngine] = []
+        try:
+            script_globals = runpy.run_path(scenario, run_name='__scenario__')
+            engines = [v for v in script_globals.values() if isinstance(v, TestEngine)]
+        except Exception:
+            error = traceback.format_exc()
+    else:
+        engine = _worker_engine
+        assert engine, 'Scenario runner: nef_path is needed to run callable scenarios'
+        engine.restore(_worker_checkpoint)
+        engine.gas_consumed, engine.fault_messages = 0, []
+        engine.history.clear()
+        engines = [engine]
+        try:
+            result = _picklable(scenario(engine))
+        except Exception:
+            error = traceback.format_exc()
+    if error:
+        state = 'ERROR'
+    elif engines:
+        state = str(engines[-1].state).split('.')[-1]
+    else:
+        state = 'HALT'
+    return ScenarioResult(name, state,
+                          [message for engine in engines for message in engine.fault_messages],
+                          sum(engine.gas_consumed for engine in engines),
+                          result, error, time.perf_counter() - start_time)
+
+
+def run_scenarios(scenarios: List[Scenario], nef_path: str = 'ruler.nef', manifest_path: str = '',
+                  signers: List = None, setup: Callable[[TestEngine], Any] = None,
+                  max_workers: int = None) -> List[ScenarioResult]:
+    """
+    Run the scenarios across a ProcessPoolExecutor
+    :param scenarios: picklable callables called with a TestEngine, or paths of test scripts
+    :param nef_path: the contract deployed once in each worker for callable scenarios. '' if only scripts are run
+    :param manifest_path: refer to TestEngine.__init__
+    :param signers: refer to TestEngine.__init__; e.g. ['6d629e44cceaf8722c99a41d5fb98cf3472c286a']
+    :param setup: picklable callable run once per worker after deployment, e.g. to deploy the ruler and add pairs
+    :param max_workers: amount of processes. Default to the amount of CPUs
+    :return: results in the order of scenarios
+    """
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(nef_path, manifest_path, signers, setup)) as executor:
+        return list(executor.map(_run_scenario, scenarios))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Run test scripts in parallel processes')
+    parser.add_argument('scripts', nargs='+', help='paths of test scripts, e.g. tests/redeem_test.py')
+    parser.add_argument('--workers', type=int, default=None, help='amount of processes. Default to the amount of CPUs')
+    args = parser.parse_args()
+    results = run_scenarios(args.scripts, nef_path='', max_workers=args.workers)
+    for scenario_result in results:
+        print(scenario_result)
+        if scenario_result.error:
+            print(scenario_result.error)
+    if not all(scenario_result.passed for scenario_result in results):
+        exit(1)
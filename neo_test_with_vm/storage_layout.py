@@ -0,0 +1,371 @@
+"""
+Declarative key layouts of the storage of rToken.py and ruler.py,
+    to read the states of contracts directly from TestEngine.snapshot_storage, without executing any script.
+    A read is a few dict lookups, instead of building a script, an engine and committing a snapshot.
+Only committed states are read. TestEngine commits after each invocation.
+The balance layouts of NEP-17 contracts are also used to write many balances at once.
+Keep the layouts in line with the storage keys in the contracts.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from neo3 import storage, vm
+from neo3.contracts import NeoToken
+from neo3.contracts.native import NativeContract
+from neo3.core.types import UInt160
+
+from tests.utils import Hash160Str
+
+
+def int_to_vm_bytes(i: int) -> bytes:
+    """
+    the same as `int.to_bytes()` in contracts: minimal little-endian two's complement, and b'' for 0
+    """
+    if i == 0:
+        return b''
+    return i.to_bytes(((i if i >= 0 else ~i).bit_length() + 8) // 8, 'little', signed=True)
+
+
+def vm_bytes_to_int(value: bytes) -> int:
+    return int.from_bytes(value, 'little', signed=True)
+
+
+def bytes_to_Hash160Str(value: bytes) -> Optional[Hash160Str]:
+    return Hash160Str.from_UInt160(UInt160(value)) if len(value) == 20 else None
+
+
+def read_var_int(data: bytes, offset: int) -> Tuple[int, int]:
+    """
+    :return: (the variable-length integer, the offset after it)
+    """
+    prefix = data[offset]
+    if prefix < 0xFD:
+        return prefix, offset + 1
+    length = {0xFD: 2, 0xFE: 4, 0xFF: 8}[prefix]
+    return int.from_bytes(data[offset + 1:offset + 1 + length], 'little'), offset + 1 + length
+
+
+def deserialize(data: bytes) -> Any:
+    """
+    Deserialize bytes written by `serialize` of StdLib, e.g. packed pairs of ruler.
+    Integers into int, ByteStrings and Buffers into bytes, Arrays and Structs into list, Maps into dict
+    """
+    def read(offset: int) -> Tuple[Any, int]:
+        item_type = data[offset]
+        offset += 1
+        if item_type == 0x00:  # Any (Null)
+            return None, offset
+        if item_type == 0x20:  # Boolean
+            return data[offset] != 0, offset + 1
+        if item_type in (0x21, 0x28, 0x30):  # Integer, ByteString, Buffer
+            length, offset = read_var_int(data, offset)
+            value = data[offset:offset + length]
+            return (vm_bytes_to_int(value) if item_type == 0x21 else value), offset + length
+        if item_type in (0x40, 0x41):  # Array, Struct
+            count, offset = read_var_int(data, offset)
+            items = []
+            for _ in range(count):
+                item, offset = read(offset)
+                items.append(item)
+            return items, offset
+        if item_type == 0x48:  # Map
+            count, offset = read_var_int(data, offset)
+            result = dict()
+            for _ in range(count):
+                k, offset = read(offset)
+                v, offset = read(offset)
+                result[k] = v
+            return result, offset
+        raise ValueError(f'Unknown stack item type {item_type} in serialized bytes')
+    return read(0)[0]
+
+
+def encode_key_part(part: Union[bytes, int, str, UInt160, Hash160Str]) -> bytes:
+    """
+    encode a part of a storage key, as the contracts do
+    """
+    type_part = type(part)
+    if type_part is bytes or type_part is bytearray:
+        return bytes(part)
+    if type_part is int:
+        return int_to_vm_bytes(part)
+    if type_part is UInt160:
+        return part.to_array()
+    if type_part is Hash160Str:
+        return part.to_UInt160().to_array()
+    if type_part is str:
+        if len(part) == 40 or (len(part) == 42 and part.startswith('0x')):
+            return UInt160.from_string(part[-40:]).to_array()
+        return part.encode()
+    raise ValueError(f'Unable to encode {part} with type {type_part} into a storage key')
+
+
+class StorageField:
+    """
+    A storage key, or a family of keys {prefix}{part}{separator}{part}... , and how to decode its value
+    """
+    def __init__(self, prefix: bytes, decode: Callable[[bytes], Any] = vm_bytes_to_int, separator: bytes = b''):
+        self.prefix = prefix
+        self.decode = decode
+        self.separator = separator
+
+    def key(self, *parts) -> bytes:
+        return self.prefix + self.separator.join(encode_key_part(part) for part in parts)
+
+
+RTOKEN_LAYOUT: Dict[str, StorageField] = {
+    'balanceOf': StorageField(b''),  # {account}
+    'totalSupply': StorageField(b'totalSupply'),
+    'symbol': StorageField(b'TOKEN_SYMBOL', bytes.decode),
+    'decimals': StorageField(b'TOKEN_DECIMALS'),
+    'ruler': StorageField(b'RULER', bytes_to_Hash160Str),
+    'holders': StorageField(b'holders'),  # {HOLDERS_PREFIX}{account}: 1 if the balance is positive
+}
+
+RULER_LAYOUT: Dict[str, StorageField] = {
+    'packedPair': StorageField(b'packedPair', deserialize),  # {index}
+    'pair_': StorageField(b'pair_', separator=b'_'),  # legacy layout: {index}_{attribute}
+    'pairs': StorageField(b'pairs', separator=b'_'),  # {collateral}_{paired}_{expiry}_{mintRatio}: index
+    'feesMap': StorageField(b'feesMap'),  # {token}
+    'collaterals': StorageField(b'collaterals'),  # {token}: 1
+    'expiryIndex': StorageField(b'expiryIndex'),  # {expiry in 8 big-endian bytes}{index}: expiry
+    'maxPairIndex': StorageField(b'max_pair_index'),
+    'administrator': StorageField(b'ADMIN', bytes_to_Hash160Str),
+    'feeReceiver': StorageField(b'FEE_RECEIVER', bytes_to_Hash160Str),
+    'flashLoanRate': StorageField(b'FLASH_LOAN_RATE'),
+    'rTokenLedger': StorageField(b'RTOKEN_LEDGER', bytes_to_Hash160Str),
+}
+# attribute names of pairs in ruler.py, ordered by slot in the packed list
+PAIR_ATTRIBUTES = ['active', 'feeRate', 'mintRatio', 'expiry', 'pairedToken', 'collateralToken',
+                   'rcToken', 'rrToken', 'colTotal',
+                   'colDecimals', 'pairedDecimals', 'rDecimals',
+                   'colToRMultiplier', 'colToRDivisor', 'rToColMultiplier', 'rToColDivisor',
+                   'usesLedger',
+                   'settled', 'defaultedLoanAmt', 'rcTokensEligibleAtExpiry']
+PAIR_TOKEN_ATTRIBUTES = {'pairedToken', 'collateralToken', 'rcToken', 'rrToken'}
+PAIR_BOOL_ATTRIBUTES = {'active', 'usesLedger', 'settled'}
+# attributes stored by legacy pairs in pair_; the others are filled by `RulerStorage.pair` as ruler.py does
+LEGACY_PAIR_ATTRIBUTES = ['active', 'feeRate', 'mintRatio', 'expiry', 'pairedToken', 'collateralToken',
+                          'rcToken', 'rrToken', 'colTotal']
+
+
+class ContractStorage:
+    """
+    Typed reads of the storage of a contract deployed in a TestEngine
+    """
+    def __init__(self, test_engine, contract_hash: UInt160, layout: Dict[str, StorageField]):
+        """
+        :param test_engine: TestEngine
+        """
+        self.test_engine = test_engine
+        self.contract_hash = contract_hash
+        self.layout = layout
+        self._contract_id: Optional[int] = None
+
+    @property
+    def contract_id(self) -> int:
+        if self._contract_id is None:
+            # through the snapshot, for contracts deployed but not committed yet
+            self._contract_id = self.test_engine.snapshot.contracts.get(self.contract_hash, read_only=True).id
+        return self._contract_id
+
+    def read(self, key: bytes) -> bytes:
+        """
+        :return: the raw value of a storage key; b'' if not found, like `get` in contracts
+        """
+        item = self.test_engine.snapshot_storage.get(storage.StorageKey(self.contract_id, key))
+        return item.value if item is not None else b''
+
+    def get(self, field: str, *parts) -> Any:
+        """
+        :param field: name of the field in the layout
+        :param parts: the parts of the key after the prefix of the field
+        :return: the decoded value. None if the key does not exist
+        """
+        storage_field = self.layout[field]
+        value = self.read(storage_field.key(*parts))
+        return storage_field.decode(value) if value != b'' else None
+
+    def find(self, field: str) -> Iterator[Tuple[bytes, Any]]:
+        """
+        Scan all the keys of a field, like `find` in contracts but without the prefix.
+            The in-memory db has no index by contract or prefix, so every key of the whole db
+            (all the contracts, including native ones) is visited once, in O(size of the db).
+            Prefer `get` for known keys.
+        Only the matching items are collected before decoding, so the db can be written while consuming the result.
+        :return: generator of (key without the prefix, decoded value)
+        """
+        storage_field = self.layout[field]
+        prefix, contract_id = storage_field.prefix, self.contract_id
+        matches = [(k.key, v.value) for k, v in self.test_engine.snapshot_storage.items()
+                   if k.id == contract_id and k.key.startswith(prefix)]
+        for key, value in matches:
+            yield key[len(prefix):], storage_field.decode(value)
+
+
+class RTokenStorage(ContractStorage):
+    def __init__(self, test_engine, contract_hash: UInt160):
+        super().__init__(test_engine, contract_hash, RTOKEN_LAYOUT)
+
+    def balance_of(self, account: Union[UInt160, Hash160Str, str, bytes]) -> int:
+        return self.get('balanceOf', account) or 0
+
+    def total_supply(self) -> int:
+        return self.get('totalSupply') or 0
+
+    def symbol(self) -> str:
+        return self.get('symbol') or ''
+
+    def decimals(self) -> int:
+        return self.get('decimals') or 0
+
+    def holders(self) -> Dict[bytes, int]:
+        """
+        Scans the whole db. Refer to `find`
+        :return: {account: balance} of all the accounts with positive balances
+        """
+        return {account: self.balance_of(account) for account, _ in self.find('holders')}
+
+
+class RulerStorage(ContractStorage):
+    def __init__(self, test_engine, contract_hash: UInt160):
+        super().__init__(test_engine, contract_hash, RULER_LAYOUT)
+
+    def pair_index(self, collateral, paired, expiry: int, mint_ratio: int) -> Optional[int]:
+        """
+        :return: index of the pair in `pairs`, or None if not found
+        """
+        return self.get('pairs', collateral, paired, expiry, mint_ratio)
+
+    def pair(self, pair_index: int) -> Optional[Dict[str, Any]]:
+        """
+        :return: {attribute: value} of the pair, with tokens as Hash160Str, or None if not found.
+            Pairs still in the legacy layout are read from their pair_ keys, without migrating them.
+            Their decimals and scale factors are not stored, and read as None
+        """
+        pair = self.get('packedPair', pair_index)
+        if pair is None:
+            if self.get('pair_', pair_index, 'expiry') is None:
+                return None
+            pair = [self.read(self.layout['pair_'].key(pair_index, attribute))
+                    for attribute in LEGACY_PAIR_ATTRIBUTES]
+            pair = [v if attribute in PAIR_TOKEN_ATTRIBUTES else vm_bytes_to_int(v)
+                    for attribute, v in zip(LEGACY_PAIR_ATTRIBUTES, pair)]
+            pair += [None] * (PAIR_ATTRIBUTES.index('usesLedger') - len(pair))
+            pair.append(False)  # legacy pairs always deployed rToken contracts
+        if len(pair) == PAIR_ATTRIBUTES.index('settled'):  # packed before settlement
+            pair += [False, 0, 0]
+        result = dict(zip(PAIR_ATTRIBUTES, pair))
+        # the VM may store booleans as integers
+        for attribute in PAIR_BOOL_ATTRIBUTES:
+            result[attribute] = bool(result[attribute])
+        for attribute in PAIR_TOKEN_ATTRIBUTES:
+            result[attribute] = bytes_to_Hash160Str(result[attribute])
+        return result
+
+    def pair_indexes(self) -> Dict[bytes, int]:
+        """
+        :return: {key of the pair in `pairs` without the prefix: index of the pair}
+        """
+        return dict(self.find('pairs'))
+
+    def fees(self, token) -> int:
+        return self.get('feesMap', token) or 0
+
+    def fees_map(self) -> Dict[Hash160Str, int]:
+        return {bytes_to_Hash160Str(token): amount for token, amount in self.find('feesMap')}
+
+    def collaterals(self) -> List[Hash160Str]:
+        return [bytes_to_Hash160Str(token) for token, _ in self.find('collaterals')]
+
+
+class NEP17BalanceLayout(ABC):
+    """
+    Where and how a NEP-17 contract stores balances, for `TestEngine.set_NEP17_token_balances`.
+        Subclass it for contracts storing balances differently from native tokens and rToken.py
+    """
+    total_supply_key: Optional[bytes] = None  # None if the total supply is not stored
+
+    @abstractmethod
+    def balance_key(self, account: bytes) -> bytes:
+        """
+        :return: the storage key of the balance of an account
+        """
+
+    @abstractmethod
+    def encode_balance(self, amount: int) -> Optional[bytes]:
+        """
+        :return: the value stored for the balance; None to delete the key
+        """
+
+    @abstractmethod
+    def decode_balance(self, value: bytes) -> int:
+        """
+        :return: the balance in a stored value
+        """
+
+    def encode_total_supply(self, amount: int) -> Optional[bytes]:
+        return self.encode_balance(amount)
+
+    def decode_total_supply(self, value: bytes) -> int:
+        return self.decode_balance(value)
+
+    def extra_items(self, account: bytes, amount: int) -> Dict[bytes, Optional[bytes]]:
+        """
+        :return: {key: value or None to delete} to be written with a balance, e.g. the holders of rToken
+        """
+        return dict()
+
+
+class RTokenBalanceLayout(NEP17BalanceLayout):
+    """
+    rToken.py: {account}: int, {HOLDERS_PREFIX}{account}: 1 for positive balances
+    """
+    total_supply_key = RTOKEN_LAYOUT['totalSupply'].prefix
+
+    def balance_key(self, account: bytes) -> bytes:
+        return RTOKEN_LAYOUT['balanceOf'].key(account)
+
+    def encode_balance(self, amount: int) -> Optional[bytes]:
+        return int_to_vm_bytes(amount) if amount else None
+
+    def decode_balance(self, value: bytes) -> int:
+        return vm_bytes_to_int(value)
+
+    def extra_items(self, account: bytes, amount: int) -> Dict[bytes, Optional[bytes]]:
+        return {RTOKEN_LAYOUT['holders'].key(account): int_to_vm_bytes(1) if amount > 0 else None}
+
+
+class NativeBalanceLayout(NEP17BalanceLayout):
+    """
+    NEO and GAS: {Prefix_Account}{account}: the serialized account state of the native contract
+    """
+    def __init__(self, token: NativeContract, block_height: int = 0):
+        """
+        :param block_height: where NEO holders start to earn GAS bonus
+        """
+        self.token = token
+        self.block_height = block_height
+        # the total supply of NEO is fixed and not stored
+        self.total_supply_key = None if isinstance(token, NeoToken) else token.key_total_supply.key
+
+    def balance_key(self, account: bytes) -> bytes:
+        return self.token.key_account.key + account
+
+    def encode_balance(self, amount: int) -> Optional[bytes]:
+        if not amount:
+            return None  # as native contracts delete the accounts without balance
+        state = self.token._state()
+        state.balance = vm.BigInteger(amount)
+        if hasattr(state, 'balance_height'):
+            state.balance_height = self.block_height
+        return state.to_array()
+
+    def decode_balance(self, value: bytes) -> int:
+        return int(self.token._state.deserialize_from_bytes(value).balance)
+
+    def encode_total_supply(self, amount: int) -> Optional[bytes]:
+        return vm.BigInteger(amount).to_array()
+
+    def decode_total_supply(self, value: bytes) -> int:
+        return int(vm.BigInteger(value))
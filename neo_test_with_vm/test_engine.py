@@ -1,44 +1,157 @@
 import string
 import json
-import os
+import copy
 from functools import partial
-from typing import List, Union, Tuple, Any, Callable
+from types import GeneratorType
+import weakref
+from collections import defaultdict, deque
+from typing import List, Dict, Union, Tuple, Any, Callable, Iterable, Deque
 
-from tests.utils import Hash160Str, Hash256Str, EngineResultInterpreter
+from tests.utils import Hash160Str, Hash256Str
+from neo_test_with_vm.profiler import Profiler
+from neo_test_with_vm.decoder import decode_stack_item
+from neo_test_with_vm.contract_cache import ContractCache, default_manifest_path
+from neo_test_with_vm.history import InvocationRecord
+from neo_test_with_vm.storage_layout import RulerStorage, RTokenStorage, \
+    NEP17BalanceLayout, NativeBalanceLayout, RTokenBalanceLayout
 
-from neo3 import vm, contracts, blockchain
+from neo3 import vm, contracts, blockchain, storage
 from neo3.contracts import ApplicationEngine, interop
 from neo3.contracts.native import NativeContract
-from neo3.core import types
+from neo3.core import types, syscall_name_to_int
 from neo3.core.types import UInt160, UInt256
 from neo3.network import payloads
-from neo3.storage import StorageContext
-from neo3.contracts import NeoToken, GasToken
+from neo3.contracts import NeoToken, GasToken, ManagementContract, ContractParameterType
 neo, gas = NeoToken(), GasToken()
+native_tokens = {neo.hash: neo, gas.hash: gas}
+
+
+def _copy_contract_state(contract: contracts.ContractState, memodict=None) -> contracts.ContractState:
+    """
+    neo-mamba deep-copies a contract state at each read from the db or a snapshot, by serializing it and parsing
+        its manifest as JSON again. This took most of the time of invocations calling other contracts, e.g. rTokens.
+    Contract states are only modified by replacing their attributes (e.g. ContractManagement.update),
+        never their nef or manifest in place, so a shallow copy is as safe.
+    """
+    return copy.copy(contract)
+
+
+contracts.ContractState.__deepcopy__ = _copy_contract_state
+
+
+class Checkpoint:
+    """
+    A committed blockchain state of a TestEngine, taken by `TestEngine.checkpoint` and applied by `TestEngine.restore`.
+    Stored items are shared with the engine instead of copied: the engine only ever replaces items in the db,
+    because it continues with a new snapshot after `checkpoint` and `restore`.
+    """
+    def __init__(self, db_tables: Dict[str, dict], db_attributes: Dict[str, int], persisting_block: payloads.Block,
+                 deployed_contracts: List[contracts.ContractState], next_contract_id: int):
+        self.db_tables = db_tables
+        self.db_attributes = db_attributes
+        self.persisting_block = persisting_block
+        self.deployed_contracts = deployed_contracts
+        self.next_contract_id = next_contract_id
+
+
+class PreparedCall:
+    """
+    A method of a contract invoked by a TestEngine with new arguments each time. Create it with `TestEngine.prepare`.
+    The contract hash, signers and the script after the arguments are resolved once,
+        and a single transaction is shared by all the invocations.
+        Only the arguments are converted and emitted for each invocation.
+    A new ApplicationEngine is still needed for each invocation, because an executed engine cannot be reset.
+    """
+    def __init__(self, test_engine: 'TestEngine', contract_hash: UInt160, method: str, signers: List[payloads.Signer]):
+        self.test_engine = test_engine
+        self.contract_hash = contract_hash
+        self.method = method
+        self.tx = payloads.Transaction._serializable_init()
+        self.tx.signers = signers
+        sb = vm.ScriptBuilder()
+        sb.emit_dynamic_call(contract_hash, method)
+        self.script_without_args = sb.to_array()
+        self.script_suffixes = dict()  # amount of args => script after the args
+    
+    def script_suffix(self, args_count: int) -> bytes:
+        suffix = self.script_suffixes.get(args_count)
+        if suffix is None:
+            sb = vm.ScriptBuilder()  # the same as the end of vm.ScriptBuilder.emit_dynamic_call_with_args
+            sb.emit_push(args_count)
+            sb.emit(vm.OpCode.PACK)
+            sb.emit_push(0xF)  # CallFlags.ALL
+            sb.emit_push(self.method)
+            sb.emit_push(self.contract_hash.to_array())
+            sb.emit_syscall(syscall_name_to_int("System.Contract.Call"))
+            suffix = sb.to_array()
+            self.script_suffixes[args_count] = suffix
+        return suffix
+    
+    def script(self, params: List) -> bytes:
+        if not params:
+            return self.script_without_args
+        sb = vm.ScriptBuilder()
+        for param in reversed(params):
+            TestEngine.emit_param(sb, param if type(param) is int else TestEngine.param_auto_checker(param))
+        return sb.to_array() + self.script_suffix(len(params))
+    
+    def __call__(self, *params) -> ApplicationEngine:
+        """
+        Invoke the method with params, just like `TestEngine.invoke_method_of_arbitrary_contract`
+        """
+        test_engine = self.test_engine
+        engine = test_engine.new_engine(test_engine.previous_engine, self.tx)
+        engine.load_script(vm.Script(self.script(list(params))))
+        return test_engine.execute_loaded_engine(engine, self.method)
+
 
 class TestEngine:
     NO_SIGNER = 'NO_SIGNER'
-    Prefix_Account = 20
-    Number_Prefix = b'\x04'
+    genesis_snapshot = None  # the blockchain with only the genesis block; built once per process
+    # parsed .nef and .manifest.json shared by all the engines in the process.
+    # Set `TestEngine.contract_cache.cache_dir` to also reuse them between runs
+    contract_cache = ContractCache()
+    MILLISECONDS_PER_BLOCK = 15000  # for `advance_blocks`
+    # bounds of memory for long runs. Override them on instances
+    HISTORY_SIZE = 100  # how many InvocationRecords are kept in `history`; 0 not to record
+    MAX_SNAPSHOT_ENTRIES = 100_000  # items cached by the snapshot before continuing with a new one
+    MAX_FAULT_MESSAGES = 10_000  # at least the latest ones are kept in `fault_messages`
+    live_engines = weakref.WeakSet()  # ApplicationEngines not garbage-collected yet, for `memory_counters`
     
     @staticmethod
-    def new_engine(previous_engine: ApplicationEngine = None) -> ApplicationEngine:
-        tx = payloads.Transaction._serializable_init()
+    def clone_snapshot(snapshot):
+        """
+        A new in-memory db with the committed state of the snapshot, and a new snapshot of it.
+        Stored items are shared instead of copied. Refer to `Checkpoint`
+        """
+        db = copy.copy(snapshot.storages._db)
+        db.db = {name: dict(table) for name, table in db.db.items()}
+        cloned_snapshot = db.get_snapshotview()
+        cloned_snapshot.persisting_block = snapshot.persisting_block
+        return cloned_snapshot
+    
+    @staticmethod
+    def new_engine(previous_engine: ApplicationEngine = None, tx: payloads.Transaction = None) -> ApplicationEngine:
+        if not tx:
+            tx = payloads.Transaction._serializable_init()
         if not previous_engine:
-            blockchain.Blockchain.__it__ = None
-            snapshot = blockchain.Blockchain(store_genesis_block=True).currentSnapshot  # blockchain is singleton
-            return ApplicationEngine(contracts.TriggerType.APPLICATION, tx, snapshot, 0, test_mode=True)
+            if TestEngine.genesis_snapshot is None:
+                blockchain.Blockchain.__it__ = None
+                # blockchain is singleton
+                TestEngine.genesis_snapshot = blockchain.Blockchain(store_genesis_block=True).currentSnapshot
+            snapshot = TestEngine.clone_snapshot(TestEngine.genesis_snapshot)
         else:
-            return ApplicationEngine(contracts.TriggerType.APPLICATION, tx, previous_engine.snapshot, 0, test_mode=True)
+            snapshot = previous_engine.snapshot
+        engine = ApplicationEngine(contracts.TriggerType.APPLICATION, tx, snapshot, 0, test_mode=True)
+        TestEngine.live_engines.add(engine)
+        return engine
     
     @staticmethod
     def read_raw_nef_and_raw_manifest(nef_path: str, manifest_path: str = '') -> Tuple[bytes, dict]:
         with open(nef_path, 'rb') as f:
             raw_nef = f.read()
         if not manifest_path:
-            file_path, fullname = os.path.split(nef_path)
-            nef_name, _ = os.path.splitext(fullname)
-            manifest_path = os.path.join(file_path, nef_name + '.manifest.json')
+            manifest_path = default_manifest_path(nef_path)
         with open(manifest_path, 'r') as f:
             raw_manifest = json.loads(f.read())
         return raw_nef, raw_manifest
@@ -70,22 +183,43 @@ class TestEngine:
     def result_stack(self):
         return self.previous_engine.result_stack
     
+    @property
+    def time(self) -> int:
+        """
+        the timestamp in milliseconds returned by Runtime.GetTime, i.e. `time` in contracts
+        """
+        return self.snapshot.persisting_block.timestamp
+    
+    @property
+    def block_height(self) -> int:
+        """
+        the index of the persisting block, and the height returned by Ledger.currentIndex
+        """
+        return self.snapshot.persisting_block.index
+    
     def __init__(self, nef_path: str, manifest_path: str = '', signers: List[Union[str, UInt160, payloads.Signer]] = None,
                  scope: payloads.WitnessScope = payloads.WitnessScope.GLOBAL):
         """
         Only the contract specified in __init__ can be tested. You can deploy more contracts to be called by the tested
         contract.
         """
-        self.Prefix_Account_bytes = EngineResultInterpreter.int_to_bytes(self.Prefix_Account)
-        self.raw_nef, self.raw_manifest = self.read_raw_nef_and_raw_manifest(nef_path, manifest_path)
-        self.nef, self.manifest = self.build_nef_and_manifest_from_raw(self.raw_nef, self.raw_manifest)
+        self.raw_nef, self.raw_manifest, self.nef, self.manifest = self.contract_cache.load(nef_path, manifest_path)
         self.previous_engine: ApplicationEngine = self.new_engine()
         self.previous_processed_result = None
+        self.gas_consumed = 0  # GAS consumed by all the invocations of this TestEngine
+        self.fault_messages: List[str] = []  # exception messages of all the faulted invocations
+        self.profiler: Union[Profiler, None] = None  # refer to `enable_profiling`
+        # Discard the state changes of faulted invocations, as the blockchain does.
+        # By default they are committed, which may help to debug the contract
+        self.rollback_faults = False
+        # compact records of the latest invocations; only previous_engine is retained. Refer to `set_history_size`
+        self.history: Deque[InvocationRecord] = deque(maxlen=self.HISTORY_SIZE)
         self.contract = contracts.ContractState(0, self.nef, self.manifest, 0,
                                                 types.UInt160.deserialize_from_bytes(self.raw_nef))
         self.next_contract_id = 1  # if you deploy more contracts in a same engine, the contracts must have different id
         self.previous_engine.snapshot.contracts.put(self.contract)
         self.deployed_contracts = [self.contract]
+        self.nef_paths: Dict[UInt160, str] = {self.contract.hash: nef_path}  # to find the debug info of contracts
         if signers:
             signers = list(map(lambda signer:
                                self.signer_auto_checker(signer, scope),
@@ -109,14 +243,17 @@ class TestEngine:
         """
         these extra contracts can be called but cannot be tested
         """
-        raw_nef, raw_manifest = self.read_raw_nef_and_raw_manifest(nef_path, manifest_path)
-        nef, manifest = self.build_nef_and_manifest_from_raw(raw_nef, raw_manifest)
+        raw_nef, raw_manifest, nef, manifest = self.contract_cache.load(nef_path, manifest_path)
         contract_hash = types.UInt160.deserialize_from_bytes(raw_nef[-20:])
-        contract = contracts.ContractState(self.next_contract_id, nef, manifest, 0,
+        # the id is taken from the native ContractManagement, so that it is not given again
+        #     to contracts created by scripts, which would share the same storage
+        contract_id = ManagementContract().get_next_available_id(self.previous_engine.snapshot)
+        contract = contracts.ContractState(contract_id, nef, manifest, 0,
                                            contract_hash)
         self.previous_engine.snapshot.contracts.put(contract)
         self.deployed_contracts.append(contract)
-        self.next_contract_id += 1
+        self.nef_paths[contract_hash] = nef_path
+        self.next_contract_id = contract_id + 1
         return contract_hash
     
     @staticmethod
@@ -139,9 +276,45 @@ class TestEngine:
             return param.to_array()
         elif type_param is int or type_param is bytes or type_param is bool or param is None:
             return param
+        elif type_param is list:
+            return [TestEngine.param_auto_checker(p) for p in param]
         else:
             raise ValueError(f'Unable to handle param {param} with type {type_param}')
     
+    @staticmethod
+    def emit_param(sb: vm.ScriptBuilder, param: Any):
+        """
+        Push a param checked by `param_auto_checker`. vm.ScriptBuilder.emit_push does not accept lists
+            or empty bytes, so lists are emitted as Arrays, recursively, and empty bytes as PUSHDATA1 of length 0
+        """
+        if type(param) is list:
+            for item in reversed(param):
+                TestEngine.emit_param(sb, item)
+            sb.emit_push(len(param))
+            sb.emit(vm.OpCode.PACK)
+        elif param == b'':
+            sb.emit_raw(bytes([vm.OpCode.PUSHDATA1, 0]))
+        else:
+            sb.emit_push(param)
+    
+    @staticmethod
+    def emit_call(sb: vm.ScriptBuilder, contract_hash: UInt160, method: str, params: List):
+        """
+        The same as vm.ScriptBuilder.emit_dynamic_call_with_args, with params checked by `param_auto_checker`
+            and emitted by `emit_param`
+        """
+        if not params:
+            sb.emit_dynamic_call(contract_hash, method)
+            return
+        for param in reversed(params):
+            TestEngine.emit_param(sb, param)
+        sb.emit_push(len(params))
+        sb.emit(vm.OpCode.PACK)
+        sb.emit_push(0xF)  # CallFlags.ALL
+        sb.emit_push(method)
+        sb.emit_push(contract_hash.to_array())
+        sb.emit_syscall(syscall_name_to_int("System.Contract.Call"))
+    
     @staticmethod
     def signer_auto_checker(signer: Union[str, UInt160, Hash160Str, payloads.Signer], scope: payloads.WitnessScope) -> payloads.Signer:
         type_signer = type(signer)
@@ -181,7 +354,8 @@ class TestEngine:
     def invoke_method_with_print(self, method: str, params: List = None, signers: List[Union[str, UInt160, payloads.Signer]] = None,
                                  scope: payloads.WitnessScope = payloads.WitnessScope.GLOBAL,
                                  engine: ApplicationEngine = None, result_interpreted_as_hex=False,
-                                 result_interpreted_as_iterator=False, further_interpreter:Callable = None) -> ApplicationEngine:
+                                 result_interpreted_as_iterator=False, further_interpreter:Callable = None,
+                                 result_interpreted_as_array=False, result_decoded=False) -> ApplicationEngine:
         if not signers:
             signers = self.signers
         print(f'invoke method {method}:')
@@ -189,7 +363,8 @@ class TestEngine:
         if executed_engine.state == executed_engine.state.FAULT:
             print(f'engine fault from method "{method}":')
             print(executed_engine.exception_message)
-        self.print_results(executed_engine, result_interpreted_as_hex, result_interpreted_as_iterator, further_interpreter)
+        self.print_results(executed_engine, result_interpreted_as_hex, result_interpreted_as_iterator, further_interpreter,
+                           result_interpreted_as_array, result_decoded, method if result_decoded else None)
         return executed_engine
 
     def invoke_method_of_arbitrary_contract(self, contract_hash: Union[UInt160, Hash160Str, str], method: str, params: List = None,
@@ -205,10 +380,7 @@ class TestEngine:
         contract_hash = self.contract_hash_auto_checker(contract_hash)
         # engine.load_script(vm.Script(contract.script))
         sb = vm.ScriptBuilder()
-        if params:
-            sb.emit_dynamic_call_with_args(contract_hash, method, params)
-        else:
-            sb.emit_dynamic_call(contract_hash, method)
+        self.emit_call(sb, contract_hash, method, params)
         engine.load_script(vm.Script(sb.to_array()))
     
         if signers and signers != self.NO_SIGNER:
@@ -218,26 +390,223 @@ class TestEngine:
             engine.script_container.signers = signers
         elif self.signers:  # use signers stored in self when no external signer specified
             engine.script_container.signers = self.signers
+        return self.execute_loaded_engine(engine, method)
     
-        engine.execute()
-        engine.snapshot.commit()
+    def execute_loaded_engine(self, engine: ApplicationEngine, method: str, atomic=False) -> ApplicationEngine:
+        """
+        Execute an engine with its script loaded, commit its snapshot and make it the previous engine
+        :param method: name of the invoked method, recorded in fault_messages
+        :param atomic: discard the state changes if the engine faults, even if `rollback_faults` is False
+        """
+        snapshot = engine.snapshot
+        atomic = atomic or self.rollback_faults
+        if atomic:
+            engine.snapshot = snapshot.clone()
+        if self.profiler:
+            self.profiler.execute(engine, method)
+        else:
+            engine.execute()
+        if atomic:
+            if engine.state == vm.VMState.HALT:
+                engine.snapshot.commit()  # into the snapshot of the previous engine
+            engine.snapshot = snapshot
+        self.commit_snapshot(snapshot)
+        self.gas_consumed += engine.gas_consumed
+        if engine.state == engine.state.FAULT:
+            self.fault_messages.append(f'{method}: {engine.exception_message}')
+            if len(self.fault_messages) > 2 * self.MAX_FAULT_MESSAGES:
+                del self.fault_messages[:-self.MAX_FAULT_MESSAGES]
+        if self.history.maxlen:
+            self.history.append(InvocationRecord.from_engine(engine, method))
         self.previous_engine = engine
+        if self.snapshot_entries() > self.MAX_SNAPSHOT_ENTRIES:
+            self._renew_snapshot(snapshot.persisting_block)
         return engine
+    
+    def commit_snapshot(self, snapshot=None):
+        """
+        Commit a snapshot (the current one by default) into the db, and empty its write batch.
+            The in-memory db does not empty the batch, and would write all the previous changes again at each commit
+        Written storage items are turned back into bytes: the db deep-copies the items it reads,
+            and deep copies of cached NEO account states cannot be serialized (their ECPoints lose `serialize`)
+        """
+        snapshot = snapshot or self.snapshot
+        snapshot.commit()
+        batch = getattr(snapshot, '_batch', None)
+        if batch is not None:
+            for _, action, (_, item) in batch.statements:
+                if action != 'delete' and isinstance(item, storage.StorageItem) and item._cache is not None:
+                    item.value = item.value
+            batch.statements.clear()
+    
+    def set_history_size(self, size: int):
+        """
+        Keep the latest `size` InvocationRecords in `history`. 0 not to record any more
+        """
+        self.history = deque(self.history, maxlen=size)
+    
+    def snapshot_entries(self) -> int:
+        """
+        how many items are cached or waiting to be written by the current snapshot
+        """
+        snapshot = self.snapshot
+        batch = getattr(snapshot, '_batch', None)
+        return len(snapshot.storages._dictionary) + len(snapshot.contracts._dictionary) \
+            + len(snapshot.blocks._dictionary) + len(snapshot.transactions._dictionary) \
+            + (len(batch.statements) if batch is not None else 0)
+    
+    def memory_counters(self) -> Dict[str, int]:
+        """
+        What a TestEngine keeps in memory, to check that long runs stay within a budget.
+            storage_bytes goes through all the storage, so do not call it at every step
+        :return: {'snapshot_entries', 'storage_entries', 'storage_bytes', 'retained_engines', 'history_records',
+            'fault_messages'}. retained_engines counts all the ApplicationEngines alive in the process
+        """
+        storage_table = self.snapshot_storage
+        return {
+            'snapshot_entries': self.snapshot_entries(),
+            'storage_entries': len(storage_table),
+            'storage_bytes': sum(len(k.key) + 4 + len(v.value) for k, v in storage_table.items()),  # 4 for the contract id
+            'retained_engines': len(TestEngine.live_engines),
+            'history_records': len(self.history),
+            'fault_messages': len(self.fault_messages),
+        }
+    
+    def enable_profiling(self, profiler: Profiler = None) -> Profiler:
+        """
+        Profile the opcodes, syscalls and GAS of all the following invocations, until `disable_profiling`.
+        The debug info beside the nef files of the deployed contracts (compiled with `neo3-boa compile -d`) is loaded,
+            to attribute GAS to source lines. Refer to `Profiler.print_annotated_lines`
+        :param profiler: continue with an existing profiler, or a new one by default
+        """
+        self.profiler = profiler or Profiler()
+        for contract_hash, nef_path in self.nef_paths.items():
+            if contract_hash.to_array() not in self.profiler.debug_infos:
+                self.profiler.load_debug_info(contract_hash, nef_path)
+        return self.profiler
+    
+    def disable_profiling(self) -> Profiler:
+        profiler, self.profiler = self.profiler, None
+        return profiler
+    
+    def prepare(self, method: str, contract_hash: Union[UInt160, Hash160Str, str] = None,
+                signers: List[Union[str, UInt160, payloads.Signer]] = None,
+                scope: payloads.WitnessScope = payloads.WitnessScope.GLOBAL) -> 'PreparedCall':
+        """
+        Resolve a method of a contract once, to invoke it many times with new arguments at a low cost.
+            prepared_balanceOf = engine.prepare('balanceOf', rcToken_address)
+            for account in accounts:
+                prepared_balanceOf(account)
+        :param method: name of the method
+        :param contract_hash: default to the contract specified in __init__
+        :param signers: default to the signers specified in __init__
+        """
+        contract_hash = self.contract_hash_auto_checker(contract_hash) if contract_hash else self.contract.hash
+        return PreparedCall(self, contract_hash, method, self.signers_or_default(signers, scope))
+    
+    def signers_or_default(self, signers: List[Union[str, UInt160, payloads.Signer]],
+                           scope: payloads.WitnessScope) -> List[payloads.Signer]:
+        """
+        :return: the signers specified in __init__ if no signer is given
+        """
+        if signers and signers != self.NO_SIGNER:
+            return list(map(lambda signer: self.signer_auto_checker(signer, scope), signers))
+        return self.signers
+    
+    def invoke_many(self, calls: List[Tuple[Union[UInt160, Hash160Str, str, None], str, List]],
+                    signers: List[Union[str, UInt160, payloads.Signer]] = None,
+                    scope: payloads.WitnessScope = payloads.WitnessScope.GLOBAL,
+                    isolate_faults=False) -> List[Tuple[vm.VMState, Any]]:
+        """
+        Invoke many methods with a single script executed by a single engine, e.g. to read many balances at once.
+            engine.invoke_many([(rcToken_address, 'balanceOf', [owner]), (gas.hash, 'balanceOf', [owner])])
+        :param calls: [(contract_hash, method, params)]. contract_hash None for the contract specified in __init__
+        :param isolate_faults: If False, the calls are atomic like a transaction: a FAULT faults all the calls,
+            and discards the state changes of all the calls.
+            If True and any call faults, the calls are executed again one by one from the state before this method,
+            and the state changes of each faulted call are discarded.
+        :return: [(state, result)] for each call. The result is a vm.StackItem (vm.NullStackItem for void methods),
+            or None if the call faulted
+        """
+        calls = [(self.contract_hash_auto_checker(contract_hash) if contract_hash else self.contract.hash,
+                  method, [self.param_auto_checker(p) for p in params] if params else [])
+                 for contract_hash, method, params in calls]
+        sb = vm.ScriptBuilder()
+        for contract_hash, method, params in calls:
+            self.emit_call(sb, contract_hash, method, params)
+        tx = payloads.Transaction._serializable_init()
+        tx.signers = self.signers_or_default(signers, scope)
+        engine = self.new_engine(self.previous_engine, tx)
+        engine.load_script(vm.Script(sb.to_array()))
+        self.execute_loaded_engine(engine, ', '.join(method for _, method, _ in calls), atomic=True)
+        if engine.state == vm.VMState.HALT:
+            # each call leaves exactly one item on the stack; the last call on the top
+            results = [(vm.VMState.HALT, engine.result_stack.peek(len(calls) - 1 - i)) for i in range(len(calls))]
+        elif not isolate_faults:
+            results = [(vm.VMState.FAULT, None)] * len(calls)
+        else:
+            self.fault_messages.pop()  # the faulted call is recorded again below
+            results = []
+            for contract_hash, method, params in calls:  # nothing committed by the faulted batch
+                sb = vm.ScriptBuilder()
+                self.emit_call(sb, contract_hash, method, params)
+                executed_engine = self.new_engine(self.previous_engine, tx)
+                executed_engine.load_script(vm.Script(sb.to_array()))
+                self.execute_loaded_engine(executed_engine, method, atomic=True)
+                if executed_engine.state == vm.VMState.FAULT:
+                    results.append((vm.VMState.FAULT, None))
+                else:
+                    results.append((vm.VMState.HALT, executed_engine.result_stack.peek()))
+        self.previous_processed_result = results
+        return results
 
+    @staticmethod
+    def array_to_list(array: vm.ArrayStackItem) -> List:
+        """
+        :return: items of the array as bytes; nested arrays converted recursively
+        """
+        return [TestEngine.array_to_list(item) if isinstance(item, vm.ArrayStackItem) else item.to_array()
+                for item in array]
+    
+    def return_type(self, method: str) -> ContractParameterType:
+        """
+        :return: the return type of a method of the tested contract in its manifest; ANY if not found
+        """
+        descriptor = self.manifest.abi.get_method(method, -1)
+        return descriptor.return_type if descriptor else ContractParameterType.ANY
+    
     def analyze_results(self, engine: ApplicationEngine = None, result_interpreted_as_hex=False,
-                        result_interpreted_as_iterator=False, further_interpreter:Callable = None) -> Tuple[vm.VMState, Any]:
+                        result_interpreted_as_iterator=False, further_interpreter:Callable = None,
+                        result_interpreted_as_array=False, result_decoded=False,
+                        return_type: Union[ContractParameterType, str] = None) -> Tuple[vm.VMState, Any]:
+        """
+        :param result_decoded: decode the result directly into int, bytes, Hash160Str, list, dict, etc.,
+            and storage iterators into lazy generators, which can be consumed partially. Refer to `decode_stack_item`
+        :param return_type: for result_decoded. A ContractParameterType,
+            or the name of a method of the tested contract whose return type in the manifest is used
+        """
         if not engine:
             engine = self.previous_engine
         if not engine.result_stack:
             return engine.state, engine.result_stack
         result = engine.result_stack.peek()
-        if result and result_interpreted_as_hex:
+        if result_decoded:
+            if type(return_type) is str:
+                return_type = self.return_type(return_type)
+            processed_result = decode_stack_item(result, return_type or ContractParameterType.ANY)
+        elif result and result_interpreted_as_hex:
             processed_result = bytes.fromhex(str(result))
         elif result and result_interpreted_as_iterator:
             processed_result = dict()
-            iterator = list(result.get_object().it)
-            for k,v in iterator:
-                processed_result[k.key] = v.value
+            if isinstance(result, vm.MapStackItem):
+                for k, v in zip(result.keys(), result.values()):
+                    processed_result[k.to_array()] = v.to_array()
+            else:
+                iterator = list(result.get_object().it)
+                for k,v in iterator:
+                    processed_result[k.key] = v.value
+        elif result and result_interpreted_as_array:
+            processed_result = self.array_to_list(result)
         else:
             processed_result = str(result)
         if further_interpreter:
@@ -246,9 +615,15 @@ class TestEngine:
         return engine.state, processed_result
     
     def print_results(self, engine: ApplicationEngine = None, result_interpreted_as_hex=False,
-                      result_interpreted_as_iterator=False, further_interpreter:Callable = None) -> None:
+                      result_interpreted_as_iterator=False, further_interpreter:Callable = None,
+                      result_interpreted_as_array=False, result_decoded=False,
+                      return_type: Union[ContractParameterType, str] = None) -> None:
         state, result = self.analyze_results(engine,
-                        result_interpreted_as_hex, result_interpreted_as_iterator, further_interpreter)
+                        result_interpreted_as_hex, result_interpreted_as_iterator, further_interpreter,
+                        result_interpreted_as_array, result_decoded, return_type)
+        if isinstance(result, GeneratorType):
+            result = list(result)  # consumed for printing
+            self.previous_processed_result = result
         print(state, result)
     
     def reset_environment(self):
@@ -259,33 +634,210 @@ class TestEngine:
         for contract in self.deployed_contracts:
             self.previous_engine.snapshot.contracts.put(contract)
             
+    def _renew_snapshot(self, persisting_block: payloads.Block):
+        """
+        Continue with a new snapshot of the db. The previous snapshot may still cache committed items,
+        and modify them in place in later invocations.
+        """
+        snapshot = self.snapshot.storages._db.get_snapshotview()
+        snapshot.persisting_block = persisting_block
+        self.previous_engine.snapshot = snapshot
+    
+    def checkpoint(self) -> Checkpoint:
+        """
+        Take the current blockchain state, so that it can be restored later by `restore`.
+        Only the dicts of the in-memory db are copied, not the stored items,
+            so many scenarios can branch cheaply from a deployed and funded state.
+        """
+        snapshot = self.snapshot
+        self.commit_snapshot(snapshot)
+        db = snapshot.storages._db
+        checkpoint = Checkpoint({name: dict(table) for name, table in db.db.items()},
+                                {k: v for k, v in vars(db).items() if type(v) is int},  # e.g. best block height
+                                snapshot.persisting_block,
+                                list(self.deployed_contracts), self.next_contract_id)
+        self._renew_snapshot(snapshot.persisting_block)
+        return checkpoint
+    
+    def restore(self, checkpoint: Checkpoint):
+        """
+        Go back to a state taken by `checkpoint`. The same checkpoint can be restored any times.
+        """
+        db = self.snapshot.storages._db
+        db.db = {name: dict(table) for name, table in checkpoint.db_tables.items()}
+        for k, v in checkpoint.db_attributes.items():
+            setattr(db, k, v)
+        self.deployed_contracts = list(checkpoint.deployed_contracts)
+        self.next_contract_id = checkpoint.next_contract_id
+        self._renew_snapshot(checkpoint.persisting_block)
+    
+    def _set_persisting_block(self, timestamp: int, index: int):
+        """
+        Execute the following invocations in a new block. The block is replaced instead of modified,
+            so that checkpoints and the genesis snapshot keep their own blocks.
+        """
+        assert timestamp >= 0 and index >= 0
+        block = self.snapshot.persisting_block
+        header = copy.copy(block.header)
+        header.timestamp = timestamp
+        header.index = index
+        self.snapshot.persisting_block = payloads.Block(header, block.transactions)
+        if self.snapshot.best_block_height != index:
+            self.snapshot.best_block_height = index
+            self.commit_snapshot()
+    
+    def set_time(self, timestamp: int):
+        """
+        Set the virtual clock read by Runtime.GetTime. The block height is not changed
+        :param timestamp: in milliseconds, e.g. the expiry of a pair plus 1 to collect it
+        """
+        self._set_persisting_block(int(timestamp), self.block_height)
+    
+    def advance(self, seconds: Union[int, float]):
+        """
+        Move the virtual clock forward. The block height is not changed
+        """
+        self.set_time(self.time + int(seconds * 1000))
+    
+    def advance_blocks(self, blocks: int = 1):
+        """
+        Move the block height forward, and the virtual clock by MILLISECONDS_PER_BLOCK for each block
+        """
+        self._set_persisting_block(self.time + blocks * self.MILLISECONDS_PER_BLOCK, self.block_height + blocks)
+    
     def set_NEP17_token_balance(self, token_contract: Union[contracts.ContractState, NativeContract], account:Union[UInt160, str],
                                 amount: Union[int, float] = 2000000000, bytes_needed: int = None):
         """
-        This is achieved by directly changing the storage of the NEP17 contract
+        This is achieved by directly changing the storage of the NEP17 contract. The total supply is not changed.
+            Refer to `set_NEP17_token_balances` to set many balances at once
         :param token_contract: contract managing the token
         :param account: ScriptHash of wallet which will receive the token
         :param amount: care for the decimals!
-        :param bytes_needed: how many bytes are used in the contract to represent the number of tokens
+        :param bytes_needed: not used any more. Amounts are encoded as the contract does
         :return:
         """
-        amount = int(amount)
-        assert 0 <= amount <= 2147483647  # 0x7fffffff  # overflowing values result in minus balance
-        engine = self.new_engine(self.previous_engine)
-        account = self.param_auto_checker(account)
-        if token_contract == neo:
-            bytes_needed = 9
-        contracts.interop.storage_put(engine, StorageContext(token_contract.id, False),
-                                      self.Prefix_Account_bytes + account,
-                                      self.Number_Prefix + EngineResultInterpreter.int_to_bytes(amount, bytes_needed=bytes_needed))
-        engine.snapshot.commit()
-        self.previous_engine = engine
-        
+        self.set_NEP17_token_balances([(token_contract, account, amount)], update_total_supply=False)
+    
+    def set_NEP17_token_balances(self, balances: Iterable[Tuple[Union[contracts.ContractState, NativeContract, UInt160, Hash160Str, str],
+                                                                Union[UInt160, Hash160Str, str], Union[int, float]]],
+                                 update_total_supply: bool = True, layouts: Dict[UInt160, NEP17BalanceLayout] = None):
+        """
+        Write many balances directly into the storage in a single commit, without executing any script,
+            e.g. to fund thousands of accounts for a load scenario.
+        Native NEO and GAS are written as the native contracts store them. Other contracts are regarded as rToken.py.
+        :param balances: (token contract or its hash, account, amount). Amounts are integers of any size; 0 removes the balance
+        :param update_total_supply: add the changes of balances to the total supplies (the total supply of NEO is fixed)
+        :param layouts: {token hash: NEP17BalanceLayout} for contracts storing balances differently from rToken.py
+        """
+        snapshot = self.snapshot
+        self.commit_snapshot(snapshot)
+        table = self.snapshot_storage
+        layouts = dict(layouts or {})
+        contract_ids: Dict[UInt160, int] = dict()
+        supply_changes: Dict[UInt160, int] = defaultdict(int)
+
+        def write(key: storage.StorageKey, value: Union[bytes, None]):
+            # items are replaced instead of modified, as they may be shared with checkpoints
+            if value is None:
+                table.pop(key, None)
+            else:
+                table[key] = storage.StorageItem(value)
+
+        for token, account, amount in balances:
+            amount = int(amount)
+            assert amount >= 0, f'Negative balance {amount}'
+            if isinstance(token, (contracts.ContractState, NativeContract)):
+                token = token.hash
+            token = self.contract_hash_auto_checker(token)
+            layout = layouts.get(token)
+            if layout is None:
+                layout = NativeBalanceLayout(native_tokens[token], self.block_height) if token in native_tokens \
+                    else RTokenBalanceLayout()
+                layouts[token] = layout
+            contract_id = contract_ids.get(token)
+            if contract_id is None:
+                contract_id = native_tokens[token].id if token in native_tokens \
+                    else snapshot.contracts.get(token, read_only=True).id
+                contract_ids[token] = contract_id
+            account = self.param_auto_checker(account)
+            key = storage.StorageKey(contract_id, layout.balance_key(account))
+            if update_total_supply:
+                previous = table.get(key)
+                supply_changes[token] += amount - (layout.decode_balance(previous.value) if previous else 0)
+            write(key, layout.encode_balance(amount))
+            for k, v in layout.extra_items(account, amount).items():
+                write(storage.StorageKey(contract_id, k), v)
+        for token, change in supply_changes.items():
+            layout = layouts[token]
+            if change == 0 or layout.total_supply_key is None:
+                continue
+            key = storage.StorageKey(contract_ids[token], layout.total_supply_key)
+            previous = table.get(key)
+            write(key, layout.encode_total_supply((layout.decode_total_supply(previous.value) if previous else 0) + change))
+        self._renew_snapshot(snapshot.persisting_block)
+
+    def read_NEP17_token_balance(self, token_contract: Union[contracts.ContractState, NativeContract, UInt160, Hash160Str, str],
+                                 account: Union[UInt160, Hash160Str, str], layout: NEP17BalanceLayout = None) -> int:
+        """
+        Read a balance directly from the storage, without executing any script. The reverse of `set_NEP17_token_balances`
+        :param layout: for contracts storing balances differently from native tokens and rToken.py
+        """
+        if isinstance(token_contract, (contracts.ContractState, NativeContract)):
+            token_contract = token_contract.hash
+        token = self.contract_hash_auto_checker(token_contract)
+        if token in native_tokens:
+            layout = layout or NativeBalanceLayout(native_tokens[token], self.block_height)
+            contract_id = native_tokens[token].id
+        else:
+            layout = layout or RTokenBalanceLayout()
+            contract_id = self.snapshot.contracts.get(token, read_only=True).id
+        item = self.snapshot_storage.get(storage.StorageKey(contract_id, layout.balance_key(self.param_auto_checker(account))))
+        return layout.decode_balance(item.value) if item is not None else 0
+
+    def write_storage(self, contract_hash: Union[UInt160, Hash160Str, str], items: Dict[bytes, Union[bytes, None]]):
+        """
+        Write raw items directly into the storage of a contract in a single commit, without executing any script,
+            e.g. to seed states written by older versions of the contract.
+        :param items: {key: value}; None removes the key
+        """
+        snapshot = self.snapshot
+        self.commit_snapshot(snapshot)
+        table = self.snapshot_storage
+        contract_id = snapshot.contracts.get(self.contract_hash_auto_checker(contract_hash), read_only=True).id
+        for key, value in items.items():
+            key = storage.StorageKey(contract_id, key)
+            # items are replaced instead of modified, as they may be shared with checkpoints
+            if value is None:
+                table.pop(key, None)
+            else:
+                table[key] = storage.StorageItem(value)
+        self._renew_snapshot(snapshot.persisting_block)
+
     def get_rToken_balance(self, rToken_address: Union[Hash160Str, UInt160, str], owner: Union[Hash160Str, UInt160, str]):
         type_rToken_address = type(rToken_address)
         if type_rToken_address is Hash160Str or type_rToken_address is str:
             rToken_address = types.UInt160.from_string(str(rToken_address)[2:])
         self.invoke_method_of_arbitrary_contract(rToken_address, "balanceOf", [owner])
+    
+    def ruler_storage(self, contract_hash: Union[UInt160, Hash160Str, str] = None) -> RulerStorage:
+        """
+        Read the storage of a ruler contract directly, without executing any script. See `storage_layout`
+        :param contract_hash: the contract deployed in __init__ by default
+        """
+        return RulerStorage(self, self.contract_hash_auto_checker(contract_hash) if contract_hash else self.contract.hash)
+    
+    def rToken_storage(self, rToken_address: Union[UInt160, Hash160Str, str]) -> RTokenStorage:
+        """
+        Read the storage of an rToken contract directly, without executing any script. See `storage_layout`
+        """
+        return RTokenStorage(self, self.contract_hash_auto_checker(rToken_address))
+    
+    def read_rToken_balance(self, rToken_address: Union[Hash160Str, UInt160, str], owner: Union[Hash160Str, UInt160, str]) -> int:
+        """
+        The same balance as `get_rToken_balance`, read from the storage without an engine.
+            previous_engine and previous_processed_result are kept untouched
+        """
+        return self.rToken_storage(rToken_address).balance_of(owner)
         
     def __repr__(self):
         if self.previous_processed_result:
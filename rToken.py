@@ -4,14 +4,14 @@ rTokens are NEP17 tokens, but its token symbol and administrator can be dynamica
 '''
 # TODO: Discussion is needed for safety and permission issues
 
-from typing import Any, Union
+from typing import Any, List, Union, cast
 
 from boa3.builtin import NeoMetadata, metadata, public
 from boa3.builtin.contract import Nep17TransferEvent, abort
 from boa3.builtin.interop.blockchain import get_contract
 from boa3.builtin.interop.contract import GAS, NEO, call_contract
 from boa3.builtin.interop.runtime import calling_script_hash, check_witness
-from boa3.builtin.interop.storage import delete, get, put
+from boa3.builtin.interop.storage import delete, find, get, put
 from boa3.builtin.type import UInt160
 
 
@@ -44,6 +44,9 @@ TOKEN_SYMBOL_KEY = 'TOKEN_SYMBOL'
 # Number of decimal places
 TOKEN_DECIMALS_KEY = 'TOKEN_DECIMALS'
 
+# get({HOLDERS_PREFIX}{account}) is 1 if the account has a positive balance. Balances are stored with key {account}
+HOLDERS_PREFIX = b'holders'
+
 
 # -------------------------------------------
 # Events
@@ -158,11 +161,14 @@ def transfer(from_address: UInt160, to_address: UInt160, amount: int, data: Any)
     if from_address != to_address and amount != 0:
         if from_balance == amount:
             delete(from_address)
+            _remove_holder(from_address)
         else:
             put(from_address, from_balance - amount)
 
         to_balance = get(to_address).to_int()
         put(to_address, to_balance + amount)
+        if to_balance == 0:
+            _add_holder(to_address)
 
     # if the method succeeds, it must fire the transfer event
     on_transfer(from_address, to_address, amount)
@@ -172,6 +178,132 @@ def transfer(from_address: UInt160, to_address: UInt160, amount: int, data: Any)
     return True
 
 
+@public
+def transferMany(from_address: UInt160, to_addresses: List[UInt160], amounts: List[int], data: Any) -> bool:
+    """
+    Transfers NEP17 tokens from one account to many accounts in a single invocation. This is not a NEP-17 standard method.
+
+    The witness of `from_address` is checked once, and its balance is read and written once.
+    A NEP-17 `Transfer` event is fired for each recipient, and `onNEP17Payment` is called for each contract recipient,
+    after all the balances have been changed.
+
+    :param from_address: the address to transfer from
+    :type from_address: UInt160
+    :param to_addresses: the addresses to transfer to
+    :type to_addresses: List[UInt160]
+    :param amounts: amounts[i] of NEP17 tokens is transferred to to_addresses[i]
+    :type amounts: List[int]
+    :param data: whatever data is pertinent to the onPayment method, the same for all the recipients
+    :type data: Any
+
+    :return: whether the transfer was successful. Nothing is transferred if the from account cannot pay the sum
+    :raise AssertionError: raised if any address length is not 20, if any amount is less than zero,
+        or if `to_addresses` and `amounts` have different lengths.
+    """
+    assert len(from_address) == 20
+    assert len(to_addresses) == len(amounts)
+    total_amount = 0
+    i = 0
+    while i < len(amounts):
+        assert len(to_addresses[i]) == 20
+        assert amounts[i] >= 0
+        total_amount = total_amount + amounts[i]
+        i = i + 1
+
+    from_balance = get(from_address).to_int()
+    if from_balance < total_amount:
+        return False
+
+    if from_address != calling_script_hash:
+        if not check_witness(from_address):
+            return False
+
+    # skip balance changes of the recipients that are the sender itself or receive 0 cryptocurrency
+    remaining_balance = from_balance
+    i = 0
+    while i < len(amounts):
+        to_address = to_addresses[i]
+        amount = amounts[i]
+        if from_address != to_address and amount != 0:
+            remaining_balance = remaining_balance - amount
+            to_balance = get(to_address).to_int()
+            put(to_address, to_balance + amount)
+            if to_balance == 0:
+                _add_holder(to_address)
+        i = i + 1
+    if remaining_balance != from_balance:
+        if remaining_balance == 0:
+            delete(from_address)
+            _remove_holder(from_address)
+        else:
+            put(from_address, remaining_balance)
+
+    i = 0
+    while i < len(amounts):
+        on_transfer(from_address, to_addresses[i], amounts[i])
+        post_transfer(from_address, to_addresses[i], amounts[i], data)
+        i = i + 1
+    return True
+
+
+def _add_holder(account: UInt160):
+    put(HOLDERS_PREFIX + account, 1)
+
+
+def _remove_holder(account: UInt160):
+    delete(HOLDERS_PREFIX + account)
+
+
+def _key_at_or_after(key: bytes, cursor: bytes) -> bool:
+    """
+    Whether a storage key is at or after a cursor, in the order of keys returned by `find`:
+        bytes are compared as unsigned integers one by one, and a key is before the longer keys it prefixes.
+
+    :return: key >= cursor
+    """
+    length = len(cursor)
+    if len(key) < length:
+        length = len(key)
+    i = 0
+    while i < length:
+        key_byte: int = key[i]
+        cursor_byte: int = cursor[i]
+        if key_byte != cursor_byte:
+            return key_byte > cursor_byte
+        i = i + 1
+    return len(key) >= len(cursor)
+
+
+@public
+def getHolders(cursor: bytes, max_count: int) -> List[Any]:
+    """
+    Lists the accounts with a positive balance, in the order of their storage keys. This is not a NEP-17 standard method.
+
+    :param cursor: the cursor returned by the previous page. b'' to start from the first holder
+    :type cursor: bytes
+    :param max_count: the maximum amount of holders listed in this page
+    :type max_count: int
+
+    :return: [cursor for the next page (b'' if there is no more holder), [[account, balance]]].
+        The cursor is the first holder not listed. If it empties its balance before the next page,
+        the next page resumes from the holder after it.
+    """
+    assert max_count > 0
+    iterator = find(HOLDERS_PREFIX)
+    started = cursor == b''
+    holders: List[List[Any]] = []
+    while iterator.next():
+        account = cast(bytes, iterator.value[0])
+        account = account[7:]  # cut 'holders' at the beginning of the bytes
+        if not started and _key_at_or_after(account, cursor):
+            started = True
+        if started:
+            if len(holders) >= max_count:
+                return [account, holders]
+            holders.append([account, get(account).to_int()])
+    return [b'', holders]
+
+
 def post_transfer(from_address: Union[UInt160, None], to_address: Union[UInt160, None], amount: int, data: Any):
     """
     Checks if the one receiving NEP17 tokens is a smart contract and if it's one the onPayment method will be called
@@ -210,6 +342,8 @@ def mint(account: UInt160, amount: int):
 
     put(SUPPLY_KEY, current_total_supply + amount)
     put(account, account_balance + amount)
+    if account_balance == 0:
+        _add_holder(account)
 
     on_transfer(None, account, amount)
     post_transfer(None, account, amount, None)
@@ -223,7 +357,11 @@ def burnByRuler(account: UInt160, amount: int):
     
     remaining_balance = balanceOf(account)
     assert remaining_balance >= amount, "No enough Token to burn. Maybe you requested an overly large amount."
-    put(account, remaining_balance - amount)
+    if remaining_balance == amount:
+        delete(account)
+        _remove_holder(account)
+    else:
+        put(account, remaining_balance - amount)
     
     total_supply = totalSupply()
     put(SUPPLY_KEY, total_supply - amount)
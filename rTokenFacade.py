@@ -0,0 +1,151 @@
+'''
+can be compiled by neo3-boa==0.8.1
+NEP-17 facade of a single token in `rTokenLedger.py`.
+Balances are kept in the ledger; this contract only forwards NEP-17 calls to the ledger with its token_id,
+    so that wallets and exchanges can treat an rcToken or rrToken of the ledger as an ordinary NEP-17 token.
+Deploy this contract, and then let the ruler administrator call `setLedgerFacade` of the ruler, which calls `deploy`.
+The NEP-17 `Transfer` events of the token are fired here by the ledger through `onLedgerTransfer`.
+'''
+
+from typing import Any, Union, cast
+
+from boa3.builtin import NeoMetadata, metadata, public
+from boa3.builtin.contract import Nep17TransferEvent, abort
+from boa3.builtin.interop.blockchain import get_contract
+from boa3.builtin.interop.contract import call_contract
+from boa3.builtin.interop.runtime import calling_script_hash, check_witness
+from boa3.builtin.interop.storage import get, put
+from boa3.builtin.type import UInt160
+
+
+# -------------------------------------------
+# METADATA
+# -------------------------------------------
+
+@metadata
+def manifest_metadata() -> NeoMetadata:
+    meta = NeoMetadata()
+    meta.author = "github.com/Hecate2"
+    meta.description = "Ruler token facade prototype; NEP-17 view of a token in the rToken ledger"
+    meta.email = "chenxinhao@ngd.neo.org"
+    return meta
+
+
+# -------------------------------------------
+# TOKEN SETTINGS
+# -------------------------------------------
+
+LEDGER_KEY = 'LEDGER'  # get(LEDGER_KEY) for the address of the rToken ledger contract
+TOKEN_ID_KEY = 'TOKEN_ID'  # get(TOKEN_ID_KEY) for the token_id in the ledger
+
+
+# -------------------------------------------
+# Events
+# -------------------------------------------
+
+
+on_transfer = Nep17TransferEvent
+
+
+# -------------------------------------------
+# Methods
+# -------------------------------------------
+
+
+def _ledger() -> UInt160:
+    return cast(UInt160, get(LEDGER_KEY))
+
+
+@public
+def main() -> str:
+    return "rToken facade of the rToken ledger"
+
+
+@public  # NEP-17 standard. DO NOT MODIFY
+def symbol() -> str:
+    return cast(str, call_contract(_ledger(), 'symbolOf', [get(TOKEN_ID_KEY)]))
+
+
+@public  # NEP-17 standard. DO NOT MODIFY
+def decimals() -> int:
+    return cast(int, call_contract(_ledger(), 'decimalsOf', [get(TOKEN_ID_KEY)]))
+
+
+@public  # NEP-17 standard. DO NOT MODIFY
+def totalSupply() -> int:
+    return cast(int, call_contract(_ledger(), 'totalSupplyOf', [get(TOKEN_ID_KEY)]))
+
+
+@public  # NEP-17 standard. DO NOT MODIFY
+def balanceOf(account: UInt160) -> int:
+    assert len(account) == 20
+    return cast(int, call_contract(_ledger(), 'balanceOfToken', [get(TOKEN_ID_KEY), account]))
+
+
+@public  # NEP-17 standard. DO NOT MODIFY
+def transfer(from_address: UInt160, to_address: UInt160, amount: int, data: Any) -> bool:
+    """
+    Transfers an amount of NEP17 tokens from one account to another. Refer to `transfer` in `rToken.py`
+    The `Transfer` event is fired by the ledger through `onLedgerTransfer`
+    """
+    assert len(from_address) == 20 and len(to_address) == 20
+    assert amount >= 0
+    if from_address != calling_script_hash:
+        if not check_witness(from_address):
+            return False
+    if not cast(bool, call_contract(_ledger(), 'facadeTransfer', [get(TOKEN_ID_KEY), from_address, to_address, amount])):
+        return False
+    post_transfer(from_address, to_address, amount, data)
+    return True
+
+
+def post_transfer(from_address: Union[UInt160, None], to_address: Union[UInt160, None], amount: int, data: Any):
+    if not isinstance(to_address, None):    # TODO: change to 'is not None' when `is` semantic is implemented
+        contract = get_contract(to_address)
+        if not isinstance(contract, None):      # TODO: change to 'is not None' when `is` semantic is implemented
+            call_contract(to_address, 'onNEP17Payment', [from_address, amount, data])
+
+
+@public
+def onLedgerTransfer(from_address: Union[UInt160, None], to_address: Union[UInt160, None], amount: int):
+    """
+    Fire the NEP-17 `Transfer` event for a balance change in the ledger. Only the ledger can call it
+    """
+    assert calling_script_hash == _ledger(), "No permission for rToken facade"
+    on_transfer(from_address, to_address, amount)
+
+
+@public
+def deploy(ledger: UInt160, token_id: bytes) -> bool:
+    """
+    Initializes the params when the smart contract is deployed. Called by the ruler in `setLedgerFacade`
+    :param ledger: the address of the rToken ledger contract. The caller must be the ruler of the ledger
+    :param token_id: {pair_index.to_bytes()}{SEPARATOR}{b'RC' or b'RR'}
+    :return: whether the deploy was successful. This method must return True only during the smart contract's deploy.
+    """
+    assert calling_script_hash == cast(UInt160, call_contract(ledger, 'getRuler')), 'Ruler Core: the facade must be deployed by the ruler'
+    assert get(LEDGER_KEY) == b'', 'Ruler Core: the facade has been deployed'
+    put(LEDGER_KEY, ledger)
+    put(TOKEN_ID_KEY, token_id)
+    return True
+
+
+@public
+def getLedger() -> bytes:
+    """
+    :return: address of the rToken ledger contract. b'' if the facade is not deployed
+    """
+    return get(LEDGER_KEY)
+
+
+@public
+def getTokenId() -> bytes:
+    """
+    :return: token_id of the token in the ledger
+    """
+    return get(TOKEN_ID_KEY)
+
+
+@public
+def onNEP17Payment(from_address: UInt160, amount: int, data: Any):
+    abort()
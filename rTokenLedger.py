@@ -0,0 +1,309 @@
+'''
+can be compiled by neo3-boa==0.8.1
+A single ledger of rcTokens and rrTokens for all the pairs of a ruler.
+Instead of deploying 2 `rToken.py` contracts for each pair, the ruler registers the 2 tokens of a pair here,
+    and each token is identified by its token_id: {pair_index.to_bytes()}{SEPARATOR}{b'RC' or b'RR'}
+Every token of the ledger can be exposed as an independent NEP-17 token by deploying an `rTokenFacade.py` contract
+    for it, and registering the facade through the ruler.
+Only the ruler can bind itself to the ledger, and facades to its tokens. See `setRTokenLedger` and `setLedgerFacade` in `ruler.py`
+'''
+
+from typing import Any, Union, cast
+
+from boa3.builtin import CreateNewEvent, NeoMetadata, metadata, public
+from boa3.builtin.contract import abort
+from boa3.builtin.interop.blockchain import get_contract
+from boa3.builtin.interop.contract import call_contract
+from boa3.builtin.interop.runtime import calling_script_hash, check_witness
+from boa3.builtin.interop.storage import StorageMap, get, get_context, put
+from boa3.builtin.type import UInt160
+
+
+# -------------------------------------------
+# METADATA
+# -------------------------------------------
+
+@metadata
+def manifest_metadata() -> NeoMetadata:
+    meta = NeoMetadata()
+    meta.author = "github.com/Hecate2"
+    meta.description = "Ruler token ledger prototype; rcTokens and rrTokens of all the pairs"
+    meta.email = "chenxinhao@ngd.neo.org"
+    return meta
+
+
+# -------------------------------------------
+# TOKEN SETTINGS
+# -------------------------------------------
+
+# Script hash of the ruler contract
+RULER_KEY = b'RULER'
+
+SEPARATOR = bytearray(b'_')
+RC_LEG = b'RC'
+RR_LEG = b'RR'
+
+current_storage_context = get_context()
+# balance_map: Dict[{token_id}{account}, int]
+balance_map = StorageMap(current_storage_context, b'b')
+# supply_map: Dict[token_id, int]
+supply_map = StorageMap(current_storage_context, b's')
+# symbol_map: Dict[token_id, str]
+symbol_map = StorageMap(current_storage_context, b'y')
+# decimals_map: Dict[token_id, int]
+decimals_map = StorageMap(current_storage_context, b'd')
+# facade_map: Dict[token_id, UInt160]; the NEP-17 facade contract of a token
+facade_map = StorageMap(current_storage_context, b'f')
+
+
+# -------------------------------------------
+# Events
+# -------------------------------------------
+
+on_transfer = CreateNewEvent(
+    [
+        ('token_id', bytes),
+        ('from_addr', Union[UInt160, None]),
+        ('to_addr', Union[UInt160, None]),
+        ('amount', int)
+    ],
+    'LedgerTransfer'
+)
+
+
+# -------------------------------------------
+# Methods
+# -------------------------------------------
+
+
+def gen_token_id(pair_index: int, leg: bytes) -> bytes:
+    return bytearray(pair_index.to_bytes()) + SEPARATOR + leg
+
+
+def _assert_ruler():
+    ruler = get(RULER_KEY)
+    assert calling_script_hash == ruler or check_witness(ruler), "No permission for rToken ledger"
+
+
+@public
+def main() -> str:
+    return "rToken ledger of all the pairs of a ruler"
+
+
+@public
+def deploy(ruler: UInt160) -> bool:
+    """
+    Initializes the params when the smart contract is deployed. Called by the ruler in `setRTokenLedger`
+    :param ruler: the address of ruler contract. Must be the caller, so that nobody else can bind the ledger to a ruler
+    :return: whether the deploy was successful. This method must return True only during the smart contract's deploy.
+    """
+    assert calling_script_hash == ruler, 'Ruler Core: the ledger must be deployed by its ruler'
+    assert get(RULER_KEY) == b'', 'Ruler Core: the ledger has been deployed'
+    put(RULER_KEY, ruler)
+    return True
+
+
+@public
+def getRuler() -> bytes:
+    """
+    :return: address of the ruler contract. b'' if the ledger is not deployed
+    """
+    return get(RULER_KEY)
+
+
+@public
+def registerPair(pair_index: int, rc_symbol: str, rr_symbol: str, decimals: int) -> bool:
+    """
+    Register the rcToken and rrToken of a pair. Called by the ruler in `addPair`.
+    :param pair_index: index of the pair in the ruler
+    :param rc_symbol: symbol of the rcToken. Refer to RC_TOKEN_NAME_PATTERN in `ruler.py`
+    :param rr_symbol: symbol of the rrToken. Refer to RR_TOKEN_NAME_PATTERN in `ruler.py`
+    :param decimals: decimals of both rTokens. The same as the paired token
+    :return: True
+    """
+    _assert_ruler()
+    rc_token_id = gen_token_id(pair_index, RC_LEG)
+    rr_token_id = gen_token_id(pair_index, RR_LEG)
+    assert symbol_map.get(rc_token_id) == b'', 'Ruler Core: the pair has been registered'
+    symbol_map.put(rc_token_id, rc_symbol)
+    symbol_map.put(rr_token_id, rr_symbol)
+    decimals_map.put(rc_token_id, decimals)
+    decimals_map.put(rr_token_id, decimals)
+    return True
+
+
+@public
+def setFacade(token_id: bytes, facade: UInt160) -> bool:
+    """
+    Register the NEP-17 facade contract of a token. Only the facade can call `facadeTransfer` of the token,
+        and the facade fires the NEP-17 `Transfer` events of the token.
+    :param token_id: {pair_index.to_bytes()}{SEPARATOR}{b'RC' or b'RR'}
+    :param facade: address of the deployed `rTokenFacade.py` contract
+    :return: True
+    """
+    _assert_ruler()
+    assert symbol_map.get(token_id) != b'', 'Ruler Core: token not registered'
+    facade_map.put(token_id, facade)
+    return True
+
+
+@public
+def getFacade(token_id: bytes) -> bytes:
+    """
+    :return: address of the NEP-17 facade contract of the token. b'' if no facade is registered
+    """
+    return facade_map.get(token_id)
+
+
+@public
+def symbolOf(token_id: bytes) -> str:
+    return symbol_map.get(token_id).to_str()
+
+
+@public
+def decimalsOf(token_id: bytes) -> int:
+    return decimals_map.get(token_id).to_int()
+
+
+@public
+def totalSupplyOf(token_id: bytes) -> int:
+    return supply_map.get(token_id).to_int()
+
+
+@public
+def balanceOfToken(token_id: bytes, account: UInt160) -> int:
+    assert len(account) == 20
+    return balance_map.get(token_id + account).to_int()
+
+
+def _notify_transfer(token_id: bytes, from_address: Union[UInt160, None], to_address: Union[UInt160, None], amount: int):
+    """
+    Fire the `LedgerTransfer` event, and the NEP-17 `Transfer` event through the facade of the token if registered
+    """
+    on_transfer(token_id, from_address, to_address, amount)
+    facade = facade_map.get(token_id)
+    if facade != b'':
+        call_contract(cast(UInt160, facade), 'onLedgerTransfer', [from_address, to_address, amount])
+
+
+def _transfer(token_id: bytes, from_address: UInt160, to_address: UInt160, amount: int) -> bool:
+    """
+    Move balance of a token without checking witness. Refer to `transfer` in `rToken.py`
+    :return: whether the from account has enough balance
+    """
+    assert len(from_address) == 20 and len(to_address) == 20
+    assert amount >= 0
+    from_key = token_id + from_address
+    from_balance = balance_map.get(from_key).to_int()
+    if from_balance < amount:
+        return False
+    # skip balance changes if transferring to yourself or transferring 0 cryptocurrency
+    if from_address != to_address and amount != 0:
+        if from_balance == amount:
+            balance_map.delete(from_key)
+        else:
+            balance_map.put(from_key, from_balance - amount)
+        to_key = token_id + to_address
+        balance_map.put(to_key, balance_map.get(to_key).to_int() + amount)
+    _notify_transfer(token_id, from_address, to_address, amount)
+    return True
+
+
+@public
+def transferToken(token_id: bytes, from_address: UInt160, to_address: UInt160, amount: int, data: Any) -> bool:
+    """
+    Transfers an amount of a token from one account to another. Semantics follow NEP-17 `transfer`,
+        except that the `LedgerTransfer` event is fired, and the NEP-17 `Transfer` event only if the token has a facade.
+    :param token_id: {pair_index.to_bytes()}{SEPARATOR}{b'RC' or b'RR'}
+    :return: whether the transfer was successful
+    """
+    if from_address != calling_script_hash:
+        if not check_witness(from_address):
+            return False
+    if not _transfer(token_id, from_address, to_address, amount):
+        return False
+    post_transfer(from_address, to_address, amount, data)
+    return True
+
+
+@public
+def facadeTransfer(token_id: bytes, from_address: UInt160, to_address: UInt160, amount: int) -> bool:
+    """
+    Transfers an amount of a token on behalf of its NEP-17 facade.
+    The facade has checked the witness, and is responsible for `onNEP17Payment`.
+    :return: whether the from account has enough balance
+    """
+    assert calling_script_hash == facade_map.get(token_id), "No permission for rToken ledger"
+    return _transfer(token_id, from_address, to_address, amount)
+
+
+def post_transfer(from_address: Union[UInt160, None], to_address: Union[UInt160, None], amount: int, data: Any):
+    """
+    Checks if the one receiving tokens is a smart contract and if it's one the onPayment method will be called
+    """
+    if not isinstance(to_address, None):    # TODO: change to 'is not None' when `is` semantic is implemented
+        contract = get_contract(to_address)
+        if not isinstance(contract, None):      # TODO: change to 'is not None' when `is` semantic is implemented
+            call_contract(to_address, 'onNEP17Payment', [from_address, amount, data])
+
+
+def _mint(token_id: bytes, account: UInt160, amount: int):
+    assert amount > 0, "mint amount <= 0"
+    supply_map.put(token_id, supply_map.get(token_id).to_int() + amount)
+    key = token_id + account
+    balance_map.put(key, balance_map.get(key).to_int() + amount)
+    _notify_transfer(token_id, None, account, amount)
+
+
+def _burn(token_id: bytes, account: UInt160, amount: int):
+    assert amount > 0
+    key = token_id + account
+    remaining_balance = balance_map.get(key).to_int()
+    assert remaining_balance >= amount, "No enough Token to burn. Maybe you requested an overly large amount."
+    if remaining_balance == amount:
+        balance_map.delete(key)
+    else:
+        balance_map.put(key, remaining_balance - amount)
+    supply_map.put(token_id, supply_map.get(token_id).to_int() - amount)
+    _notify_transfer(token_id, account, None, amount)
+
+
+@public
+def mint(token_id: bytes, account: UInt160, amount: int):
+    """
+    Mints new tokens of one token_id. Only the ruler can mint.
+    """
+    _assert_ruler()
+    _mint(token_id, account, amount)
+
+
+@public
+def mintPair(pair_index: int, account: UInt160, amount: int):
+    """
+    Mints the same amount of rcTokens and rrTokens of a pair in a single call. Only the ruler can mint.
+    """
+    _assert_ruler()
+    _mint(gen_token_id(pair_index, RC_LEG), account, amount)
+    _mint(gen_token_id(pair_index, RR_LEG), account, amount)
+
+
+@public
+def burnByRuler(token_id: bytes, account: UInt160, amount: int):
+    _assert_ruler()
+    _burn(token_id, account, amount)
+
+
+@public
+def burnPairByRuler(pair_index: int, account: UInt160, amount: int):
+    """
+    Burns the same amount of rcTokens and rrTokens of a pair in a single call. Only the ruler can burn.
+    """
+    _assert_ruler()
+    _burn(gen_token_id(pair_index, RC_LEG), account, amount)
+    _burn(gen_token_id(pair_index, RR_LEG), account, amount)
+
+
+@public
+def onNEP17Payment(from_address: UInt160, amount: int, data: Any):
+    # the ledger never holds tokens
+    abort()
@@ -23,13 +23,15 @@ Avoid using native NEO in this contract, because there has to be huge errors in
 pair["colTotal"] is used to count all the rrTokens that have been minted; usually does not need to be reduced.
 """
 
-from typing import Any, cast
+from typing import Any, Dict, List, cast
 from boa3.builtin.interop.iterator import Iterator
 
 from boa3.builtin import NeoMetadata, metadata, public
+from boa3.builtin.interop.binary import serialize, deserialize
+from boa3.builtin.interop.blockchain import get_contract
 from boa3.builtin.interop.contract import call_contract, create_contract
 from boa3.builtin.interop.runtime import time, executing_script_hash, calling_script_hash, check_witness
-from boa3.builtin.interop.storage import get, put, find, StorageMap, get_context
+from boa3.builtin.interop.storage import get, put, delete, find, StorageMap, get_context
 from boa3.builtin.type import UInt160
 
 """
@@ -42,10 +44,10 @@ FILL this with compiled rToken contract nef and manifest.json!
 '''
 # rTokenTemplateNef: bytes = open('rToken.nef', 'rb').read()
 # rTokenTemplateManifest: str = open('rToken.manifest.json', 'r').read()
-rTokenTemplateNef: bytes = b'NEF3neo3-boa by COZ-0.8.1.0\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\xfdF\x04\x0c%rToken standard inherited from NEP-17@[A\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb(@\\A\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!@ZA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!@W\x00\x01x\xca\x0c\x01\x14\xdb!\xb39xA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!@W\x02\x04x\xca\x0c\x01\x14\xdb!\xb3y\xca\x0c\x01\x14\xdb!\xb3\xab9z\x10\xb89xA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!phz\xb5&\x04\x10@xA9Sn<\x98&\rxA\xf8\'\xec\x8c\xaa&\x04\x10@xy\x98z\x10\xb4\xab&Ghz\xb3&\x0fxA\x9b\xf6g\xceA/X\xc5\xed"\x10hz\x9fxA\x9b\xf6g\xceA\xe6?\x18\x84yA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!qiz\x9eyA\x9b\xf6g\xceA\xe6?\x18\x84zyx\x13\xc0\x0c\x08TransferA\x95\x01oa{zyx4\x04\x11@W\x01\x04y\xd8\xaa&Sy\x11\xc0\x0c\x01\x0f\x0c\x0bgetContract\x0c\x14\xfd\xa3\xfaCF\xeaS*%\x8f\xc4\x97\xdd\xad\xdbd7\xc9\xfd\xffAb}[Rph\xd8\xaa&\x1f{zx\x13\xc0\x1f\x0c\x0eonNEP17PaymentyAb}[RE@W\x03\x02YA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(pA9Sn<h\x97hA\xf8\'\xec\x8c\xac9y\x10\xb795\x8c\xfe\xff\xffqx5\x9c\xfe\xff\xffriy\x9eZA\x9b\xf6g\xceA\xe6?\x18\x84jy\x9exA\x9b\xf6g\xceA\xe6?\x18\x84yx\x0b\x13\xc0\x0c\x08TransferA\x95\x01oa\x0byx\x0b5:\xff\xff\xff@W\x03\x02y\x10\xb79YA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(pA9Sn<h\x97hA\xf8\'\xec\x8c\xac9x50\xfe\xff\xffqiy\xb89iy\x9fxA\x9b\xf6g\xceA\xe6?\x18\x845\x01\xfe\xff\xffrjy\x9fZA\x9b\xf6g\xceA\xe6?\x18\x84y\x0bx\x13\xc0\x0c\x08TransferA\x95\x01oa\x0c\x14Burn rToken by Rulery\x0bx5\xaf\xfe\xff\xff@YA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(A\xf8\'\xec\x8c@W\x00\x03XA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\x0c\x00\x97YA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\x0c\x00\x97\xab5n\xfd\xff\xff\x10\xb3\xab9\x11XA\x9b\xf6g\xceA\xe6?\x18\x84xYA\x9b\xf6g\xceA\xe6?\x18\x84y[A\x9b\xf6g\xceA\xe6?\x18\x84z\\A\x9b\xf6g\xceA\xe6?\x18\x84\x11@W\x00\x03z\x0c\x1dTransfer from caller to Ruler\x98z\x0c\x1dTransfer from Ruler to caller\x98\xab&\x038@V\x05\x0c\x8e\ncan be compiled by neo3-boa==0.8.1\nrTokens are NEP17 tokens, but its token symbol and administrator can be dynamically changed when deployed\nE\x0c\x0cNOT_DEPLOYED`\x0c\x05RULERa\x0c\x0btotalSupplyb\x0c\x0cTOKEN_SYMBOLc\x0c\x0eTOKEN_DECIMALSd@\xcc\xa3\n\xde'
+rTokenTemplateNef: bytes = b'NEF3neo3-boa by COZ-0.8.2.0\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\xfd]\x06\x0c%rToken standard inherited from NEP-17@[A\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb(@\\A\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!@ZA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!@W\x00\x01x\xca\x0c\x01\x14\xdb!\xb39xA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!@W\x02\x04x\xca\x0c\x01\x14\xdb!\xb3y\xca\x0c\x01\x14\xdb!\xb3\xab9z\x10\xb89xA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!phz\xb5&\x04\x10@xA9Sn<\x98&\rxA\xf8\'\xec\x8c\xaa&\x04\x10@xy\x98z\x10\xb4\xab&Xhz\xb3&\x15xA\x9b\xf6g\xceA/X\xc5\xedx5\xdb\x01\x00\x00"\x10hz\x9fxA\x9b\xf6g\xceA\xe6?\x18\x84yA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!qiz\x9eyA\x9b\xf6g\xceA\xe6?\x18\x84i\x10\xb3&\x08y5\x87\x01\x00\x00zyx\x13\xc0\x0c\x08TransferA\x95\x01oa{zyx5n\x02\x00\x00\x11@W\x07\x04x\xca\x0c\x01\x14\xdb!\xb39y\xcaz\xca\xb39\x10p\x10q"5yiJ\x99\x0f*\x05K\xca\x9e\xce\xca\x0c\x01\x14\xdb!\xb39ziJ\x99\x0f*\x05K\xca\x9e\xce\x10\xb89hziJ\x99\x0f*\x05K\xca\x9e\xce\x9epi\x11\x9eqiz\xca\xb5$\xc9xA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!rjh\xb5&\x04\x10@xA9Sn<\x98&\rxA\xf8\'\xec\x8c\xaa&\x04\x10@js\x10q"[yiJ\x99\x0f*\x05K\xca\x9e\xcetziJ\x99\x0f*\x05K\xca\x9e\xceuxl\x98m\x10\xb4\xab&6km\x9fslA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!vnm\x9elA\x9b\xf6g\xceA\xe6?\x18\x84n\x10\xb3&\x08l5\x8a\x00\x00\x00i\x11\x9eqiz\xca\xb5$\xa3kj\xb4&#k\x10\xb3&\x12xA\x9b\xf6g\xceA/X\xc5\xedx4y"\x0ekxA\x9b\xf6g\xceA\xe6?\x18\x84\x10q"KziJ\x99\x0f*\x05K\xca\x9e\xceyiJ\x99\x0f*\x05K\xca\x9e\xcex\x13\xc0\x0c\x08TransferA\x95\x01oa{ziJ\x99\x0f*\x05K\xca\x9e\xceyiJ\x99\x0f*\x05K\xca\x9e\xcex5\x15\x01\x00\x00i\x11\x9eqiz\xca\xb5$\xb3\x11@W\x00\x01\x11]x\x8b\xdb(A\x9b\xf6g\xceA\xe6?\x18\x84@W\x00\x01]x\x8b\xdb(A\x9b\xf6g\xceA/X\xc5\xed@W\x04\x02y\xcapx\xcah\xb5&\x05x\xcap\x10q"\'xiJ\x99\x0f*\x05K\xca\x9e\xceryiJ\x99\x0f*\x05K\xca\x9e\xcesjk\xb4&\x06jk\xb7@i\x11\x9eqih\xb5$\xd8x\xcay\xca\xb8@W\x04\x02y\x10\xb79A\x9b\xf6g\xce]\x0c\x01\x00SA\xdf0\xb8\x9apx\x0c\x00\x97q\xc2r"nhA\xf3T\xbf\x1dJ\xd9A&\x04\xdb@\x10J\x99\x0f*\x05K\xca\x9e\xceskJ\xca\x17J\x99\x0f*\x06\x12M\xca\x9e\x9f\x8e\xdb(si\xaaxk5o\xff\xff\xff\xab&\x04\x11qi&3j\xcay\xb8&\x07jk\x12\xc0@jkA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\xdb!k\x12\xc0K\xd9(&\x05\x8b"\x05\xcf"\x03rhA\x9c\x08\xed\x9c$\x8ej\x0c\x00\x12\xc0@W\x01\x04y\xd8\xaa&Sy\x11\xc0\x0c\x01\x0f\x0c\x0bgetContract\x0c\x14\xfd\xa3\xfaCF\xeaS*%\x8f\xc4\x97\xdd\xad\xdbd7\xc9\xfd\xffAb}[Rph\xd8\xaa&\x1f{zx\x13\xc0\x1f\x0c\x0eonNEP17PaymentyAb}[RE@W\x03\x02YA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(pA9Sn<h\x97hA\xf8\'\xec\x8c\xac9y\x10\xb795\x11\xfc\xff\xffqx5!\xfc\xff\xffriy\x9eZA\x9b\xf6g\xceA\xe6?\x18\x84jy\x9exA\x9b\xf6g\xceA\xe6?\x18\x84j\x10\xb3&\x08x5H\xfe\xff\xffyx\x0b\x13\xc0\x0c\x08TransferA\x95\x01oa\x0byx\x0b5/\xff\xff\xff@W\x03\x02y\x10\xb79YA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(pA9Sn<h\x97hA\xf8\'\xec\x8c\xac9x5\xaa\xfb\xff\xffqiy\xb89iy\xb3&\x15xA\x9b\xf6g\xceA/X\xc5\xedx5\xf2\xfd\xff\xff"\x10iy\x9fxA\x9b\xf6g\xceA\xe6?\x18\x845c\xfb\xff\xffrjy\x9fZA\x9b\xf6g\xceA\xe6?\x18\x84y\x0bx\x13\xc0\x0c\x08TransferA\x95\x01oa\x0c\x14Burn rToken by Rulery\x0bx5\x8c\xfe\xff\xff@YA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(A\xf8\'\xec\x8c@W\x00\x03XA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\x0c\x00\x97YA\x9b\xf6g\xceA\x92]\xe81J\xd8&\x07E\x0c\x00\xdb(\x0c\x00\x97\xab5\xd0\xfa\xff\xff\x10\xb3\xab9\x11XA\x9b\xf6g\xceA\xe6?\x18\x84xYA\x9b\xf6g\xceA\xe6?\x18\x84y[A\x9b\xf6g\xceA\xe6?\x18\x84z\\A\x9b\xf6g\xceA\xe6?\x18\x84\x11@W\x00\x03z\x0c\x1dTransfer from caller to Ruler\x98z\x0c\x1dTransfer from Ruler to caller\x98\xab&\x038@V\x06\x0c\x0cNOT_DEPLOYED`\x0c\x05RULERa\x0c\x0btotalSupplyb\x0c\x0cTOKEN_SYMBOLc\x0c\x0eTOKEN_DECIMALSd\x0c\x07holderse@Z8\xd2\x06'
 rTokenTemplateManifestPrefix: bytes = b'''{"name":"'''
 # rTokenTemplateManifestPrefix + token_symbol + rTokenTemplateManifestSuffix == rTokenManifest
-rTokenTemplateManifestSuffix: bytes = b''' ","groups":[],"abi":{"methods":[{"name":"main","offset":0,"parameters":[],"returntype":"String","safe":false},{"name":"symbol","offset":40,"parameters":[],"returntype":"String","safe":false},{"name":"decimals","offset":63,"parameters":[],"returntype":"Integer","safe":false},{"name":"totalSupply","offset":86,"parameters":[],"returntype":"Integer","safe":false},{"name":"balanceOf","offset":109,"parameters":[{"name":"account","type":"Hash160"}],"returntype":"Integer","safe":false},{"name":"transfer","offset":144,"parameters":[{"name":"from_address","type":"Hash160"},{"name":"to_address","type":"Hash160"},{"name":"amount","type":"Integer"},{"name":"data","type":"Any"}],"returntype":"Boolean","safe":false},{"name":"mint","offset":415,"parameters":[{"name":"account","type":"Hash160"},{"name":"amount","type":"Integer"}],"returntype":"Void","safe":false},{"name":"burnByRuler","offset":529,"parameters":[{"name":"account","type":"Hash160"},{"name":"amount","type":"Integer"}],"returntype":"Void","safe":false},{"name":"verify","offset":668,"parameters":[],"returntype":"Boolean","safe":false},{"name":"deploy","offset":694,"parameters":[{"name":"ruler","type":"Hash160"},{"name":"symbol","type":"String"},{"name":"decimals","type":"Integer"}],"returntype":"Boolean","safe":false},{"name":"onNEP17Payment","offset":803,"parameters":[{"name":"from_address","type":"Hash160"},{"name":"amount","type":"Integer"},{"name":"data","type":"Any"}],"returntype":"Void","safe":false},{"name":"_initialize","offset":877,"parameters":[],"returntype":"Void","safe":false}],"events":[{"name":"Transfer","parameters":[{"name":"from_addr","type":"Any"},{"name":"to_addr","type":"Any"},{"name":"amount","type":"Integer"}]}]},"permissions":[{"contract":"*","methods":"*"}],"trusts":[],"features":[],"supportedstandards":[],"extra":{"Author":"github.com/Hecate2","Email":"chenxinhao@ngd.neo.org","Description":"Ruler token prototype; inherited from NEP-17"}}'''
+rTokenTemplateManifestSuffix: bytes = b''' ","groups":[],"abi":{"methods":[{"name":"main","offset":0,"parameters":[],"returntype":"String","safe":false},{"name":"symbol","offset":40,"parameters":[],"returntype":"String","safe":false},{"name":"decimals","offset":63,"parameters":[],"returntype":"Integer","safe":false},{"name":"totalSupply","offset":86,"parameters":[],"returntype":"Integer","safe":false},{"name":"balanceOf","offset":109,"parameters":[{"name":"account","type":"Hash160"}],"returntype":"Integer","safe":false},{"name":"transfer","offset":144,"parameters":[{"name":"from_address","type":"Hash160"},{"name":"to_address","type":"Hash160"},{"name":"amount","type":"Integer"},{"name":"data","type":"Any"}],"returntype":"Boolean","safe":false},{"name":"transferMany","offset":345,"parameters":[{"name":"from_address","type":"Hash160"},{"name":"to_addresses","type":"Array"},{"name":"amounts","type":"Array"},{"name":"data","type":"Any"}],"returntype":"Boolean","safe":false},{"name":"getHolders","offset":806,"parameters":[{"name":"cursor","type":"ByteArray"},{"name":"max_count","type":"Integer"}],"returntype":"Array","safe":false},{"name":"mint","offset":1050,"parameters":[{"name":"account","type":"Hash160"},{"name":"amount","type":"Integer"}],"returntype":"Void","safe":false},{"name":"burnByRuler","offset":1175,"parameters":[{"name":"account","type":"Hash160"},{"name":"amount","type":"Integer"}],"returntype":"Void","safe":false},{"name":"verify","offset":1338,"parameters":[],"returntype":"Boolean","safe":false},{"name":"deploy","offset":1364,"parameters":[{"name":"ruler","type":"Hash160"},{"name":"symbol","type":"String"},{"name":"decimals","type":"Integer"}],"returntype":"Boolean","safe":false},{"name":"onNEP17Payment","offset":1473,"parameters":[{"name":"from_address","type":"Hash160"},{"name":"amount","type":"Integer"},{"name":"data","type":"Any"}],"returntype":"Void","safe":false},{"name":"_initialize","offset":1547,"parameters":[],"returntype":"Void","safe":false}],"events":[{"name":"Transfer","parameters":[{"name":"from_addr","type":"Any"},{"name":"to_addr","type":"Any"},{"name":"amount","type":"Integer"}]}]},"permissions":[{"contract":"*","methods":"*"}],"trusts":[],"features":[],"supportedstandards":[],"extra":{"Author":"github.com/Hecate2","Email":"chenxinhao@ngd.neo.org","Description":"Ruler token prototype; inherited from NEP-17"}}'''
 # TODO: run a public contract for users to access standard rToken nef and manifest?
 
 current_storage_context = get_context()
@@ -63,7 +65,12 @@ pairs_map = StorageMap(current_storage_context, b'pairs')
 # get(f'{collateral}{pairedToken}{expiry}{mintRatio}') for the index of a pair
 max_pair_index_key = b'max_pair_index'
 # pair: Dict[gen_pair_key, Any]; class Pair => attributes
-pair_map = StorageMap(current_storage_context, b'pair_')  # store attributes of pairs
+pair_map = StorageMap(current_storage_context, b'pair_')  # legacy layout: one key per attribute of pairs
+# packed_pair_map: Dict[index, serialize(List[Any])]; one record per pair, slots listed below
+packed_pair_map = StorageMap(current_storage_context, b'packedPair')
+# expiry_index_map: Dict[{expiry in 8 big-endian bytes}{pair_index.to_bytes()}, expiry]
+# Only active pairs that have not been pruned after expiry are indexed. Keys are ordered by expiry.
+expiry_index_map = StorageMap(current_storage_context, b'expiryIndex')
 
 
 """
@@ -89,6 +96,10 @@ DEPLOYED_KEY = b'DEPLOYED'
 # DECIMAL_BASE is set for non-integer mintRatio and high-precision computation
 DECIMAL_BASE = 100_000_000
 SEPARATOR = bytearray(b'_')
+# (expiry + EXPIRY_INDEX_OFFSET).to_bytes() always has 9 bytes, so that the lower 8 bytes can be reversed to big-endian
+EXPIRY_INDEX_OFFSET = 0x10000000000000000
+# how many expired pairs are removed from the expiry index each time a pair is added
+EXPIRY_INDEX_PRUNE_PER_ADD = 2
 
 
 def gen_pair_key(index: int, attribute: str) -> bytearray:
@@ -96,17 +107,60 @@ def gen_pair_key(index: int, attribute: str) -> bytearray:
 
 
 '''
-pair: stores class Pair; key pattern: {index}{attribute}
-class Pair:
-    bool active;
-    int expiry;
-    UInt160 pairedToken;  # pairedToken address
-    UInt160 rcToken;  # ruler capitol token address
-    UInt160 rrToken;  # ruler repayment token address
-    int mintRatio;  # 1e8 by default, price of collateral / collateralization ratio
-    int feeRate;  # 1e8 by default
-    int colTotal;  # used to count all the rrTokens that have been minted; usually does not need to be reduced.
+pair: stores class Pair as a serialized list in packed_pair_map; key pattern: {index}
+    Pairs written by older versions are stored in pair_map with key pattern: {index}{SEPARATOR}{attribute}
+    They are migrated to packed_pair_map the first time they are loaded.
+class Pair:  # slot in the packed list
+    bool active;  # PAIR_ACTIVE
+    int feeRate;  # PAIR_FEE_RATE; 1e8 by default
+    int mintRatio;  # PAIR_MINT_RATIO; 1e8 by default, price of collateral / collateralization ratio
+    int expiry;  # PAIR_EXPIRY
+    UInt160 pairedToken;  # PAIR_PAIRED_TOKEN; pairedToken address
+    UInt160 collateralToken;  # PAIR_COLLATERAL_TOKEN; collateral token address
+    UInt160 rcToken;  # PAIR_RC_TOKEN; ruler capitol token address
+    UInt160 rrToken;  # PAIR_RR_TOKEN; ruler repayment token address
+    int colTotal;  # PAIR_COL_TOTAL; used to count all the rrTokens that have been minted; usually does not need to be reduced.
+    int colDecimals;  # PAIR_COL_DECIMALS; decimals of collateral token, read once in addPair
+    int pairedDecimals;  # PAIR_PAIRED_DECIMALS; decimals of paired token, read once in addPair
+    int rDecimals;  # PAIR_R_DECIMALS; decimals of rcToken and rrToken
+    int colToRMultiplier;  # PAIR_COL_TO_R_MULTIPLIER; rTokenAmt = colAmt * mintRatio * colToRMultiplier // colToRDivisor
+    int colToRDivisor;  # PAIR_COL_TO_R_DIVISOR; DECIMAL_BASE applied
+    int rToColMultiplier;  # PAIR_R_TO_COL_MULTIPLIER; colAmt = rTokenAmt * rToColMultiplier // (mintRatio * rToColDivisor)
+    int rToColDivisor;  # PAIR_R_TO_COL_DIVISOR; DECIMAL_BASE applied to rToColMultiplier
+    bool usesLedger;  # PAIR_USES_LEDGER; rcToken == rrToken == the rToken ledger contract, see `setRTokenLedger`
+    bool settled;  # PAIR_SETTLED; whether the 2 attributes below have been frozen after expiry, see `settle`
+    int defaultedLoanAmt;  # PAIR_DEFAULTED_LOAN_AMT; total supply of rrToken at settlement
+    int rcTokensEligibleAtExpiry;  # PAIR_RC_TOKENS_ELIGIBLE_AT_EXPIRY; rTokens minted for colTotal at settlement
+        Each rcToken collects (rcTokensEligibleAtExpiry - defaultedLoanAmt) / rcTokensEligibleAtExpiry paired token,
+        and collateral worth defaultedLoanAmt / rcTokensEligibleAtExpiry rcToken.
 '''
+PAIR_ACTIVE = 0
+PAIR_FEE_RATE = 1
+PAIR_MINT_RATIO = 2
+PAIR_EXPIRY = 3
+PAIR_PAIRED_TOKEN = 4
+PAIR_COLLATERAL_TOKEN = 5
+PAIR_RC_TOKEN = 6
+PAIR_RR_TOKEN = 7
+PAIR_COL_TOTAL = 8
+PAIR_COL_DECIMALS = 9
+PAIR_PAIRED_DECIMALS = 10
+PAIR_R_DECIMALS = 11
+PAIR_COL_TO_R_MULTIPLIER = 12
+PAIR_COL_TO_R_DIVISOR = 13
+PAIR_R_TO_COL_MULTIPLIER = 14
+PAIR_R_TO_COL_DIVISOR = 15
+PAIR_USES_LEDGER = 16
+PAIR_SETTLED = 17
+PAIR_DEFAULTED_LOAN_AMT = 18
+PAIR_RC_TOKENS_ELIGIBLE_AT_EXPIRY = 19
+
+# rToken ledger mode: the rcTokens and rrTokens of all the pairs are kept in a single `rTokenLedger.py` contract,
+#     instead of deploying 2 `rToken.py` contracts for each pair.
+# Token ids in the ledger: {pair_index.to_bytes()}{SEPARATOR}{RC_LEG or RR_LEG}
+RTOKEN_LEDGER_KEY = b'RTOKEN_LEDGER'
+RC_LEG = b'RC'
+RR_LEG = b'RR'
 
 # feesMap: Dict[UInt160, int] = {}
 feesMap = StorageMap(current_storage_context, 'feesMap')
@@ -168,6 +222,56 @@ def setFeeReceiver(receiver: UInt160) -> bool:
     return True
 
 
+@public
+def setRTokenLedger(ledger: UInt160) -> bool:
+    """
+    Switch to rToken ledger mode: rTokens of the pairs added afterwards are kept in the `rTokenLedger.py` contract,
+        instead of 2 new `rToken.py` contracts for each pair. Pairs added before are not affected.
+    Deploy the ledger before calling this method. This method calls `deploy` of the ledger with the address of this ruler.
+    :param ledger: address of the rToken ledger contract
+    :return: True
+    """
+    administrator = get(ADMINISTRATOR_KEY)
+    assert check_witness(administrator) or calling_script_hash == administrator
+    if cast(bytes, call_contract(ledger, 'getRuler')) == b'':
+        call_contract(ledger, 'deploy', [executing_script_hash])
+    assert cast(UInt160, call_contract(ledger, 'getRuler')) == executing_script_hash, 'Ruler: the ledger belongs to another ruler'
+    put(RTOKEN_LEDGER_KEY, ledger)
+    return True
+
+
+@public
+def getRTokenLedger() -> bytes:
+    """
+    :return: address of the rToken ledger contract. b'' if rToken contracts are deployed for each pair
+    """
+    return get(RTOKEN_LEDGER_KEY)
+
+
+@public
+def setLedgerFacade(pair_index: int, leg: bytes, facade: UInt160) -> bool:
+    """
+    Register an `rTokenFacade.py` contract as the NEP-17 facade of an rToken in the rToken ledger.
+    :param pair_index: index of a pair using the rToken ledger
+    :param leg: b'RC' or b'RR'
+    :param facade: address of the deployed facade. Its `deploy` is called here if it has not been deployed
+    :return: True
+    """
+    administrator = get(ADMINISTRATOR_KEY)
+    assert check_witness(administrator) or calling_script_hash == administrator
+    pair = _load_pair(pair_index)
+    assert cast(bool, pair[PAIR_USES_LEDGER]), 'Ruler: pair does not use rToken ledger'
+    assert leg == RC_LEG or leg == RR_LEG, 'Ruler: unknown rToken'
+    ledger_address = _rTokenAddress(pair, leg)
+    token_id = _gen_ledger_token_id(pair_index, leg)
+    if cast(bytes, call_contract(facade, 'getLedger')) == b'':
+        call_contract(facade, 'deploy', [ledger_address, token_id])
+    assert cast(UInt160, call_contract(facade, 'getLedger')) == ledger_address \
+           and cast(bytes, call_contract(facade, 'getTokenId')) == token_id, 'Ruler: the facade is of another token'
+    call_contract(ledger_address, 'setFacade', [token_id, facade])
+    return True
+
+
 @public
 def collectFee(token: UInt160) -> int:
     """
@@ -180,7 +284,7 @@ def collectFee(token: UInt160) -> int:
     fee_receiver = get(FEE_RECEIVER_KEY)
     amount = feesMap.get(token).to_int()
     if amount > 0:
-        feesMap.put(token, 0)
+        feesMap.delete(token)
         assert call_contract(token, 'transfer', [executing_script_hash, fee_receiver, amount, bytearray(b'collect ') + token])
     return amount
 
@@ -189,6 +293,7 @@ def collectFee(token: UInt160) -> int:
 def collectFees() -> bool:
     """
     Collect all the fees
+    This visits every token in feesMap within one invocation. Use `collectFeesPaged` when many tokens have fees.
     No need to check witness? Because the fee is always given to the fee receiver.
     :return: True
     """
@@ -199,12 +304,88 @@ def collectFees() -> bool:
         token_bytes = token_bytes[7:]  # cut 'feesMap' at the beginning of the bytes
         token = cast(UInt160, token_bytes)
         fee_amount = cast(bytes, iterator.value[1]).to_int()
+        feesMap.delete(token)
         if fee_amount > 0:
-            feesMap.put(token, 0)
             assert call_contract(token, 'transfer', [executing_script_hash, fee_receiver, fee_amount, 'Collect Fees'])
     return True
 
 
+def _key_at_or_after(key: bytes, cursor: bytes) -> bool:
+    """
+    Whether a storage key is at or after a cursor, in the order of keys returned by `find`:
+        bytes are compared as unsigned integers one by one, and a key is before the longer keys it prefixes.
+    Paged methods resume from the first key at or after their cursor, even if the cursor has been deleted since.
+    :return: key >= cursor
+    """
+    length = len(cursor)
+    if len(key) < length:
+        length = len(key)
+    i = 0
+    while i < length:
+        key_byte: int = key[i]
+        cursor_byte: int = cursor[i]
+        if key_byte != cursor_byte:
+            return key_byte > cursor_byte
+        i = i + 1
+    return len(key) >= len(cursor)
+
+
+@public
+def collectFeesPaged(_startToken: bytes, _maxCount: int) -> bytes:
+    """
+    Collect the fees of at most _maxCount tokens, so that the fees can always be collected within the GAS limit.
+    Tokens are visited in the order of their keys in feesMap, and the collected entries are deleted from feesMap.
+    Therefore a page only visits tokens with fees, plus the tokens that accrued new fees after the previous page.
+    No need to check witness? Because the fee is always given to the fee receiver.
+    :param _startToken: the cursor returned by the previous page. b'' to start from the first token
+    :param _maxCount: the maximum amount of tokens whose fees are collected in this page
+    :return: the cursor (a token address) for the next page. b'' if there is no more fee to be collected.
+        If the cursor is no longer in feesMap (e.g. `collectFee` has been called for it),
+        the page resumes from the next token in feesMap.
+    """
+    assert _maxCount > 0, 'Ruler: _maxCount <= 0'
+    iterator = find(b'feesMap')
+    fee_receiver = get(FEE_RECEIVER_KEY)
+    started = _startToken == b''
+    collected_count = 0
+    while iterator.next():
+        token_bytes = cast(bytes, iterator.value[0])
+        token_bytes = token_bytes[7:]  # cut 'feesMap' at the beginning of the bytes
+        if not started and _key_at_or_after(token_bytes, _startToken):
+            started = True
+        if started:
+            if collected_count >= _maxCount:
+                return token_bytes
+            token = cast(UInt160, token_bytes)
+            fee_amount = cast(bytes, iterator.value[1]).to_int()
+            feesMap.delete(token)
+            if fee_amount > 0:
+                assert call_contract(token, 'transfer', [executing_script_hash, fee_receiver, fee_amount, 'Collect Fees'])
+            collected_count = collected_count + 1
+    return b''
+
+
+def _accrueFee(_token: UInt160, _fee: int):
+    """
+    Add an amount of fee of a token to feesMap.
+    Zero fees are not written, so that feesMap only contains tokens that actually have fees to be collected.
+    :param _token: the token address of the fee
+    :param _fee: the amount of fee
+    :return: None
+    """
+    if _fee > 0:
+        feesMap.put(_token, feesMap.get(_token).to_int() + _fee)
+
+
+def _gen_pairs_map_key(_col: UInt160, _paired: UInt160, _expiry: int, _mintRatio: int) -> bytes:
+    """
+    Generate the key of a pair in pairs_map
+    :return: {collateral_address}{SEPARATOR}{paired_address}{SEPARATOR}{expiry.to_bytes()}{SEPARATOR}{_mintRatio.to_bytes()}
+    """
+    return _col + SEPARATOR + _paired + SEPARATOR + bytearray(_expiry.to_bytes())\
+        + SEPARATOR + bytearray(_mintRatio.to_bytes())
+
+
 def _get_pair(_col: UInt160, _paired: UInt160, _expiry: int, _mintRatio: int) -> bytes:
     """
     Get the index of a pair. No guarantee for the existence of the pair.
@@ -215,9 +396,7 @@ def _get_pair(_col: UInt160, _paired: UInt160, _expiry: int, _mintRatio: int) ->
     :return: the integer index of the pair represented by bytes. b'' means not found
     """
     # pair = pairs[_col][_paired][_expiry][_mintRatio]
-    key = _col + SEPARATOR + _paired + SEPARATOR + bytearray(_expiry.to_bytes())\
-          + SEPARATOR + bytearray(_mintRatio.to_bytes())
-    pair = pairs_map.get(key)
+    pair = pairs_map.get(_gen_pairs_map_key(_col, _paired, _expiry, _mintRatio))
     return pair  # int or b''
 
 
@@ -235,6 +414,240 @@ def _get_pair_with_assertion(_col: UInt160, _paired: UInt160, _expiry: int, _min
     return pair.to_int()  # int
 
 
+PAIR_ATTRIBUTES = ['active', 'feeRate', 'mintRatio', 'expiry', 'pairedToken', 'collateralToken',
+                   'rcToken', 'rrToken', 'colTotal',
+                   'colDecimals', 'pairedDecimals', 'rDecimals',
+                   'colToRMultiplier', 'colToRDivisor', 'rToColMultiplier', 'rToColDivisor',
+                   'usesLedger',
+                   'settled', 'defaultedLoanAmt', 'rcTokensEligibleAtExpiry',
+                   ]  # attribute names, ordered by slot in the packed list
+
+
+def _pair_attribute_slot(attribute: str) -> int:
+    """
+    Get the slot of an attribute in the packed list of a pair.
+    :param attribute: attribute name of the pair
+    :return: the index of the attribute in the packed list; -1 if no such attribute
+    """
+    slot = 0
+    while slot < len(PAIR_ATTRIBUTES):
+        if PAIR_ATTRIBUTES[slot] == attribute:
+            return slot
+        slot = slot + 1
+    return -1
+
+
+def _load_legacy_pair(pair_index: int) -> List[Any]:
+    """
+    Read a pair stored with one key per attribute in pair_map, and convert it into the packed list.
+    :param pair_index: index of the pair
+    :return: the packed list of the pair
+    """
+    expiry = pair_map.get(gen_pair_key(pair_index, 'expiry'))
+    assert expiry != b'', 'Ruler: pair not found'
+    collateralToken = cast(UInt160, pair_map.get(gen_pair_key(pair_index, 'collateralToken')))
+    pairedToken = cast(UInt160, pair_map.get(gen_pair_key(pair_index, 'pairedToken')))
+    rcToken = cast(UInt160, pair_map.get(gen_pair_key(pair_index, 'rcToken')))
+    # legacy pairs did not record decimals. Read them once here; they are stored with the migrated pair.
+    pair: List[Any] = [
+        pair_map.get(gen_pair_key(pair_index, 'active')).to_int() != 0,
+        pair_map.get(gen_pair_key(pair_index, 'feeRate')).to_int(),
+        pair_map.get(gen_pair_key(pair_index, 'mintRatio')).to_int(),
+        expiry.to_int(),
+        pairedToken,
+        collateralToken,
+        rcToken,
+        pair_map.get(gen_pair_key(pair_index, 'rrToken')),
+        pair_map.get(gen_pair_key(pair_index, 'colTotal')).to_int(),
+    ]
+    _append_decimals_and_scale_factors(pair,
+                                       cast(int, call_contract(collateralToken, "decimals", [])),
+                                       cast(int, call_contract(pairedToken, "decimals", [])),
+                                       cast(int, call_contract(rcToken, "decimals", [])))
+    pair.append(False)  # legacy pairs always deployed rToken contracts
+    _append_settlement(pair)
+    return pair
+
+
+def _append_settlement(_pair: List[Any]):
+    """
+    Append the attributes of an unsettled pair (see `settle`) to the packed list
+    :param _pair: the packed list of the pair, ending with usesLedger
+    :return: None
+    """
+    _pair.append(False)
+    _pair.append(0)
+    _pair.append(0)
+
+
+def _unpack_pair(packed_pair: bytes) -> List[Any]:
+    """
+    Deserialize a pair from packed_pair_map.
+    Pairs packed before settlement was introduced end with usesLedger; they are read as unsettled.
+    :param packed_pair: the serialized list of the pair
+    :return: the packed list of the pair
+    """
+    pair = cast(List[Any], deserialize(packed_pair))
+    if len(pair) == PAIR_SETTLED:
+        _append_settlement(pair)
+    return pair
+
+
+def _append_decimals_and_scale_factors(_pair: List[Any], _col_decimals: int, _paired_decimals: int, _r_decimals: int):
+    """
+    Append decimals of the tokens, and the power-of-ten factors used by amount conversions, to a packed pair.
+    Refer to `_getRTokenAmtFromColAmt` and `_getColAmtFromRTokenAmt`.
+    :param _pair: the packed list of the pair, filled up to PAIR_COL_TOTAL
+    :param _col_decimals: decimals of collateral token
+    :param _paired_decimals: decimals of paired token
+    :param _r_decimals: decimals of rcToken and rrToken
+    :return: None
+    """
+    _pair.append(_col_decimals)
+    _pair.append(_paired_decimals)
+    _pair.append(_r_decimals)
+    delta_decimals = _paired_decimals - _col_decimals
+    if delta_decimals >= 0:
+        _pair.append(10 ** delta_decimals)
+        _pair.append(DECIMAL_BASE)
+    else:
+        delta_decimals = -delta_decimals
+        _pair.append(1)
+        _pair.append(DECIMAL_BASE * 10 ** delta_decimals)
+    delta_decimals = _col_decimals - _r_decimals
+    if delta_decimals >= 0:
+        _pair.append(10 ** delta_decimals * DECIMAL_BASE)
+        _pair.append(1)
+    else:
+        delta_decimals = -delta_decimals
+        _pair.append(DECIMAL_BASE)
+        _pair.append(10 ** delta_decimals)
+
+
+def _read_pair(pair_index: int) -> List[Any]:
+    """
+    Read all the attributes of a pair without writing storage. Used by read-only methods.
+    A pair still stored in the legacy layout is converted, but not migrated.
+    :param pair_index: index of the pair
+    :return: the packed list of the pair. Use the PAIR_* constants to access its attributes
+    """
+    packed_pair = packed_pair_map.get(pair_index.to_bytes())
+    if packed_pair != b'':
+        return _unpack_pair(packed_pair)
+    return _load_legacy_pair(pair_index)
+
+
+def _load_pair(pair_index: int) -> List[Any]:
+    """
+    Read all the attributes of a pair with a single storage read.
+    A pair still stored in the legacy layout is migrated into packed_pair_map, and its legacy keys are deleted.
+    :param pair_index: index of the pair
+    :return: the packed list of the pair. Use the PAIR_* constants to access its attributes
+    """
+    packed_pair = packed_pair_map.get(pair_index.to_bytes())
+    if packed_pair != b'':
+        return _unpack_pair(packed_pair)
+    pair = _load_legacy_pair(pair_index)
+    _save_pair(pair_index, pair)
+    slot = 0
+    while slot <= PAIR_COL_TOTAL:  # attributes after colTotal were never stored in the legacy layout
+        pair_map.delete(gen_pair_key(pair_index, PAIR_ATTRIBUTES[slot]))
+        slot = slot + 1
+    return pair
+
+
+def _save_pair(pair_index: int, pair: List[Any]):
+    """
+    Write all the attributes of a pair with a single storage write.
+    :param pair_index: index of the pair
+    :param pair: the packed list of the pair
+    :return: None
+    """
+    packed_pair_map.put(pair_index.to_bytes(), serialize(pair))
+
+
+@public
+def migratePair(pair_index: int) -> bool:
+    """
+    Move a pair stored in the legacy layout (one key per attribute) into the packed layout.
+    Pairs are also migrated lazily whenever they are loaded, so calling this method is optional.
+    :param pair_index: index of the pair
+    :return: True
+    """
+    _load_pair(pair_index)
+    return True
+
+
+def _gen_expiry_index_key(_expiry: int, pair_index: int) -> bytearray:
+    """
+    Generate the key of a pair in expiry_index_map. Big-endian expiry makes the storage order the order of expiry
+    :return: {expiry in 8 big-endian bytes}{pair_index.to_bytes()}
+    """
+    assert 0 <= _expiry and _expiry < EXPIRY_INDEX_OFFSET, 'Ruler: expiry out of range'
+    little_endian = (_expiry + EXPIRY_INDEX_OFFSET).to_bytes()
+    key = bytearray(b'')
+    i = 8
+    while i > 0:
+        i = i - 1
+        key = key + little_endian[i:i + 1]
+    return key + pair_index.to_bytes()
+
+
+def _updateExpiryIndex(pair_index: int, pair: List[Any]):
+    """
+    Index the pair by expiry if it is active and not expired. Otherwise remove it from the index.
+    :param pair_index: index of the pair
+    :param pair: the packed list of the pair
+    :return: None
+    """
+    expiry = cast(int, pair[PAIR_EXPIRY])
+    key = _gen_expiry_index_key(expiry, pair_index)
+    if cast(bool, pair[PAIR_ACTIVE]) and expiry > time:
+        expiry_index_map.put(key, expiry)
+    else:
+        expiry_index_map.delete(key)
+
+
+def _pruneExpiryIndex(_maxCount: int) -> int:
+    """
+    Remove at most _maxCount expired pairs from the beginning of the expiry index
+    :return: the amount of pairs removed
+    """
+    iterator = find(b'expiryIndex')
+    pruned_count = 0
+    while pruned_count < _maxCount and iterator.next():
+        if cast(bytes, iterator.value[1]).to_int() > time:
+            return pruned_count  # the remaining pairs expire even later
+        key_bytes = cast(bytes, iterator.value[0])
+        expiry_index_map.delete(key_bytes[11:])  # cut 'expiryIndex' at the beginning of the bytes
+        pruned_count = pruned_count + 1
+    return pruned_count
+
+
+@public
+def indexPair(pair_index: int) -> bool:
+    """
+    Add a pair created by older versions to the expiry index, or remove it if it is paused or expired.
+    Pairs are indexed automatically when they are added or set active, so calling this method is usually not needed.
+    :param pair_index: index of the pair
+    :return: True
+    """
+    _updateExpiryIndex(pair_index, _load_pair(pair_index))
+    return True
+
+
+@public
+def pruneExpiryIndex(_maxCount: int) -> int:
+    """
+    Remove expired pairs from the expiry index, so that `getLivePairs` visits only pairs that have not expired.
+    `addPair` also prunes a few expired pairs, so calling this method is optional.
+    :param _maxCount: the maximum amount of pairs removed
+    :return: the amount of pairs removed
+    """
+    assert _maxCount > 0, 'Ruler: _maxCount <= 0'
+    return _pruneExpiryIndex(_maxCount)
+
+
 @public
 def get_pair_attribute(pair_index: int, attribute: str) -> bytes:
     """
@@ -243,12 +656,18 @@ def get_pair_attribute(pair_index: int, attribute: str) -> bytes:
     :param attribute: attribute name of the pair
     :return: attribute value of the pair, represented by bytes
     """
-    return pair_map.get(gen_pair_key(pair_index, attribute))
+    slot = _pair_attribute_slot(attribute)
+    assert slot >= 0, 'Ruler: unknown pair attribute'
+    value = _read_pair(pair_index)[slot]
+    if slot == PAIR_PAIRED_TOKEN or slot == PAIR_COLLATERAL_TOKEN or slot == PAIR_RC_TOKEN or slot == PAIR_RR_TOKEN:
+        return cast(bytes, value)
+    return cast(int, value).to_bytes()
 
 
 def _insert_pair(active: bool, feeRate: int, mintRatio: int, expiry: int,
                  collateralToken: UInt160, pairedToken: UInt160,
-                 rcToken: UInt160, rrToken: UInt160, colTotal: int) -> int:
+                 rcToken: UInt160, rrToken: UInt160, colTotal: int,
+                 colDecimals: int, pairedDecimals: int, usesLedger: bool) -> int:
     """
     Create a new pair, writing its attributes.
     This method does not consider whether the pair already exists. Check existence before you call `_insert_pair`
@@ -266,20 +685,20 @@ def _insert_pair(active: bool, feeRate: int, mintRatio: int, expiry: int,
     :param rrToken: the rrToken address for this pair
     :param colTotal: the total amount of collateral that has been deposited into this pair.
         Usually set to 0 when created.
+    :param colDecimals: decimals of the collateral token
+    :param pairedDecimals: decimals of the paired token. rcToken and rrToken are deployed with the same decimals
+    :param usesLedger: whether rcToken and rrToken are kept in the rToken ledger. If True, rcToken == rrToken == ledger
     :return: the index of the new pair
     """
     max_index = get(max_pair_index_key).to_int()
     max_index = max_index + 1
     put(max_pair_index_key, max_index)
-    pair_map.put(gen_pair_key(max_index, "active"), active)
-    pair_map.put(gen_pair_key(max_index, "feeRate"), feeRate)
-    pair_map.put(gen_pair_key(max_index, "mintRatio"), mintRatio)
-    pair_map.put(gen_pair_key(max_index, "expiry"), expiry)
-    pair_map.put(gen_pair_key(max_index, "pairedToken"), pairedToken)
-    pair_map.put(gen_pair_key(max_index, "collateralToken"), collateralToken)
-    pair_map.put(gen_pair_key(max_index, "rcToken"), rcToken)
-    pair_map.put(gen_pair_key(max_index, "rrToken"), rrToken)
-    pair_map.put(gen_pair_key(max_index, "colTotal"), colTotal)
+    pair: List[Any] = [active, feeRate, mintRatio, expiry, pairedToken, collateralToken, rcToken, rrToken, colTotal]
+    _append_decimals_and_scale_factors(pair, colDecimals, pairedDecimals, pairedDecimals)
+    pair.append(usesLedger)
+    _append_settlement(pair)
+    _save_pair(max_index, pair)
+    _updateExpiryIndex(max_index, pair)
     return max_index
 
 
@@ -298,21 +717,33 @@ def mmDeposit(invoker: UInt160, _col: UInt160, _paired: UInt160, _expiry: int, _
     :return: True (since the amount of minted rcToken always equals the amount of paired token paid)
     """
     pair_index = _get_pair_with_assertion(_col, _paired, _expiry, _mintRatio)
-    _validateDepositInputs(pair_index)
+    _mmDeposit(invoker, pair_index, _load_pair(pair_index), _rcTokenAmt)
+    return True
+
+
+def _mmDeposit(invoker: UInt160, pair_index: int, pair: List[Any], _rcTokenAmt: int) -> int:
+    """
+    Execute `mmDeposit` on a loaded pair. Refer to `mmDeposit`
+    :param invoker: The wallet address that will pay paired tokens to get rcTokens
+    :param pair_index: index of the pair
+    :param pair: the packed list of the pair, loaded by `_load_pair`. Modified and saved by this method
+    :param _rcTokenAmt: how many paired tokens to be deposited for the same amount of rcTokens
+    :return: the amount of rcTokens minted
+    """
+    _paired = cast(UInt160, pair[PAIR_PAIRED_TOKEN])
+    _validateDepositInputs(pair)
     assert call_contract(_paired, "transfer", [invoker, executing_script_hash, _rcTokenAmt, "Transfer from caller to Ruler"]), "Failed to transfer paired token from caller to Ruler"
     
-    rcToken_address = cast(UInt160, get_pair_attribute(pair_index, 'rcToken'))
-    call_contract(rcToken_address, "mint", [invoker, _rcTokenAmt])
+    _mintRToken(pair_index, pair, RC_LEG, invoker, _rcTokenAmt)
 
-    feeRate = get_pair_attribute(pair_index, 'feeRate').to_int()
-    feesMap.put(_paired, feesMap.get(_paired).to_int() + _rcTokenAmt * feeRate // DECIMAL_BASE)
+    feeRate = cast(int, pair[PAIR_FEE_RATE])
+    _accrueFee(_paired, _rcTokenAmt * feeRate // DECIMAL_BASE)
     
-    colAmount = _getColAmtFromRTokenAmt(_rcTokenAmt, _col, rcToken_address, _mintRatio)
-    colTotal_key = gen_pair_key(pair_index, 'colTotal')
-    colTotal = pair_map.get(colTotal_key).to_int()
-    pair_map.put(colTotal_key, colTotal + colAmount)
+    colAmount = _getColAmtFromRTokenAmt(_rcTokenAmt, pair)
+    pair[PAIR_COL_TOTAL] = cast(int, pair[PAIR_COL_TOTAL]) + colAmount
+    _save_pair(pair_index, pair)
 
-    return True
+    return _rcTokenAmt
 
 
 @public
@@ -328,75 +759,159 @@ def deposit(invoker: UInt160, _col: UInt160, _paired: UInt160, _expiry: int, _mi
         for mintRatio * _colAmt rcTokens and mintRatio * _colAmt rrTokens (assuming no decimals here)
     :return: The amount of rToken minted
     """
-    pair = _get_pair_with_assertion(_col, _paired, _expiry, _mintRatio)
+    pair_index = _get_pair_with_assertion(_col, _paired, _expiry, _mintRatio)
+    return _deposit(invoker, pair_index, _load_pair(pair_index), _colAmt)
+
+
+def _deposit(invoker: UInt160, pair_index: int, pair: List[Any], _colAmt: int) -> int:
+    """
+    Execute `deposit` on a loaded pair. Refer to `deposit`
+    :param invoker: The wallet address that will pay collateral to get rcTokens and rrTokens
+    :param pair_index: index of the pair
+    :param pair: the packed list of the pair, loaded by `_load_pair`. Modified and saved by this method
+    :param _colAmt: how many collateral tokens will be deposited
+    :return: The amount of rToken minted
+    """
+    _col = cast(UInt160, pair[PAIR_COLLATERAL_TOKEN])
     _validateDepositInputs(pair)
     # Before taking collateral from message sender,
     # get the balance of collateral of this contract
     assert call_contract(_col, "transfer", [invoker, executing_script_hash, _colAmt, "Transfer from caller to Ruler"]), "Failed to transfer collateral from caller to ruler."
-    colTotal_key = gen_pair_key(pair, "colTotal")
-    pair_map.put(colTotal_key, pair_map.get(colTotal_key).to_int() + _colAmt)
-    mintAmount = _getRTokenAmtFromColAmt(_colAmt, _col, _paired, _mintRatio)
-    rcToken_address = cast(UInt160, get_pair_attribute(pair, "rcToken"))
-    call_contract(rcToken_address, "mint", [invoker, mintAmount])
-    rrToken_address = cast(UInt160, get_pair_attribute(pair, "rrToken"))
-    call_contract(rrToken_address, "mint", [invoker, mintAmount])
-    # The following codes lead to 2 DROP instructions after System.Contract.Call, and there would be exception
-    # call_contract(cast(UInt160, get_pair_attribute(pair, "rcToken")), "mint", [invoker, mintAmount])
-    # call_contract(cast(UInt160, get_pair_attribute(pair, "rrToken")), "mint", [invoker, mintAmount])
+    pair[PAIR_COL_TOTAL] = cast(int, pair[PAIR_COL_TOTAL]) + _colAmt
+    _save_pair(pair_index, pair)
+    mintAmount = _getRTokenAmtFromColAmt(_colAmt, pair)
+    _mintBothRTokens(pair_index, pair, invoker, mintAmount)
     return mintAmount
 
 
-def _getRTokenAmtFromColAmt(_colAmt: int, _col: UInt160, _paired: UInt160, _mintRatio: int) -> int:
+def _gen_ledger_token_id(pair_index: int, leg: bytes) -> bytes:
+    """
+    :param pair_index: index of the pair
+    :param leg: RC_LEG or RR_LEG
+    :return: the token id of an rToken in the rToken ledger
+    """
+    return bytearray(pair_index.to_bytes()) + SEPARATOR + leg
+
+
+def _rTokenAddress(pair: List[Any], leg: bytes) -> UInt160:
+    """
+    :param pair: the packed list of the pair, loaded by `_load_pair`
+    :param leg: RC_LEG or RR_LEG
+    :return: the contract managing the rToken. The rToken ledger if the pair uses the ledger
+    """
+    if leg == RC_LEG:
+        return cast(UInt160, pair[PAIR_RC_TOKEN])
+    return cast(UInt160, pair[PAIR_RR_TOKEN])
+
+
+def _mintRToken(pair_index: int, pair: List[Any], leg: bytes, account: UInt160, amount: int):
+    """
+    Mint rcTokens or rrTokens of a pair, in an rToken contract or in the rToken ledger
+    :param pair_index: index of the pair
+    :param pair: the packed list of the pair, loaded by `_load_pair`
+    :param leg: RC_LEG or RR_LEG
+    :param account: the wallet receiving the minted rTokens
+    :param amount: the amount of rTokens to mint
+    :return: None
+    """
+    rToken_address = _rTokenAddress(pair, leg)
+    if cast(bool, pair[PAIR_USES_LEDGER]):
+        call_contract(rToken_address, "mint", [_gen_ledger_token_id(pair_index, leg), account, amount])
+    else:
+        call_contract(rToken_address, "mint", [account, amount])
+
+
+def _burnRToken(pair_index: int, pair: List[Any], leg: bytes, account: UInt160, amount: int):
+    """
+    Burn rcTokens or rrTokens of a pair, in an rToken contract or in the rToken ledger
+    :param pair_index: index of the pair
+    :param pair: the packed list of the pair, loaded by `_load_pair`
+    :param leg: RC_LEG or RR_LEG
+    :param account: the wallet whose rTokens are burned
+    :param amount: the amount of rTokens to burn
+    :return: None
+    """
+    rToken_address = _rTokenAddress(pair, leg)
+    if cast(bool, pair[PAIR_USES_LEDGER]):
+        call_contract(rToken_address, "burnByRuler", [_gen_ledger_token_id(pair_index, leg), account, amount])
+    else:
+        call_contract(rToken_address, "burnByRuler", [account, amount])
+
+
+def _mintBothRTokens(pair_index: int, pair: List[Any], account: UInt160, amount: int):
+    """
+    Mint the same amount of rcTokens and rrTokens of a pair. A single call if the pair uses the rToken ledger
+    :return: None
+    """
+    if cast(bool, pair[PAIR_USES_LEDGER]):
+        ledger_address = _rTokenAddress(pair, RC_LEG)
+        call_contract(ledger_address, "mintPair", [pair_index, account, amount])
+    else:
+        _mintRToken(pair_index, pair, RC_LEG, account, amount)
+        _mintRToken(pair_index, pair, RR_LEG, account, amount)
+
+
+def _burnBothRTokens(pair_index: int, pair: List[Any], account: UInt160, amount: int):
+    """
+    Burn the same amount of rcTokens and rrTokens of a pair. A single call if the pair uses the rToken ledger
+    :return: None
+    """
+    if cast(bool, pair[PAIR_USES_LEDGER]):
+        ledger_address = _rTokenAddress(pair, RC_LEG)
+        call_contract(ledger_address, "burnPairByRuler", [pair_index, account, amount])
+    else:
+        _burnRToken(pair_index, pair, RC_LEG, account, amount)
+        _burnRToken(pair_index, pair, RR_LEG, account, amount)
+
+
+def _rTokenTotalSupply(pair_index: int, pair: List[Any], leg: bytes) -> int:
+    """
+    :return: the total supply of rcTokens or rrTokens of a pair
+    """
+    rToken_address = _rTokenAddress(pair, leg)
+    if cast(bool, pair[PAIR_USES_LEDGER]):
+        return cast(int, call_contract(rToken_address, "totalSupplyOf", [_gen_ledger_token_id(pair_index, leg)]))
+    return cast(int, call_contract(rToken_address, "totalSupply", []))
+
+
+def _getRTokenAmtFromColAmt(_colAmt: int, _pair: List[Any]) -> int:
     """
     Compute the amount of rTokens of a pair, given the amount of collateral
+    Decimals of the tokens are not read from the token contracts,
+        but from the scale factors stored with the pair in `addPair`
     :param _colAmt: How many collateral tokens are given
-    :param _col: pair attribute: address of the collateral token
-    :param _paired: pair attribute: address of the paired token
-    :param _mintRatio: pair attribute: mint ratio: 1 collateral token for how many rToken. DECIMAL_BASE applied.
+    :param _pair: the packed list of the pair, loaded by `_load_pair`
     :return: the amount of rTokens
     """
-    # potential optimization: save the number of decimals as an attribute of pair?
-    parity_token_decimals = call_contract(_paired, "decimals")
-    collateral_token_decimals = call_contract(_col, "decimals")
-    delta_decimals = cast(int, parity_token_decimals) - cast(int, collateral_token_decimals)
-    if delta_decimals >= 0:
-        return _colAmt * _mintRatio * (10 ** delta_decimals) // DECIMAL_BASE
-    else:
-        delta_decimals = -delta_decimals
-        return _colAmt * _mintRatio // (DECIMAL_BASE * 10 ** delta_decimals)
-        # is // a good choice?
-        # TODO: consider / instead of //
+    return _colAmt * cast(int, _pair[PAIR_MINT_RATIO]) * cast(int, _pair[PAIR_COL_TO_R_MULTIPLIER]) \
+        // cast(int, _pair[PAIR_COL_TO_R_DIVISOR])
+    # is // a good choice?
+    # TODO: consider / instead of //
 
 
-def _getColAmtFromRTokenAmt(_rTokenAmt: int, _col: UInt160, _rToken: UInt160, _mintRatio: int) -> int:
+def _getColAmtFromRTokenAmt(_rTokenAmt: int, _pair: List[Any]) -> int:
     """
     Compute the amount of collateral of a pair, given the amount of rTokens
+    Decimals of the tokens are not read from the token contracts,
+        but from the scale factors stored with the pair in `addPair`
     :param _rTokenAmt: How many rTokens are given
-    :param _col: pair attribute: address of the collateral token
-    :param _rToken: pair attribute: address of the rToken
-    :param _mintRatio: pair attribute: mint ratio: 1 collateral token for how many rToken. DECIMAL_BASE applied.
+    :param _pair: the packed list of the pair, loaded by `_load_pair`
     :return: the amount of collateral
     """
-    r_token_decimals = call_contract(_rToken, "decimals")
-    collateral_token_decimals = call_contract(_col, "decimals")
-    delta_decimals = cast(int, collateral_token_decimals) - cast(int, r_token_decimals)
-    if delta_decimals >= 0:
-        return _rTokenAmt * (10 ** delta_decimals) * DECIMAL_BASE // _mintRatio
-    else:
-        delta_decimals = -delta_decimals
-        return _rTokenAmt * DECIMAL_BASE // (_mintRatio * 10 ** delta_decimals)
-        # is // a good choice?
-        # TODO: consider / instead of //
+    return _rTokenAmt * cast(int, _pair[PAIR_R_TO_COL_MULTIPLIER]) \
+        // (cast(int, _pair[PAIR_MINT_RATIO]) * cast(int, _pair[PAIR_R_TO_COL_DIVISOR]))
+    # is // a good choice?
+    # TODO: consider / instead of //
 
 
-def _validateDepositInputs(_pair: int):
+def _validateDepositInputs(_pair: List[Any]):
     """
     On calling `deposit` and `mmDeposit`, assert the pair is active and has not expired
-    :param _pair: the index of the pair
+    :param _pair: the packed list of the pair, loaded by `_load_pair`
     :return: None
     """
-    assert get_pair_attribute(_pair, "active"), "Ruler: pair inactive"
-    assert get_pair_attribute(_pair, "expiry").to_int() > time, "Ruler: pair expired"
+    assert cast(bool, _pair[PAIR_ACTIVE]), "Ruler: pair inactive"
+    assert cast(int, _pair[PAIR_EXPIRY]) > time, "Ruler: pair expired"
     # TODO: Oracle
     # If the price of collateral (in USD) is too low compared with the paired token, stop new deposits.
 
@@ -413,20 +928,29 @@ def redeem(invoker: UInt160, _col: UInt160, _paired: UInt160, _expiry: int, _min
     :param _rTokenAmt: How many rTokens will be given to get collateral
     :return: The amount of collateral paid to invoker
     """
-    pair = _get_pair_with_assertion(_col, _paired, _expiry, _mintRatio)
-    assert time < get_pair_attribute(pair, 'expiry').to_int(), 'Ruler: pair expired'
+    pair_index = _get_pair_with_assertion(_col, _paired, _expiry, _mintRatio)
+    return _redeem(invoker, pair_index, _load_pair(pair_index), _rTokenAmt)
+
+
+def _redeem(invoker: UInt160, pair_index: int, pair: List[Any], _rTokenAmt: int) -> int:
+    """
+    Execute `redeem` on a loaded pair. Refer to `redeem`
+    :param invoker: The wallet that gives rrTokens and rcTokens to receive collateral
+    :param pair_index: index of the pair
+    :param pair: the packed list of the pair, loaded by `_load_pair`. Modified and saved by this method
+    :param _rTokenAmt: How many rTokens will be given to get collateral
+    :return: The amount of collateral paid to invoker
+    """
+    _col = cast(UInt160, pair[PAIR_COLLATERAL_TOKEN])
+    assert time < cast(int, pair[PAIR_EXPIRY]), 'Ruler: pair expired'
     
-    rcToken_address = cast(UInt160, get_pair_attribute(pair, 'rcToken'))
-    call_contract(rcToken_address, 'burnByRuler', [invoker, _rTokenAmt])
-    rrToken_address = cast(UInt160, get_pair_attribute(pair, 'rrToken'))
-    call_contract(rrToken_address, 'burnByRuler', [invoker, _rTokenAmt])
+    _burnBothRTokens(pair_index, pair, invoker, _rTokenAmt)
     
-    colAmountToPay = _getColAmtFromRTokenAmt(_rTokenAmt, _col, rcToken_address, _mintRatio)
-    colTotal_key = gen_pair_key(pair, 'colTotal')
-    colTotal = pair_map.get(colTotal_key).to_int()
-    pair_map.put(colTotal_key, colTotal - colAmountToPay)
+    colAmountToPay = _getColAmtFromRTokenAmt(_rTokenAmt, pair)
+    pair[PAIR_COL_TOTAL] = cast(int, pair[PAIR_COL_TOTAL]) - colAmountToPay
+    _save_pair(pair_index, pair)
     
-    feeRate = get_pair_attribute(pair, 'feeRate').to_int()
+    feeRate = cast(int, pair[PAIR_FEE_RATE])
     colAmountToPay_after_fees = _sendAmtPostFeesOptionalAccrue(invoker, _col, colAmountToPay, feeRate, True)
 
     return colAmountToPay_after_fees
@@ -445,17 +969,29 @@ def repay(invoker: UInt160, _col: UInt160, _paired: UInt160, _expiry: int, _mint
     :param _rrTokenAmt: How many rTokens and paired tokens will be paid to get collateral
     :return: the amount of collateral paid back
     """
-    pair = _get_pair_with_assertion(_col, _paired, _expiry, _mintRatio)
-    assert get_pair_attribute(pair, "expiry").to_int() > time, "Ruler: pair expired"
+    pair_index = _get_pair_with_assertion(_col, _paired, _expiry, _mintRatio)
+    return _repay(invoker, pair_index, _load_pair(pair_index), _rrTokenAmt)
+
+
+def _repay(invoker: UInt160, pair_index: int, pair: List[Any], _rrTokenAmt: int) -> int:
+    """
+    Execute `repay` on a loaded pair. Refer to `repay`
+    :param invoker: The wallet that pays rrTokens and paired tokens to get collateral.
+    :param pair_index: index of the pair
+    :param pair: the packed list of the pair, loaded by `_load_pair`
+    :param _rrTokenAmt: How many rTokens and paired tokens will be paid to get collateral
+    :return: the amount of collateral paid back
+    """
+    _col = cast(UInt160, pair[PAIR_COLLATERAL_TOKEN])
+    _paired = cast(UInt160, pair[PAIR_PAIRED_TOKEN])
+    assert cast(int, pair[PAIR_EXPIRY]) > time, "Ruler: pair expired"
 
     assert call_contract(_paired, "transfer", [invoker, executing_script_hash, _rrTokenAmt, "Transfer from caller to Ruler"])
-    rrToken_address = cast(UInt160, get_pair_attribute(pair, "rrToken"))
-    call_contract(rrToken_address, "burnByRuler", [invoker, _rrTokenAmt])
+    _burnRToken(pair_index, pair, RR_LEG, invoker, _rrTokenAmt)
     
-    feesMap.put(_paired, feesMap.get(_paired).to_int() + _rrTokenAmt * get_pair_attribute(pair, 'feeRate').to_int() // DECIMAL_BASE)
+    _accrueFee(_paired, _rrTokenAmt * cast(int, pair[PAIR_FEE_RATE]) // DECIMAL_BASE)
 
-    rcToken_address = cast(UInt160, get_pair_attribute(pair, "rcToken"))
-    colAmountToPay = _getColAmtFromRTokenAmt(_rrTokenAmt, _col, rcToken_address, get_pair_attribute(pair, "mintRatio").to_int())
+    colAmountToPay = _getColAmtFromRTokenAmt(_rrTokenAmt, pair)
     assert call_contract(_col, "transfer", [executing_script_hash, invoker, colAmountToPay, "Transfer from Ruler to caller"])
     
     return colAmountToPay
@@ -473,35 +1009,45 @@ def collect(invoker: UInt160, _col: UInt160, _paired: UInt160, _expiry: int, _mi
     :param _rcTokenAmt: How many rcTokens will be paid for paired tokens (and maybe collateral)
     :return: How many paired token is collected
     """
-    pair = _get_pair_with_assertion(_col, _paired, _expiry, _mintRatio)
-    assert time > get_pair_attribute(pair, "expiry").to_int(), "Ruler: loan not expired"
-    rcToken_address = cast(UInt160, get_pair_attribute(pair, "rcToken"))
-    call_contract(rcToken_address, "burnByRuler", [invoker, _rcTokenAmt])
+    pair_index = _get_pair_with_assertion(_col, _paired, _expiry, _mintRatio)
+    return _collect(invoker, pair_index, _load_pair(pair_index), _rcTokenAmt)
+
+
+def _collect(invoker: UInt160, pair_index: int, pair: List[Any], _rcTokenAmt: int) -> int:
+    """
+    Execute `collect` on a loaded pair. Refer to `collect`
+    :param invoker: The wallet that pay the rcTokens to get paired tokens (and maybe collateral)
+    :param pair_index: index of the pair
+    :param pair: the packed list of the pair, loaded by `_load_pair`
+    :param _rcTokenAmt: How many rcTokens will be paid for paired tokens (and maybe collateral)
+    :return: How many paired token is collected
+    """
+    _col = cast(UInt160, pair[PAIR_COLLATERAL_TOKEN])
+    _settle(pair_index, pair)
+    _burnRToken(pair_index, pair, RC_LEG, invoker, _rcTokenAmt)
     
-    rrToken_address = cast(UInt160, get_pair_attribute(pair, "rrToken"))
-    defaultedLoanAmt = cast(int, call_contract(rrToken_address, "totalSupply", []))
+    defaultedLoanAmt = cast(int, pair[PAIR_DEFAULTED_LOAN_AMT])
     
-    pairedToken_address = cast(UInt160, get_pair_attribute(pair, "pairedToken"))
+    pairedToken_address = cast(UInt160, pair[PAIR_PAIRED_TOKEN])
+    feeRate = cast(int, pair[PAIR_FEE_RATE])
     if defaultedLoanAmt == 0:
         # fees have been accrued when paired tokens are paid to ruler
-        paired_token_collected = _sendAmtPostFeesOptionalAccrue(invoker, pairedToken_address, _rcTokenAmt, get_pair_attribute(pair, "feeRate").to_int(), False)
+        paired_token_collected = _sendAmtPostFeesOptionalAccrue(invoker, pairedToken_address, _rcTokenAmt, feeRate, False)
         return paired_token_collected
     else:
         # some loan defaulted!
-        mintRatio = get_pair_attribute(pair, "mintRatio").to_int()
-        feeRate = get_pair_attribute(pair, "feeRate").to_int()
         # compute the amount of paired token that can be collected
         # colTotal is the total amount of collateral that have been paid in history.
         # colTotal does not decrease when `repay` is called, but only deduced when `redeem` is called.
         # colTotal represents how much loan is borrowed without being redeemed
         # Therefore, rcTokensEligibleAtExpiry represents the amount of total paired tokens that should have been repaid
-        rcTokensEligibleAtExpiry = _getRTokenAmtFromColAmt(get_pair_attribute(pair, "colTotal").to_int(), _col, _paired, mintRatio)
+        rcTokensEligibleAtExpiry = cast(int, pair[PAIR_RC_TOKENS_ELIGIBLE_AT_EXPIRY])
         pairedTokenAmtToCollect = _rcTokenAmt * (rcTokensEligibleAtExpiry - defaultedLoanAmt) // rcTokensEligibleAtExpiry
         # fees have been accrued when paired tokens are paid to ruler
         paired_token_collected = _sendAmtPostFeesOptionalAccrue(invoker, pairedToken_address, pairedTokenAmtToCollect, feeRate, False)
         
         # compute the amount of collateral that can be collected
-        colAmount = _getColAmtFromRTokenAmt(_rcTokenAmt, _col, rcToken_address, mintRatio)
+        colAmount = _getColAmtFromRTokenAmt(_rcTokenAmt, pair)
         colAmountToCollect = colAmount * defaultedLoanAmt // rcTokensEligibleAtExpiry
         # fees have not been accrued for collateral
         _sendAmtPostFeesOptionalAccrue(invoker, _col, colAmountToCollect, feeRate, True)
@@ -509,6 +1055,181 @@ def collect(invoker: UInt160, _col: UInt160, _paired: UInt160, _expiry: int, _mi
         return paired_token_collected
 
 
+def _settle(pair_index: int, pair: List[Any]):
+    """
+    Freeze the amount of defaulted loan and the rcTokens eligible at expiry into the pair, if not done yet.
+    After expiry `repay`, `redeem` and deposits are closed, so these amounts can no longer change,
+        and later `collect`s read them from the pair instead of calling the rrToken.
+    :param pair_index: index of the pair
+    :param pair: the packed list of the pair, loaded by `_load_pair`. Modified and saved by this method
+    :return: None
+    """
+    if cast(bool, pair[PAIR_SETTLED]):
+        return
+    assert time > cast(int, pair[PAIR_EXPIRY]), "Ruler: loan not expired"
+    pair[PAIR_DEFAULTED_LOAN_AMT] = _rTokenTotalSupply(pair_index, pair, RR_LEG)
+    pair[PAIR_RC_TOKENS_ELIGIBLE_AT_EXPIRY] = _getRTokenAmtFromColAmt(cast(int, pair[PAIR_COL_TOTAL]), pair)
+    pair[PAIR_SETTLED] = True
+    _save_pair(pair_index, pair)
+
+
+@public
+def settle(pair_index: int) -> bool:
+    """
+    Settle an expired pair. Anyone can call this after expiry.
+    The first `collect` after expiry settles the pair anyway, so calling this method is optional.
+    :param pair_index: index of the pair
+    :return: True
+    """
+    _settle(pair_index, _load_pair(pair_index))
+    return True
+
+
+@public
+def collectForHolders(pair_index: int, _cursor: bytes, _maxCount: int) -> bytes:
+    """
+    Collect for a page of rcToken holders of an expired pair, so that holders do not have to `collect` by themselves.
+    All the rcTokens of each holder are burned, and the holder is paid what `collect` would pay.
+    No need to check witness? Because the holders are always paid what they can collect.
+    Holders that are deployed contracts are skipped, and have to `collect` by themselves:
+        their onNEP17Payment may abort, which cannot be caught, and would fail the whole page.
+    Not available for pairs in rToken ledger mode, and for rcTokens deployed before the holder index was introduced.
+    :param pair_index: index of the pair
+    :param _cursor: the cursor returned by the previous page. b'' to start from the first holder
+    :param _maxCount: the maximum amount of holders collected for in this page
+    :return: the cursor (a holder address) for the next page. b'' if all the holders have been visited.
+        If the cursor holder empties its balance before the next page, the next page resumes from the holder after it.
+    """
+    assert _maxCount > 0, 'Ruler: _maxCount <= 0'
+    pair = _load_pair(pair_index)
+    assert not cast(bool, pair[PAIR_USES_LEDGER]), 'Ruler: no holder index in rToken ledger mode'
+    _settle(pair_index, pair)
+    page = cast(List[Any], call_contract(cast(UInt160, pair[PAIR_RC_TOKEN]), 'getHolders', [_cursor, _maxCount]))
+    holders = cast(List[List[Any]], page[1])
+    i = 0
+    while i < len(holders):
+        holder = holders[i]
+        holder_address = cast(UInt160, holder[0])
+        if isinstance(get_contract(holder_address), None):
+            _collect(holder_address, pair_index, pair, cast(int, holder[1]))
+        i = i + 1
+    return cast(bytes, page[0])
+
+
+@public
+def multicall(invoker: UInt160, _operations: List[List[Any]]) -> List[int]:
+    """
+    Execute a batch of `deposit`, `mmDeposit`, `repay`, `redeem` and `collect` atomically in a single invocation.
+    Each pair is looked up in pairs_map and loaded from storage only once, however many operations use it.
+    The witness of invoker is checked once before the batch, to fail early.
+        Token transfers from invoker are still authorized by the token contracts for each operation.
+    If any of the operations fails, the whole batch fails.
+    :param invoker: The wallet executing all the operations
+    :param _operations: [[operation_name, _col, _paired, _expiry, _mintRatio, amount], ...]
+        operation_name: 'deposit', 'mmDeposit', 'repay', 'redeem' or 'collect'
+        amount: _colAmt for deposit; _rcTokenAmt for mmDeposit and collect; _rrTokenAmt for repay; _rTokenAmt for redeem
+    :return: the result of each operation, in the order of _operations. `mmDeposit` results in the amount of rcTokens
+    """
+    assert check_witness(invoker) or calling_script_hash == invoker, 'Ruler: no witness of invoker'
+    # keys of pairs_map are converted to str: they are Buffers at runtime, which cannot be keys of a Map
+    pair_indexes: Dict[str, int] = {}
+    loaded_pairs: Dict[int, List[Any]] = {}
+    results: List[int] = []
+    for operation in _operations:
+        operation_name = cast(str, operation[0])
+        amount = cast(int, operation[5])
+        pairs_map_key = _gen_pairs_map_key(cast(UInt160, operation[1]), cast(UInt160, operation[2]),
+                                           cast(int, operation[3]), cast(int, operation[4])).to_str()
+        if pairs_map_key in pair_indexes:
+            pair_index = pair_indexes[pairs_map_key]
+        else:
+            index_bytes = pairs_map.get(pairs_map_key)
+            assert index_bytes != b''
+            pair_index = index_bytes.to_int()
+            pair_indexes[pairs_map_key] = pair_index
+            loaded_pairs[pair_index] = _load_pair(pair_index)
+        pair = loaded_pairs[pair_index]
+        if operation_name == 'deposit':
+            results.append(_deposit(invoker, pair_index, pair, amount))
+        elif operation_name == 'mmDeposit':
+            results.append(_mmDeposit(invoker, pair_index, pair, amount))
+        elif operation_name == 'repay':
+            results.append(_repay(invoker, pair_index, pair, amount))
+        elif operation_name == 'redeem':
+            results.append(_redeem(invoker, pair_index, pair, amount))
+        elif operation_name == 'collect':
+            results.append(_collect(invoker, pair_index, pair, amount))
+        else:
+            assert False, 'Ruler: unknown operation'
+    return results
+
+
+@public
+def mmDepositByIndex(invoker: UInt160, pair_index: int, _rcTokenAmt: int) -> bool:
+    """
+    The same as `mmDeposit`, but the pair is addressed by its index (find this through `getPairsMap`).
+    This skips building the key of pairs_map and reading the index from storage.
+    :param invoker: refer to `mmDeposit`
+    :param pair_index: index of the pair
+    :param _rcTokenAmt: how many paired tokens to be deposited for the same amount of rcTokens
+    :return: True
+    """
+    _mmDeposit(invoker, pair_index, _load_pair(pair_index), _rcTokenAmt)
+    return True
+
+
+@public
+def depositByIndex(invoker: UInt160, pair_index: int, _colAmt: int) -> int:
+    """
+    The same as `deposit`, but the pair is addressed by its index (find this through `getPairsMap`).
+    This skips building the key of pairs_map and reading the index from storage.
+    :param invoker: refer to `deposit`
+    :param pair_index: index of the pair
+    :param _colAmt: how many collateral tokens will be deposited
+    :return: The amount of rToken minted
+    """
+    return _deposit(invoker, pair_index, _load_pair(pair_index), _colAmt)
+
+
+@public
+def redeemByIndex(invoker: UInt160, pair_index: int, _rTokenAmt: int) -> int:
+    """
+    The same as `redeem`, but the pair is addressed by its index (find this through `getPairsMap`).
+    This skips building the key of pairs_map and reading the index from storage.
+    :param invoker: refer to `redeem`
+    :param pair_index: index of the pair
+    :param _rTokenAmt: How many rTokens will be given to get collateral
+    :return: The amount of collateral paid to invoker
+    """
+    return _redeem(invoker, pair_index, _load_pair(pair_index), _rTokenAmt)
+
+
+@public
+def repayByIndex(invoker: UInt160, pair_index: int, _rrTokenAmt: int) -> int:
+    """
+    The same as `repay`, but the pair is addressed by its index (find this through `getPairsMap`).
+    This skips building the key of pairs_map and reading the index from storage.
+    :param invoker: refer to `repay`
+    :param pair_index: index of the pair
+    :param _rrTokenAmt: How many rTokens and paired tokens will be paid to get collateral
+    :return: the amount of collateral paid back
+    """
+    return _repay(invoker, pair_index, _load_pair(pair_index), _rrTokenAmt)
+
+
+@public
+def collectByIndex(invoker: UInt160, pair_index: int, _rcTokenAmt: int) -> int:
+    """
+    The same as `collect`, but the pair is addressed by its index (find this through `getPairsMap`).
+    This skips building the key of pairs_map and reading the index from storage.
+    :param invoker: refer to `collect`
+    :param pair_index: index of the pair
+    :param _rcTokenAmt: How many rcTokens will be paid for paired tokens (and maybe collateral)
+    :return: How many paired token is collected
+    """
+    return _collect(invoker, pair_index, _load_pair(pair_index), _rcTokenAmt)
+
+
 def _sendAmtPostFeesOptionalAccrue(invoker: UInt160, _token: UInt160, _amount: int, _feeRate: int, _accrue: bool) -> int:
     """
     Transfer collateral or paired tokens to invoker.
@@ -527,8 +1248,7 @@ def _sendAmtPostFeesOptionalAccrue(invoker: UInt160, _token: UInt160, _amount: i
     amount_to_pay = _amount - fees
     assert call_contract(_token, "transfer", [executing_script_hash, invoker, amount_to_pay, "collect paired token from ruler with rcTokens"])
     if _accrue:
-        original_fee = feesMap.get(_token).to_int()
-        feesMap.put(_token, original_fee + fees)
+        _accrueFee(_token, fees)
     return amount_to_pay
 
 
@@ -541,32 +1261,35 @@ def _modifyManifestName(_symbol: bytes) -> bytes:
     return rTokenTemplateManifestPrefix + _symbol + rTokenTemplateManifestSuffix
 
 
-def _createRToken(_col: UInt160, _paired: UInt160, _expiry: int, _expiryStr: str, _mintRatioStr: str, _prefix: bytes, _paired_token_decimals: int) -> UInt160:
+def _genRTokenSymbol(_col_symbol: bytes, _paired_symbol: bytes, _expiryStr: str, _mintRatioStr: str, _prefix: bytes) -> bytes:
     """
-    Deploy an rToken contract, and call its `deploy` method to set its attributes
-    :param _col: pair attribute: address of the collateral token
-    :param _paired: pair attribute: address of the paired token
-    :param _expiry: pair attribute: expiry timestamp in milliseconds
+    :param _col_symbol: symbol of the collateral token
+    :param _paired_symbol: symbol of the paired token
     :param _expiryStr: string representation of expiry. Usually a date. Refer to RC_TOKEN_NAME_PATTERN
     :param _mintRatioStr: string representation of mint ratio
     :param _prefix: b'RC_' or b'RR_'
+    :return: symbol of the rToken. Refer to RC_TOKEN_NAME_PATTERN
+    """
+    return bytearray(_prefix) + \
+        bytearray(_col_symbol) + \
+        SEPARATOR + \
+        bytearray(_mintRatioStr.to_bytes()) + \
+        SEPARATOR + \
+        bytearray(_paired_symbol) + \
+        SEPARATOR + \
+        bytearray(_expiryStr.to_bytes())
+
+
+def _createRToken(symbol: bytes, _paired_token_decimals: int) -> UInt160:
+    """
+    Deploy an rToken contract, and call its `deploy` method to set its attributes
+    :param symbol: symbol of the rToken, generated by `_genRTokenSymbol`
     :param _paired_token_decimals: decimals of paired token
     :return: the address of the new rToken contract
     """
-    col_symbol = cast(bytes, call_contract(_col, "symbol", []))
-    paired_symbol = cast(bytes, call_contract(_paired, "symbol", []))
-    symbol = bytearray(_prefix) + \
-             bytearray(col_symbol) + \
-             SEPARATOR + \
-             bytearray(_mintRatioStr.to_bytes()) + \
-             SEPARATOR + \
-             bytearray(paired_symbol) + \
-             SEPARATOR + \
-             bytearray(_expiryStr.to_bytes())
     modified_manifest = _modifyManifestName(symbol)
     contract = create_contract(rTokenTemplateNef, modified_manifest)
-    paired_decimals = cast(int, call_contract(_paired, "decimals", []))
-    call_contract(contract.hash, 'deploy', [executing_script_hash, symbol, paired_decimals])
+    call_contract(contract.hash, 'deploy', [executing_script_hash, symbol, _paired_token_decimals])
     return contract.hash
 
 
@@ -596,6 +1319,11 @@ def addPair(_col: UInt160, _paired: UInt160, _expiry: int, _expiryStr: str, _min
     # assert minColRatioMap.get(_col).to_int() > 0, "Ruler: collateral not listed"
     # minColRatioMap.put(_paired, DECIMAL_BASE)
     paired_token_decimals = cast(int, call_contract(_paired, "decimals", []))
+    collateral_token_decimals = cast(int, call_contract(_col, "decimals", []))
+    col_symbol = cast(bytes, call_contract(_col, "symbol", []))
+    paired_symbol = cast(bytes, call_contract(_paired, "symbol", []))
+    rc_symbol = _genRTokenSymbol(col_symbol, paired_symbol, _expiryStr, _mintRatioStr, bytearray(RC_LEG) + SEPARATOR)
+    rr_symbol = _genRTokenSymbol(col_symbol, paired_symbol, _expiryStr, _mintRatioStr, bytearray(RR_LEG) + SEPARATOR)
     # pair: Dict[str, Any] = {
     #     'active': True,
     #     'feeRate': _feeRate,
@@ -603,25 +1331,29 @@ def addPair(_col: UInt160, _paired: UInt160, _expiry: int, _expiryStr: str, _min
     #     'expiry': _expiry,
     #     'pairedToken': _paired,
     #     'collateralToken': _col,
-    #     'rcToken': _createRToken(_col, _paired, _expiry, _expiryStr, _mintRatioStr, "RC_", paired_token_decimals),
-    #     'rrToken': _createRToken(_col, _paired, _expiry, _expiryStr, _mintRatioStr, "RR_", paired_token_decimals),
+    #     'rcToken': _createRToken(rc_symbol, paired_token_decimals),
+    #     'rrToken': _createRToken(rr_symbol, paired_token_decimals),
     #     'colTotal': 0,
     # }
     administrator = get(ADMINISTRATOR_KEY)
-    if check_witness(administrator) or calling_script_hash == administrator:
-        pair = _insert_pair(True, _feeRate, _mintRatio, _expiry, _col, _paired,
-                     _createRToken(_col, _paired, _expiry, _expiryStr, _mintRatioStr, bytearray(b"RC") + SEPARATOR, paired_token_decimals),
-                     _createRToken(_col, _paired, _expiry, _expiryStr, _mintRatioStr, bytearray(b"RR") + SEPARATOR, paired_token_decimals),
-                     0)
+    # pair not active if created by the public
+    active = check_witness(administrator) or calling_script_hash == administrator
+    ledger = get(RTOKEN_LEDGER_KEY)
+    if ledger == b'':
+        pair = _insert_pair(active, _feeRate, _mintRatio, _expiry, _col, _paired,
+                     _createRToken(rc_symbol, paired_token_decimals),
+                     _createRToken(rr_symbol, paired_token_decimals),
+                     0, collateral_token_decimals, paired_token_decimals, False)
     else:
-        # pair not active if created by the public
-        pair = _insert_pair(False, _feeRate, _mintRatio, _expiry, _col, _paired,
-                     _createRToken(_col, _paired, _expiry, _expiryStr, _mintRatioStr, bytearray(b"RC") + SEPARATOR, paired_token_decimals),
-                     _createRToken(_col, _paired, _expiry, _expiryStr, _mintRatioStr, bytearray(b"RR") + SEPARATOR, paired_token_decimals),
-                     0)
-    pairs_map.put(_col + SEPARATOR + _paired + SEPARATOR + bytearray(_expiry.to_bytes()) +
-                  SEPARATOR + bytearray(_mintRatio.to_bytes()), pair)
+        # no contract deployment in ledger mode; the rTokens are registered in the ledger
+        ledger_address = cast(UInt160, ledger)
+        pair = _insert_pair(active, _feeRate, _mintRatio, _expiry, _col, _paired,
+                     ledger_address, ledger_address,
+                     0, collateral_token_decimals, paired_token_decimals, True)
+        call_contract(ledger_address, 'registerPair', [pair, rc_symbol, rr_symbol, paired_token_decimals])
+    pairs_map.put(_gen_pairs_map_key(_col, _paired, _expiry, _mintRatio), pair)
     collaterals.put(_col, True)
+    _pruneExpiryIndex(EXPIRY_INDEX_PRUNE_PER_ADD)
     return pair
     
 
@@ -641,7 +1373,7 @@ def flashLoan(_receiver: UInt160, _token: UInt160, _amount: int, _data: Any) ->
     fee = get(FLASH_LOAN_RATE_KEY).to_int() * _amount // DECIMAL_BASE
     assert call_contract(_receiver, 'onFlashLoan', [calling_script_hash, _token, _amount, fee, _data]), "Failed to execute method 'onFlashLoan' of flashLoan receiver"
     assert call_contract(_token, "transfer", [_receiver, executing_script_hash, _amount + fee, _data]), "Failed to transfer from flashLoan receiver to Ruler"
-    feesMap.put(_token, feesMap.get(_token).to_int() + fee)
+    _accrueFee(_token, fee)
     return True
 
 
@@ -657,6 +1389,7 @@ def getCollaterals() -> Iterator:
 def getPairsMap(_col: UInt160) -> Iterator:
     """
     Get the allowed paired token of a collateral (find a collateral with `getCollaterals`)
+    Every pair ever created for the collateral is listed. Use `getLivePairs` to list only pairs that have not expired
     :param _col: the collateral token address as the key to the paired token addresses
     :return: b'pairs'{collateral_address}{SEPARATOR}{paired_address}{SEPARATOR}{expiry.to_bytes()}{SEPARATOR}{_mintRatio.to_bytes()}: pair_index.to_bytes()
     """
@@ -664,13 +1397,66 @@ def getPairsMap(_col: UInt160) -> Iterator:
 
 
 @public
-def getPairAttributes(_pair: int) -> Iterator:
+def getLivePairs(_after: int, _maxCount: int, _cursor: bytes) -> List[Any]:
+    """
+    List the active pairs expiring after a timestamp, in the order of expiry.
+    Only the expiry index is visited, so the cost is proportional to the pairs that are active and not pruned,
+        instead of all the pairs ever created as in `getPairsMap`.
+    :param _after: only pairs with expiry > _after are listed. Usually the current timestamp in milliseconds
+    :param _maxCount: the maximum amount of pairs listed in this page
+    :param _cursor: the cursor returned by the previous page. b'' to start from the earliest expiry
+    :return: [cursor for the next page (b'' if there is no more pair), [pair_index]].
+        The cursor is the key of the first pair not listed. If that pair is paused or pruned before the next page,
+        the next page resumes from the pair after it in the order of (expiry, index).
+    """
+    assert _maxCount > 0, 'Ruler: _maxCount <= 0'
+    iterator = find(b'expiryIndex')
+    started = _cursor == b''
+    pair_indexes: List[int] = []
+    while iterator.next():
+        key_bytes = cast(bytes, iterator.value[0])
+        key_bytes = key_bytes[11:]  # cut 'expiryIndex' at the beginning of the bytes
+        if not started and _key_at_or_after(key_bytes, _cursor):
+            started = True
+        if started and cast(bytes, iterator.value[1]).to_int() > _after:
+            if len(pair_indexes) >= _maxCount:
+                return [key_bytes, pair_indexes]
+            pair_indexes.append(key_bytes[8:].to_int())  # cut the big-endian expiry
+    return [b'', pair_indexes]
+
+
+@public
+def getPairAttributes(_pair: int) -> Dict[str, Any]:
     """
     Get all the attributes of a pair
     :param _pair: index of a pair (find this through `getPairsMap`)
-    :return: b'pair_'{index.to_bytes()}{SEPARATOR}{attribute.to_bytes()}: attribute_value
+    :return: {attribute_name: attribute_value}
+    """
+    pair = _read_pair(_pair)
+    attributes: Dict[str, Any] = {}
+    slot = 0
+    while slot < len(PAIR_ATTRIBUTES):
+        attributes[PAIR_ATTRIBUTES[slot]] = pair[slot]
+        slot = slot + 1
+    return attributes
+
+
+@public
+def getPairSnapshot(_pair: int) -> List[Any]:
+    """
+    Get everything needed to display a pair in a single read-only call
+    :param _pair: index of a pair (find this through `getPairsMap`)
+    :return: [all the attributes ordered as PAIR_ATTRIBUTES,
+        totalSupply of rcToken, totalSupply of rrToken, fees accrued in paired token, whether the pair has expired]
     """
-    return find(bytearray(b'pair_') + bytearray(_pair.to_bytes()) + SEPARATOR)
+    pair = _read_pair(_pair)
+    rcToken_supply = _rTokenTotalSupply(_pair, pair, RC_LEG)
+    rrToken_supply = _rTokenTotalSupply(_pair, pair, RR_LEG)
+    pair.append(rcToken_supply)
+    pair.append(rrToken_supply)
+    pair.append(feesMap.get(cast(UInt160, pair[PAIR_PAIRED_TOKEN])).to_int())
+    pair.append(time > cast(int, pair[PAIR_EXPIRY]))
+    return pair
 
 
 @public
@@ -696,10 +1482,18 @@ def setPaused(_col: UInt160, _paired: UInt160, _expiry: int, _mintRatio: int) ->
     :param _mintRatio: pair attribute: mint ratio: 1 collateral token for how many rToken. DECIMAL_BASE applied.
     :return: True
     """
-    administrator = get(ADMINISTRATOR_KEY)
-    assert check_witness(administrator) or calling_script_hash == administrator
-    pair_index = _get_pair_with_assertion(_col, _paired, _expiry, _mintRatio)
-    pair_map.put(gen_pair_key(pair_index, 'active'), False)
+    _setPairActive(_get_pair_with_assertion(_col, _paired, _expiry, _mintRatio), False)
+    return True
+
+
+@public
+def setPausedByIndex(pair_index: int) -> bool:
+    """
+    The same as `setPaused`, but the pair is addressed by its index (find this through `getPairsMap`)
+    :param pair_index: index of the pair
+    :return: True
+    """
+    _setPairActive(pair_index, False)
     return True
 
 
@@ -713,11 +1507,34 @@ def setActive(_col: UInt160, _paired: UInt160, _expiry: int, _mintRatio: int) ->
     :param _mintRatio: pair attribute: mint ratio: 1 collateral token for how many rToken. DECIMAL_BASE applied.
     :return: True
     """
+    _setPairActive(_get_pair_with_assertion(_col, _paired, _expiry, _mintRatio), True)
+    return True
+
+
+@public
+def setActiveByIndex(pair_index: int) -> bool:
+    """
+    The same as `setActive`, but the pair is addressed by its index (find this through `getPairsMap`)
+    :param pair_index: index of the pair
+    :return: True
+    """
+    _setPairActive(pair_index, True)
+    return True
+
+
+def _setPairActive(pair_index: int, active: bool):
+    """
+    Set the pair's attribute 'active'. Only the administrator can do this
+    :param pair_index: index of the pair
+    :param active: whether new deposits are allowed
+    :return: None
+    """
     administrator = get(ADMINISTRATOR_KEY)
     assert check_witness(administrator) or calling_script_hash == administrator
-    pair_index = _get_pair_with_assertion(_col, _paired, _expiry, _mintRatio)
-    pair_map.put(gen_pair_key(pair_index, 'active'), True)
-    return True
+    pair = _load_pair(pair_index)
+    pair[PAIR_ACTIVE] = active
+    _save_pair(pair_index, pair)
+    _updateExpiryIndex(pair_index, pair)
 
 
 @public
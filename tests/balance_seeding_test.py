@@ -0,0 +1,67 @@
+import time
+
+from neo_test_with_vm import TestEngine
+from neo_test_with_vm.storage_layout import NEP17BalanceLayout
+
+from neo3.core.types import UInt160
+from neo3.vm import VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), 0])
+rcToken = engine.ruler_storage().pair(1)['rcToken']
+
+# balances beyond 0x7fffffff
+engine.invoke_method_of_arbitrary_contract(gas.hash, 'totalSupply')
+gas_total_supply = engine.analyze_results(result_decoded=True)[1]
+big = 2 ** 70 + 1
+engine.set_NEP17_token_balances([(neo, contract_owner_hash, 2 ** 40), (gas, contract_owner_hash, big), (rcToken, contract_owner_hash, big)])
+for token, expected in [(neo.hash, 2 ** 40), (gas.hash, big), (rcToken, big)]:
+    engine.invoke_method_of_arbitrary_contract(token, 'balanceOf', [contract_owner_hash])
+    assert engine.analyze_results(result_decoded=True)[1] == expected
+engine.invoke_method_of_arbitrary_contract(gas.hash, 'totalSupply')
+assert engine.analyze_results(result_decoded=True)[1] == gas_total_supply + big
+engine.invoke_method_of_arbitrary_contract(rcToken, 'totalSupply')
+assert engine.analyze_results(result_decoded=True)[1] == big
+
+# seeded balances can be transferred as usual
+engine.invoke_method_of_arbitrary_contract(gas.hash, 'transfer', [contract_owner_hash, '0' * 40, big - 1, None])
+assert engine.state == VMState.HALT
+engine.invoke_method_with_print("deposit", params=[contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, 2 ** 39])
+assert engine.state == VMState.HALT
+
+# thousands of accounts in a single commit
+accounts = [UInt160((i + 1).to_bytes(20, 'little')) for i in range(10_000)]
+rToken = engine.rToken_storage(rcToken)
+rcToken_total_supply = rToken.total_supply()
+start = time.perf_counter()
+engine.set_NEP17_token_balances([(token, account, 10 ** 20) for account in accounts for token in (gas, rcToken)])
+print(f'seeded {2 * len(accounts)} balances in {time.perf_counter() - start:.3f}s')
+assert rToken.balance_of(accounts[-1]) == 10 ** 20 and len(rToken.holders()) == len(accounts) + 1
+
+# 0 removes balances
+engine.set_NEP17_token_balances([(rcToken, account, 0) for account in accounts])
+assert rToken.balance_of(accounts[-1]) == 0 and len(rToken.holders()) == 1
+assert rToken.total_supply() == rcToken_total_supply
+
+
+# layouts missing any of balance_key, encode_balance and decode_balance cannot be constructed
+class IncompleteLayout(NEP17BalanceLayout):
+    def balance_key(self, account: bytes) -> bytes:
+        return account
+
+
+try:
+    IncompleteLayout()
+    raise AssertionError('an incomplete NEP17BalanceLayout was constructed')
+except TypeError:
+    pass
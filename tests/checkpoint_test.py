@@ -0,0 +1,53 @@
+from neo_test_with_vm import TestEngine
+
+from neo3.core.types import UInt160
+from neo3.network.payloads import Signer, WitnessScope
+from neo3.vm import IntegerStackItem, VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds, EngineResultInterpreter
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+fee_rate = 0 * DECIMAL_BASE
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate])
+assert engine.state == VMState.HALT and engine.result_stack.peek() == IntegerStackItem(1)
+engine.invoke_method_with_print('getPairAttributes', params=[1], result_interpreted_as_iterator=True, further_interpreter=EngineResultInterpreter.interpret_getPairAttribtutes)
+rcToken_address = engine.previous_processed_result['rcToken']
+engine.set_NEP17_token_balance(neo, contract_owner_hash)
+engine.set_NEP17_token_balance(gas, contract_owner_hash)
+
+deployed_and_funded = engine.checkpoint()
+
+for deposit_amount in [1, 100, 1]:  # each scenario starts from the same state
+    engine.restore(deployed_and_funded)
+    engine.get_rToken_balance(rcToken_address, contract_owner_hash)
+    assert engine.result_stack.peek() == IntegerStackItem(0)
+    engine.invoke_method_with_print("deposit", params=[contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, deposit_amount],
+                                    signers=[Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)])
+    assert engine.state == VMState.HALT
+    engine.get_rToken_balance(rcToken_address, contract_owner_hash)
+    assert engine.result_stack.peek() == IntegerStackItem(deposit_amount * mint_ratio)
+
+# the addPair below is only in the branch after restore
+engine.restore(deployed_and_funded)
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio + 1, str(mint_ratio + 1), fee_rate])
+assert engine.result_stack.peek() == IntegerStackItem(2)
+engine.restore(deployed_and_funded)
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio + 1, str(mint_ratio + 1), fee_rate])
+assert engine.result_stack.peek() == IntegerStackItem(2)
+
+# engines built from the cached genesis state do not share any state
+another_engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+another_engine.invoke_method_with_print('deploy', [contract_owner_hash])
+another_engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate])
+assert another_engine.result_stack.peek() == IntegerStackItem(1)
+engine.reset_environment()
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+assert engine.state == VMState.HALT
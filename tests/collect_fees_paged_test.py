@@ -0,0 +1,87 @@
+from neo_test_with_vm import TestEngine
+
+from neo3.core.types import UInt160
+from neo3.network.payloads import Signer, WitnessScope
+from neo3.vm import VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds, Hash160Str
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+fee_receiver_hash = '1' * 40
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+# a third token to accrue fees in
+test_token = engine.deploy_another_contract('rToken.nef')
+engine.invoke_method_of_arbitrary_contract(test_token, 'deploy', [contract_owner_hash, b'TEST_FEES', 6])
+assert engine.state == VMState.HALT
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+fee_rate = DECIMAL_BASE // 10
+signers = [Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)]
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.invoke_method_with_print('setFeeReceiver', [fee_receiver_hash])
+# fees are accrued in the paired tokens: GAS for pair 1, NEO for pair 2, and the test token for pair 3
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str,
+                                                   7 * DECIMAL_BASE, str(7 * DECIMAL_BASE), fee_rate])
+engine.invoke_method_with_print("addPair", params=[gas.hash, neo.hash, _30_days_later_ending_milisecond, _30_days_later_date_str + '+GAS',
+                                                   DECIMAL_BASE, str(DECIMAL_BASE), fee_rate])
+engine.invoke_method_with_print("addPair", params=[neo.hash, test_token, _30_days_later_ending_milisecond, _30_days_later_date_str + '+TEST',
+                                                   7 * DECIMAL_BASE, str(7 * DECIMAL_BASE), fee_rate])
+assert engine.state == VMState.HALT
+ruler = engine.ruler_storage()
+expected_fees = {Hash160Str.from_UInt160(gas.hash): 7 * DECIMAL_BASE, Hash160Str.from_UInt160(neo.hash): 1,
+                 Hash160Str.from_UInt160(test_token): 7 * 10 ** 6}
+# in the order of keys in feesMap
+tokens = sorted(expected_fees, key=lambda token: token.to_UInt160().to_array())
+
+
+def accrue_fees():
+    engine.set_NEP17_token_balance(neo, contract_owner_hash, 100)
+    engine.set_NEP17_token_balance(gas, contract_owner_hash, 100 * DECIMAL_BASE)
+    engine.set_NEP17_token_balances([(test_token, contract_owner_hash, 100 * 10 ** 6)])
+    for pair_index, col_amount, rToken_amount in [(1, 10, 70 * DECIMAL_BASE), (2, 10 * DECIMAL_BASE, 10), (3, 10, 70 * 10 ** 6)]:
+        engine.invoke_method_with_print("depositByIndex", params=[contract_owner_hash, pair_index, col_amount], signers=signers)
+        engine.invoke_method_with_print("repayByIndex", params=[contract_owner_hash, pair_index, rToken_amount], signers=signers)
+        assert engine.state == VMState.HALT
+    assert ruler.fees_map() == expected_fees
+
+
+def balance(token: UInt160, account) -> int:
+    engine.invoke_method_of_arbitrary_contract(token, 'balanceOf', [account])
+    return engine.analyze_results(result_decoded=True)[1]
+
+
+def assert_fees_received(times: int):
+    for token, fee in expected_fees.items():
+        assert balance(token.to_UInt160(), fee_receiver_hash) == times * fee
+
+
+accrue_fees()
+engine.invoke_method_with_print('collectFeesPaged', [b'', 0])
+assert engine.state == VMState.FAULT
+
+# one token in each page; the collected entries are deleted, and the cursor is the next token with fees
+cursor = b''
+for i, token in enumerate(tokens):
+    engine.invoke_method('collectFeesPaged', [cursor, 1])
+    assert engine.state == VMState.HALT
+    cursor = engine.analyze_results(result_decoded=True)[1]
+    assert cursor == (tokens[i + 1].to_UInt160().to_array() if i + 1 < len(tokens) else b'')
+    assert ruler.fees_map() == {token: expected_fees[token] for token in tokens[i + 1:]}
+assert_fees_received(1)
+engine.invoke_method('collectFeesPaged', [b'', 1])
+assert engine.state == VMState.HALT and engine.analyze_results(result_decoded=True)[1] == b''
+
+# the cursor is deleted by collectFee between 2 pages: the next page resumes from the token after it
+accrue_fees()
+engine.invoke_method('collectFeesPaged', [b'', 1])
+cursor = engine.analyze_results(result_decoded=True)[1]
+assert cursor == tokens[1].to_UInt160().to_array()
+engine.invoke_method_with_print('collectFee', [tokens[1]])
+assert engine.state == VMState.HALT and ruler.fees_map() == {tokens[2]: expected_fees[tokens[2]]}
+engine.invoke_method('collectFeesPaged', [cursor, 1])
+assert engine.state == VMState.HALT and engine.analyze_results(result_decoded=True)[1] == b''
+assert ruler.fees_map() == {}
+assert_fees_received(2)
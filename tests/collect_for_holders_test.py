@@ -0,0 +1,81 @@
+from neo_test_with_vm import TestEngine
+
+from neo3.core.types import UInt160
+from neo3.network.payloads import Signer, WitnessScope
+from neo3.vm import VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+another_hash = '1' * 40
+third_hash = '2' * 40
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+signers = [Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)]
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), 0])
+pair = engine.ruler_storage().pair(1)
+rcToken, rrToken = pair['rcToken'], pair['rrToken']
+engine.set_NEP17_token_balance(neo, contract_owner_hash, 100)
+engine.set_NEP17_token_balance(gas, contract_owner_hash, 100 * DECIMAL_BASE)
+
+# all the loans repaid, so that rcTokens are collected for paired tokens only
+engine.invoke_method_with_print("depositByIndex", params=[contract_owner_hash, 1, 10], signers=signers)
+engine.invoke_method_with_print("repayByIndex", params=[contract_owner_hash, 1, 10 * mint_ratio], signers=signers)
+assert engine.state == VMState.HALT
+# holders: the owner, 2 other wallets, and a contract (the rrToken) whose onNEP17Payment aborts for paired tokens
+engine.invoke_method_of_arbitrary_contract(rcToken, 'transfer', [contract_owner_hash, another_hash, 2 * mint_ratio, None])
+engine.invoke_method_of_arbitrary_contract(rcToken, 'transfer', [contract_owner_hash, third_hash, mint_ratio, None])
+engine.invoke_method_of_arbitrary_contract(rcToken, 'transfer', [contract_owner_hash, rrToken, mint_ratio, 'Transfer from caller to Ruler'])
+rcToken_storage = engine.rToken_storage(rcToken)
+holder_keys = sorted(rcToken_storage.holders())
+assert len(holder_keys) == 4
+
+
+def gas_balance(account) -> int:
+    engine.invoke_method_of_arbitrary_contract(gas.hash, 'balanceOf', [account])
+    return engine.analyze_results(result_decoded=True)[1]
+
+
+owner_gas, another_gas, third_gas, rrToken_gas = \
+    gas_balance(contract_owner_hash), gas_balance(another_hash), gas_balance(third_hash), gas_balance(rrToken)
+
+# not expired
+engine.invoke_method_with_print("collectForHolders", params=[1, b'', 10])
+assert engine.state == VMState.FAULT
+
+engine.set_time(pair['expiry'] + 1)
+# the first page stops before the last wallet in the order of keys.
+# That wallet collects by itself before the next page, which resumes from the holder after it
+wallets = {bytes.fromhex(account)[::-1]: account for account in [contract_owner_hash, another_hash, third_hash]}
+cursor_wallet_key = max(wallets)
+engine.invoke_method("collectForHolders", params=[1, b'', holder_keys.index(cursor_wallet_key)], signers=[another_hash])
+assert engine.state == VMState.HALT
+cursor = engine.analyze_results(result_decoded=True)[1]
+assert cursor == cursor_wallet_key
+cursor_wallet = wallets[cursor_wallet_key]
+engine.invoke_method('collectByIndex', params=[cursor_wallet, 1, rcToken_storage.balance_of(cursor_wallet)], signers=[cursor_wallet])
+assert engine.state == VMState.HALT and cursor_wallet_key not in rcToken_storage.holders()
+pages = 1
+while cursor != b'':
+    engine.invoke_method("collectForHolders", params=[1, cursor, 1], signers=[another_hash])
+    assert engine.state == VMState.HALT  # anyone can collect for holders
+    cursor = engine.analyze_results(result_decoded=True)[1]
+    pages += 1
+assert pages == 1 + max(1, len(holder_keys) - holder_keys.index(cursor_wallet_key) - 1)
+
+# wallets are paid what they collect, and their rcTokens are burned
+assert gas_balance(contract_owner_hash) == owner_gas + 6 * mint_ratio
+assert gas_balance(another_hash) == another_gas + 2 * mint_ratio
+assert gas_balance(third_hash) == third_gas + mint_ratio
+assert all(rcToken_storage.balance_of(wallet) == 0 for wallet in wallets.values())
+# the contract is skipped instead of failing the page, and can still collect by itself
+assert gas_balance(rrToken) == rrToken_gas
+assert rcToken_storage.balance_of(rrToken) == mint_ratio
+assert rcToken_storage.holders() == {rrToken.to_UInt160().to_array(): mint_ratio}
+assert rcToken_storage.total_supply() == mint_ratio
@@ -0,0 +1,44 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from neo_test_with_vm import TestEngine
+from neo_test_with_vm.contract_cache import ContractCache
+
+from neo3.vm import VMState
+
+# engines of the same contract share the parsed nef and manifest
+TestEngine.contract_cache.clear()
+engine = TestEngine('ruler.nef')
+misses = TestEngine.contract_cache.misses
+start = time.perf_counter()
+engines = [TestEngine('ruler.nef') for _ in range(20)]
+print(f'20 engines in {time.perf_counter() - start:.3f}s')
+assert TestEngine.contract_cache.misses == misses and TestEngine.contract_cache.hits >= 20
+assert engines[-1].manifest is engine.manifest and engines[-1].nef is engine.nef
+engines[-1].invoke_method('get_decimal_base')
+assert engines[-1].state == VMState.HALT
+
+cache_dir = tempfile.mkdtemp()
+try:
+    # parsed contracts are reused between runs through the cache dir
+    cache = ContractCache(cache_dir)
+    raw_nef, raw_manifest, nef, manifest = cache.load('ruler.nef')
+    assert cache.misses == 1 and len(os.listdir(cache_dir)) == 1
+    cache = ContractCache(cache_dir)  # a new process
+    raw_nef_2, raw_manifest_2, nef_2, manifest_2 = cache.load('ruler.nef')
+    assert cache.misses == 0 and cache.hits == 1
+    assert raw_nef_2 == raw_nef and raw_manifest_2 == raw_manifest and manifest_2.name == manifest.name
+
+    # a changed contract is parsed again
+    changed_nef_path = os.path.join(cache_dir, 'ruler.nef')
+    shutil.copy('ruler.nef', changed_nef_path)
+    with open(os.path.join(cache_dir, 'ruler.manifest.json'), 'w') as f:
+        json.dump(dict(raw_manifest, name='changed ruler'), f)  # cached objects are never modified
+    assert cache.load(changed_nef_path)[3].name == 'changed ruler' and cache.misses == 1
+    cache.clear(remove_files=True)
+    assert not [name for name in os.listdir(cache_dir) if name.endswith('.pickle')]
+finally:
+    shutil.rmtree(cache_dir)
@@ -0,0 +1,53 @@
+from types import GeneratorType
+
+from neo_test_with_vm import TestEngine
+
+from neo3.vm import VMState
+from neo3.contracts import NeoToken, GasToken, ContractParameterType
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds, Hash160Str, EngineResultInterpreter
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+fee_rate = 0 * DECIMAL_BASE
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate])
+
+# int without str
+engine.invoke_method('get_decimal_base')
+state, result = engine.analyze_results(result_decoded=True)
+assert type(result) is int and result == DECIMAL_BASE
+
+# array with ints, bytes and bools
+engine.invoke_method('getPairSnapshot', [1])
+state, snapshot = engine.analyze_results(result_decoded=True)
+snapshot = dict(zip(EngineResultInterpreter.pair_snapshot_fields, snapshot))
+assert snapshot['mintRatio'] == mint_ratio and snapshot['expiry'] == _30_days_later_ending_milisecond
+assert Hash160Str.from_UInt160(neo.hash) == EngineResultInterpreter.bytes_to_Hash160str(snapshot['collateralToken'])
+assert snapshot['active'] is True and snapshot['expired'] is False
+
+# str and Hash160 by the given return type
+engine.invoke_method_of_arbitrary_contract(neo.hash, 'symbol')
+assert engine.analyze_results(result_decoded=True, return_type=ContractParameterType.STRING)[1] == 'NEO'
+engine.invoke_method('get_pair_attribute', [1, 'collateralToken'])
+state, collateral = engine.analyze_results(result_decoded=True, return_type=ContractParameterType.HASH160)
+assert type(collateral) is Hash160Str and collateral == Hash160Str.from_UInt160(neo.hash)
+
+# bytes by the manifest: no rToken ledger yet
+engine.invoke_method('getRTokenLedger')
+assert engine.return_type('getRTokenLedger') == ContractParameterType.BYTEARRAY
+assert engine.analyze_results(result_decoded=True, return_type='getRTokenLedger') == (VMState.HALT, b'')
+
+# lazy iterator, consumed partially
+engine.invoke_method('getCollaterals')
+state, collaterals = engine.analyze_results(result_decoded=True)
+assert isinstance(collaterals, GeneratorType)
+key, value = next(collaterals)
+assert key == b'collaterals' + neo.hash.to_array()
+engine.invoke_method_with_print('getCollaterals', result_decoded=True)
+assert type(engine.previous_processed_result) is list and len(engine.previous_processed_result) == 1
@@ -107,6 +107,10 @@ dev_client.print_previous_result()
 sleep_until(expiry_timestamp)
 sleep_for_next_block()
 
+dev_client.invokefunction("settle", params=[selected_pair])  # optional; the first collect settles the pair anyway
+dev_client.print_previous_result()
+sleep_for_next_block()
+
 dev_client.invokefunction("collect",
     params=[dev_wallet_hash, attributes['collateralToken'], attributes['pairedToken'], attributes['expiry'], attributes['mintRatio'], 700000000],
     signers=[Signer(dev_wallet_hash, WitnessScope.Global)])
@@ -128,6 +132,10 @@ print('feesMap:', feesMap)  # should have 7 NEO
 administrating_client.invokefunction('collectFee', [gas.hash])
 administrating_client.print_previous_result()
 
+administrating_client.invokefunction('collectFeesPaged', [b'', 1])
+administrating_client.print_previous_result()  # cursor of the next page; b'' if all the fees have been collected
+
+sleep_for_next_block()
 administrating_client.invokefunction('collectFees')
 administrating_client.print_previous_result()
 
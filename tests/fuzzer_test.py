@@ -0,0 +1,31 @@
+from neo_test_with_vm.fuzzer import RulerFuzzer, FuzzState
+
+# a short random campaign over the default invariants
+fuzzer = RulerFuzzer('ruler.nef', accounts=3, pairs=2, seed=1)
+report = fuzzer.run(300)
+print(report)
+assert report.halted > 0
+# the flash loans are received by the contract deployed in setup, and repaid
+assert report.halted_actions.get('flashLoan', 0) > 0
+
+# the same seed executes the same steps
+actions_1 = [RulerFuzzer('ruler.nef', accounts=3, pairs=2, seed=7).random_action() for _ in range(20)]
+actions_2 = [RulerFuzzer('ruler.nef', accounts=3, pairs=2, seed=7).random_action() for _ in range(20)]
+assert actions_1 == actions_2
+
+
+# shrinking: an invariant violated by any successful deposit is reproduced with a single step
+def no_rcToken_minted(state: FuzzState) -> str:
+    for pair in state.pairs:
+        if pair['rcTotalSupply'] > 0:
+            return f'pair {pair["index"]} minted {pair["rcTotalSupply"]} rcTokens'
+    return ''
+
+
+fuzzer = RulerFuzzer('ruler.nef', accounts=3, pairs=2, invariants=[no_rcToken_minted], seed=2)
+report = fuzzer.run(300)
+print(report)
+assert report.violation and report.violation.invariant == 'no_rcToken_minted'
+assert len(report.violation.shrunk) == 1 and report.violation.shrunk[0][0] in {'deposit', 'mmDeposit'}
+steps, invariant, message = fuzzer.replay(report.violation.shrunk)
+assert steps == 1 and invariant == 'no_rcToken_minted'
@@ -0,0 +1,48 @@
+from neo_test_with_vm import TestEngine
+
+from neo3.core.types import UInt160
+from neo3.network.payloads import Signer, WitnessScope
+from neo3.vm import IntegerStackItem, NullStackItem, VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds, EngineResultInterpreter
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+fee_rate = 0 * DECIMAL_BASE
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate])
+engine.invoke_method_with_print('getPairAttributes', params=[1], result_interpreted_as_iterator=True, further_interpreter=EngineResultInterpreter.interpret_getPairAttribtutes)
+rcToken_address = engine.previous_processed_result['rcToken']
+rrToken_address = engine.previous_processed_result['rrToken']
+engine.set_NEP17_token_balance(neo, contract_owner_hash, 100)
+engine.set_NEP17_token_balance(gas, contract_owner_hash, 0)
+engine.invoke_method_with_print("deposit", params=[contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, 10],
+                                signers=[Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)])
+
+balances = engine.invoke_many([(rcToken_address, 'balanceOf', [contract_owner_hash]),
+                               (rrToken_address, 'balanceOf', [contract_owner_hash]),
+                               (neo.hash, 'balanceOf', [contract_owner_hash]),
+                               (gas.hash, 'balanceOf', [contract_owner_hash]),
+                               (None, 'get_decimal_base', [])])
+assert [state for state, _ in balances] == [VMState.HALT] * 5
+assert [result for _, result in balances] == [IntegerStackItem(10 * mint_ratio), IntegerStackItem(10 * mint_ratio),
+                                              IntegerStackItem(90), IntegerStackItem(0), IntegerStackItem(DECIMAL_BASE)]
+
+# addPair faults because the pair exists
+calls = [(None, 'setPausedByIndex', [1]),
+         (None, 'addPair', [neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate]),
+         (None, 'setActiveByIndex', [1])]
+results = engine.invoke_many(calls)
+assert results == [(VMState.FAULT, None)] * 3
+assert engine.ruler_storage().pair(1)['active']  # setPausedByIndex is discarded with the faulted batch
+results = engine.invoke_many(calls, isolate_faults=True)
+assert [state for state, _ in results] == [VMState.HALT, VMState.FAULT, VMState.HALT]
+engine.invoke_method_with_print("depositByIndex", params=[contract_owner_hash, 1, 1],
+                                signers=[Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)])
+assert engine.state == VMState.HALT  # the pair is active again
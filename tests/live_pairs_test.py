@@ -0,0 +1,53 @@
+from neo_test_with_vm import TestEngine
+
+from neo3.vm import VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds, EngineResultInterpreter
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+random_hash = '0' * 40
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+fee_rate = 0 * DECIMAL_BASE
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+
+# added in the order of later expiry first
+later_expiry, later_expiry_str = gen_expiry_timestamp_and_str_in_seconds(60)
+earlier_expiry, earlier_expiry_str = gen_expiry_timestamp_and_str_in_seconds(30)
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, later_expiry, later_expiry_str, mint_ratio, str(mint_ratio), fee_rate])
+later_pair_index = int(engine.previous_processed_result)
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, earlier_expiry, earlier_expiry_str, mint_ratio, str(mint_ratio), fee_rate])
+earlier_pair_index = int(engine.previous_processed_result)
+# pairs added by the public are not active, and not listed
+engine.invoke_method_with_print("addPair", params=[gas.hash, neo.hash, earlier_expiry, earlier_expiry_str, mint_ratio, str(mint_ratio), fee_rate], signers=[random_hash])
+public_pair_index = int(engine.previous_processed_result)
+
+engine.invoke_method_with_print('getLivePairs', params=[0, 1, b''], result_interpreted_as_array=True, further_interpreter=EngineResultInterpreter.interpret_getLivePairs)
+cursor, pair_indexes = engine.previous_processed_result
+assert pair_indexes == [earlier_pair_index] and cursor != b''
+engine.invoke_method_with_print('getLivePairs', params=[0, 1, cursor], result_interpreted_as_array=True, further_interpreter=EngineResultInterpreter.interpret_getLivePairs)
+cursor, pair_indexes = engine.previous_processed_result
+assert pair_indexes == [later_pair_index] and cursor == b''
+engine.invoke_method_with_print('getLivePairs', params=[earlier_expiry, 10, b''], result_interpreted_as_array=True, further_interpreter=EngineResultInterpreter.interpret_getLivePairs)
+assert engine.previous_processed_result == (b'', [later_pair_index])
+
+engine.invoke_method_with_print('setPausedByIndex', params=[earlier_pair_index])
+engine.invoke_method_with_print('setActiveByIndex', params=[public_pair_index])
+engine.invoke_method_with_print('getLivePairs', params=[0, 10, b''], result_interpreted_as_array=True, further_interpreter=EngineResultInterpreter.interpret_getLivePairs)
+assert engine.previous_processed_result == (b'', [public_pair_index, later_pair_index])
+
+engine.invoke_method_with_print('pruneExpiryIndex', params=[10])
+assert engine.state == VMState.HALT and engine.previous_processed_result == '0'  # nothing has expired
+
+# the pair at the cursor is paused between 2 pages: the next page resumes from the pair after it
+engine.invoke_method_with_print('setActiveByIndex', params=[earlier_pair_index])
+engine.invoke_method_with_print('getLivePairs', params=[0, 1, b''], result_interpreted_as_array=True, further_interpreter=EngineResultInterpreter.interpret_getLivePairs)
+cursor, pair_indexes = engine.previous_processed_result
+assert pair_indexes == [earlier_pair_index] and cursor != b''
+engine.invoke_method_with_print('setPausedByIndex', params=[public_pair_index])
+engine.invoke_method_with_print('getLivePairs', params=[0, 1, cursor], result_interpreted_as_array=True, further_interpreter=EngineResultInterpreter.interpret_getLivePairs)
+assert engine.previous_processed_result == (b'', [later_pair_index])
@@ -0,0 +1,59 @@
+import gc
+
+from neo_test_with_vm import TestEngine
+
+from neo3.vm import VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+random_hash = '0' * 40
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), 0])
+engine.set_NEP17_token_balance(neo, contract_owner_hash, 10 ** 6)
+
+# compact records of the latest invocations
+record = engine.history[-1]
+assert record.method == 'addPair' and record.state == VMState.HALT and record.result == 1 and record.gas_consumed > 0
+engine.invoke_method('deploy', [random_hash], signers=[random_hash])  # not the administrator
+assert engine.history[-1].state == VMState.FAULT and engine.history[-1].exception
+
+# memory stays bounded over many invocations
+engine.set_history_size(10)
+engine.MAX_SNAPSHOT_ENTRIES = 1000
+engine.MAX_FAULT_MESSAGES = 5
+deposit = engine.prepare('deposit')
+for i in range(300):
+    deposit(contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, 1)
+    engine.invoke_method('deploy', [random_hash], signers=[random_hash])  # faults
+    if i == 100:
+        gc.collect()
+        counters = engine.memory_counters()
+        print(counters)
+gc.collect()
+final_counters = engine.memory_counters()
+print(final_counters)
+assert final_counters['history_records'] == 10 and len(engine.history) == 10
+assert final_counters['fault_messages'] <= 2 * engine.MAX_FAULT_MESSAGES
+assert final_counters['snapshot_entries'] <= engine.MAX_SNAPSHOT_ENTRIES + counters['snapshot_entries']
+assert final_counters['retained_engines'] <= counters['retained_engines']
+assert final_counters['storage_entries'] == counters['storage_entries']  # the same accounts and pairs
+record = engine.history[-2]
+assert record.method == 'deposit' and record.state == VMState.HALT
+rcToken = engine.ruler_storage().pair(1)['rcToken']  # native contracts do not notify through the engine
+assert any(event_name == 'Transfer' and contract == rcToken for contract, event_name, _ in record.notifications)
+
+# the write batch of the snapshot does not grow with invocations
+assert len(engine.snapshot._batch.statements) == 0
+
+# no records at all
+engine.set_history_size(0)
+engine.invoke_method('get_decimal_base')
+assert len(engine.history) == 0
@@ -0,0 +1,77 @@
+from neo_test_with_vm import TestEngine
+
+from neo3.core.types import UInt160
+from neo3.network.payloads import Signer, WitnessScope
+from neo3.vm import VMState
+from neo3.contracts import GasToken
+gas = GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+# a test token with 6 decimals, against GAS with 8 decimals
+test_token = engine.deploy_another_contract('rToken.nef')
+engine.invoke_method_of_arbitrary_contract(test_token, 'deploy', [contract_owner_hash, b'TEST_6_DECIMALS', 6])
+assert engine.state == VMState.HALT
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 3 * DECIMAL_BASE + DECIMAL_BASE // 2  # odd amounts and ratios, so that rounding is also compared
+fee_rate = 0 * DECIMAL_BASE
+signers = [Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)]
+token_decimals = {test_token: 6, gas.hash: 8}
+
+
+def baseline_rToken_amount(col_amount: int, col: UInt160, paired: UInt160) -> int:
+    """
+    `_getRTokenAmtFromColAmt` before decimals were stored with pairs
+    """
+    delta_decimals = token_decimals[paired] - token_decimals[col]
+    if delta_decimals >= 0:
+        return col_amount * mint_ratio * (10 ** delta_decimals) // DECIMAL_BASE
+    return col_amount * mint_ratio // (DECIMAL_BASE * 10 ** -delta_decimals)
+
+
+def baseline_col_amount(rToken_amount: int, col: UInt160, paired: UInt160) -> int:
+    """
+    `_getColAmtFromRTokenAmt` before decimals were stored with pairs. rTokens have the decimals of the paired token
+    """
+    delta_decimals = token_decimals[col] - token_decimals[paired]
+    if delta_decimals >= 0:
+        return rToken_amount * (10 ** delta_decimals) * DECIMAL_BASE // mint_ratio
+    return rToken_amount * DECIMAL_BASE // (mint_ratio * 10 ** -delta_decimals)
+
+
+def balance(token: UInt160, account) -> int:
+    engine.invoke_method_of_arbitrary_contract(token, 'balanceOf', [account])
+    return engine.analyze_results(result_decoded=True)[1]
+
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.set_NEP17_token_balance(gas, contract_owner_hash, 1000 * DECIMAL_BASE)
+engine.set_NEP17_token_balances([(test_token, contract_owner_hash, 1000 * 10 ** 6)])
+# delta_decimals == 2 from collateral to paired token, and then -2
+for pair_index, (col, paired) in enumerate([(test_token, gas.hash), (gas.hash, test_token)], start=1):
+    engine.invoke_method_with_print("addPair", params=[col, paired, _30_days_later_ending_milisecond, f'{_30_days_later_date_str}+{pair_index}',
+                                                       mint_ratio, str(mint_ratio), fee_rate])
+    assert engine.state == VMState.HALT
+    pair = engine.ruler_storage().pair(pair_index)
+    assert pair['colDecimals'] == token_decimals[col] and pair['rDecimals'] == pair['pairedDecimals'] == token_decimals[paired]
+
+    col_amount = 1_234_567
+    col_balance = balance(col, contract_owner_hash)
+    engine.invoke_method_with_print("depositByIndex", params=[contract_owner_hash, pair_index, col_amount], signers=signers)
+    assert engine.state == VMState.HALT
+    minted = baseline_rToken_amount(col_amount, col, paired)
+    assert engine.analyze_results(result_decoded=True)[1] == minted > 0
+    assert balance(pair['rcToken'], contract_owner_hash) == balance(pair['rrToken'], contract_owner_hash) == minted
+    assert balance(col, contract_owner_hash) == col_balance - col_amount
+
+    rToken_amount = minted // 3
+    engine.invoke_method_with_print("redeemByIndex", params=[contract_owner_hash, pair_index, rToken_amount], signers=signers)
+    assert engine.state == VMState.HALT
+    redeemed = baseline_col_amount(rToken_amount, col, paired)
+    assert engine.analyze_results(result_decoded=True)[1] == redeemed > 0
+    assert balance(col, contract_owner_hash) == col_balance - col_amount + redeemed
+    assert balance(pair['rcToken'], contract_owner_hash) == minted - rToken_amount
+    assert engine.ruler_storage().pair(pair_index)['colTotal'] == col_amount - redeemed
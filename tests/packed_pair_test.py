@@ -0,0 +1,83 @@
+from neo_test_with_vm import TestEngine
+from neo_test_with_vm.storage_layout import PAIR_ATTRIBUTES, LEGACY_PAIR_ATTRIBUTES, int_to_vm_bytes
+
+from neo3.core.types import UInt160
+from neo3.network.payloads import Signer, WitnessScope
+from neo3.vm import VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds, EngineResultInterpreter
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+fee_rate = 0 * DECIMAL_BASE
+signers = [Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)]
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate])
+assert engine.state == VMState.HALT
+ruler = engine.ruler_storage()
+
+# a new pair is a single serialized record, without any key of the legacy layout
+packed = ruler.get('packedPair', 1)
+assert len(packed) == len(PAIR_ATTRIBUTES)
+assert list(ruler.find('pair_')) == []
+pair = ruler.pair(1)
+engine.invoke_method_with_print('getPairAttributes', params=[1], result_interpreted_as_iterator=True,
+                                further_interpreter=EngineResultInterpreter.interpret_getPairAttribtutes)
+attributes = engine.previous_processed_result
+assert set(attributes) == set(PAIR_ATTRIBUTES)
+for attribute in ['active', 'feeRate', 'mintRatio', 'expiry', 'colTotal', 'rDecimals', 'usesLedger', 'settled']:
+    assert attributes[attribute] == pair[attribute], (attribute, attributes[attribute], pair[attribute])
+assert attributes['rcToken'] == pair['rcToken'] and attributes['collateralToken'] == pair['collateralToken']
+
+
+def write_legacy_pair(pair_index: int, pair: dict):
+    """
+    Store a pair as older versions of ruler.py did: one key per attribute in pair_, and no packed record
+    """
+    items = {ruler.layout['packedPair'].key(pair_index): None}
+    for attribute in LEGACY_PAIR_ATTRIBUTES:
+        value = pair[attribute]
+        items[ruler.layout['pair_'].key(pair_index, attribute)] = \
+            value.to_UInt160().to_array() if attribute in {'pairedToken', 'collateralToken', 'rcToken', 'rrToken'} \
+            else int_to_vm_bytes(int(value))
+    engine.write_storage(engine.contract.hash, items)
+
+
+def assert_migrated(pair_index: int, pair: dict):
+    assert ruler.get('packedPair', pair_index) is not None
+    assert [key for key, _ in ruler.find('pair_')] == []  # the legacy keys are deleted
+    migrated = ruler.pair(pair_index)
+    for attribute in PAIR_ATTRIBUTES:
+        assert migrated[attribute] == pair[attribute], (attribute, migrated[attribute], pair[attribute])
+
+
+write_legacy_pair(1, pair)
+legacy = ruler.pair(1)
+assert ruler.get('packedPair', 1) is None and len(list(ruler.find('pair_'))) == len(LEGACY_PAIR_ATTRIBUTES)
+assert legacy['rDecimals'] is None and legacy['usesLedger'] is False
+assert all(legacy[attribute] == pair[attribute] for attribute in LEGACY_PAIR_ATTRIBUTES)
+
+# migratePair packs the legacy keys, reading the decimals from the tokens
+engine.invoke_method_with_print('migratePair', [1])
+assert engine.state == VMState.HALT
+assert_migrated(1, pair)
+engine.invoke_method_with_print('migratePair', [1])  # nothing to migrate any more
+assert engine.state == VMState.HALT
+assert_migrated(1, pair)
+
+# a legacy pair is also migrated the first time it is loaded by an entry point
+write_legacy_pair(1, pair)
+engine.set_NEP17_token_balance(neo, contract_owner_hash, 10)
+engine.invoke_method_with_print("depositByIndex", params=[contract_owner_hash, 1, 10], signers=signers)
+assert engine.state == VMState.HALT
+pair['colTotal'] += 10
+assert_migrated(1, pair)
+
+engine.invoke_method_with_print('migratePair', [2])
+assert engine.state == VMState.FAULT  # pair not found
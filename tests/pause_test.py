@@ -63,3 +63,17 @@ assert engine.state == VMState.FAULT
 engine.invoke_method_with_print("deposit", params=[contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, 1],
                                 signers=[Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)])
 assert engine.state == VMState.FAULT
+
+# the same operations addressed by pair index
+engine.invoke_method_with_print('setActiveByIndex', params=[a_pair_index], signers=[random_hash])
+assert engine.state == VMState.FAULT
+engine.invoke_method_with_print('setActiveByIndex', params=[a_pair_index])
+engine.invoke_method_with_print('depositByIndex', params=[contract_owner_hash, a_pair_index, 1],
+                                signers=[Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)])
+assert engine.state == VMState.HALT
+engine.invoke_method_with_print('setPausedByIndex', params=[a_pair_index])
+engine.invoke_method_with_print('mmDepositByIndex', params=[contract_owner_hash, a_pair_index, 700000000])
+assert engine.state == VMState.FAULT
+engine.invoke_method_with_print('depositByIndex', params=[contract_owner_hash, a_pair_index + 1, 1],
+                                signers=[Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)])
+assert engine.state == VMState.FAULT
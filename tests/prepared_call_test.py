@@ -0,0 +1,39 @@
+from neo_test_with_vm import TestEngine
+
+from neo3.vm import IntegerStackItem, VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+random_hash = '0' * 40
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+fee_rate = 0 * DECIMAL_BASE
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.set_NEP17_token_balance(gas, contract_owner_hash, 100)
+
+get_decimal_base = engine.prepare('get_decimal_base')
+gas_balanceOf = engine.prepare('balanceOf', gas.hash)
+for _ in range(3):
+    get_decimal_base()
+    assert engine.state == VMState.HALT and engine.result_stack.peek() == IntegerStackItem(DECIMAL_BASE)
+    gas_balanceOf(contract_owner_hash)
+    assert engine.result_stack.peek() == IntegerStackItem(100)
+    gas_balanceOf(random_hash)
+    assert engine.result_stack.peek() == IntegerStackItem(0)
+
+addPair = engine.prepare('addPair')
+for expiry_offset in range(3):
+    # rTokens are named by the expiry string, and cannot be deployed twice with the same name
+    addPair(neo.hash, gas.hash, _30_days_later_ending_milisecond + expiry_offset, f'{_30_days_later_date_str}+{expiry_offset}', mint_ratio, str(mint_ratio), fee_rate)
+    assert engine.result_stack.peek() == IntegerStackItem(expiry_offset + 1)
+addPair(neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate)
+assert engine.state == VMState.FAULT  # pair exists
+# the same result as not prepared
+engine.invoke_method_of_arbitrary_contract(gas.hash, 'balanceOf', [contract_owner_hash])
+assert engine.result_stack.peek() == IntegerStackItem(100)
@@ -0,0 +1,85 @@
+import os
+import tempfile
+
+from neo_test_with_vm import TestEngine
+from neo_test_with_vm.debug_info import DebugInfo
+from neo_test_with_vm.profiler import Profiler, CostCounter
+
+from neo3.vm import IntegerStackItem, VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+fee_rate = 0 * DECIMAL_BASE
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+
+profiler = engine.enable_profiling()
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate])
+assert engine.state == VMState.HALT and engine.result_stack.peek() == IntegerStackItem(1)
+add_pair_gas = engine.previous_engine.gas_consumed
+assert engine.disable_profiling() is profiler
+# not profiled
+engine.invoke_method('get_decimal_base')
+assert len(profiler.invocations) == 1
+
+invocation = profiler.invocations[0]
+assert invocation.method == 'addPair' and invocation.state == 'HALT'
+assert invocation.gas_consumed == add_pair_gas
+methods = profiler.methods()
+assert sum(method.total.gas for method in methods.values()) == invocation.gas_consumed
+ruler_name = engine.manifest.name
+assert f'{ruler_name}.addPair' in methods
+assert any('System.Storage.Put' in method.syscalls for method in methods.values())
+
+report = profiler.to_json()
+print(list(report['methods'].items())[:3])
+collapsed = profiler.collapsed_stacks()
+for line in collapsed.splitlines():
+    stack, gas_charged = line.rsplit(' ', 1)
+    assert stack.startswith('addPair;script.offset_0') and int(gas_charged) > 0
+assert f'addPair;script.offset_0;{ruler_name}.addPair;' in collapsed
+print(collapsed[:1000])
+
+# source lines, if compiled with `neo3-boa ruler.py -d`
+if profiler.debug_infos:
+    assert sum(counter.gas for counter in profiler.lines.values()) > 0
+    profiler.print_annotated_lines(top=20)
+
+# DebugInfo and annotated lines, with a small inline debug info
+with tempfile.TemporaryDirectory() as source_dir:
+    with open(os.path.join(source_dir, 'tiny.py'), 'w') as f:
+        f.write('def first():\n    a = 1\n    return a\n\n\ndef second():\n    return 2\n')
+    debug_info = DebugInfo({
+        'documents': ['C:\\elsewhere\\tiny.py'],  # not found; located in source_dir by its basename
+        'methods': [
+            {'name': 'tiny,first', 'range': '0-9',
+             'sequence-points': ['0[0]2:5-2:10', '4[0]3:5-3:13']},
+            {'name': 'tiny,second', 'range': '10-12',
+             'sequence-points': ['10[0]7:5-7:13', 'not a sequence point']},
+        ],
+    }, source_dir)
+    document = os.path.join(source_dir, 'tiny.py')
+    assert debug_info.documents == [document]
+    assert debug_info.method_starts == {0: 'first', 10: 'second'}
+    assert debug_info.source_line(0) == (document, 2)
+    assert debug_info.source_line(3) == (document, 2)  # the last sequence point at or before the ip
+    assert debug_info.source_line(4) == (document, 3)
+    assert debug_info.source_line(11) == (document, 7)
+    assert DebugInfo({}).source_line(0) is None
+
+    inline_profiler = Profiler()
+    for ip, gas in [(0, 30), (4, 100), (5, 10), (10, 60)]:
+        inline_profiler.lines.setdefault(debug_info.source_line(ip), CostCounter()).add(gas)
+    annotated = inline_profiler.annotated_lines().splitlines()
+    assert len(annotated) == 4 and 'source' in annotated[0]
+    assert annotated[1].split() == ['110', '55.00', '2', 'tiny.py:3', 'return', 'a']  # the most expensive first
+    assert annotated[2].split() == ['60', '30.00', '1', 'tiny.py:7', 'return', '2']
+    assert annotated[3].split() == ['30', '15.00', '1', 'tiny.py:2', 'a', '=', '1']
+    assert inline_profiler.annotated_lines(top=1).splitlines()[1:] == annotated[1:2]
@@ -0,0 +1,101 @@
+from neo_test_with_vm import TestEngine
+
+from neo3.core.types import UInt160
+# from neo3 import settings
+from neo3.network.payloads import Signer, WitnessScope
+from neo3.vm import IntegerStackItem, VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds, EngineResultInterpreter, Hash160Str
+
+contract_owner_pubkey = '0355688d0a1dc59a51766b3736eee7617404f2e0af1eb36e57f11e647297ad8b34'
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+random_hash = '0' * 40
+# settings.default_settings['network']['standby_committee'] = [contract_owner_pubkey]
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+ledger_hash = engine.deploy_another_contract('rTokenLedger.nef')
+
+# _30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str(30)
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+fee_rate = 0 * DECIMAL_BASE
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+# only the ruler can bind itself to the ledger, in setRTokenLedger
+engine.invoke_method_of_arbitrary_contract(ledger_hash, 'deploy', [engine.contract.hash])
+assert engine.state == VMState.FAULT
+engine.invoke_method_with_print('setRTokenLedger', [ledger_hash], signers=[random_hash])
+assert engine.state == VMState.FAULT
+engine.invoke_method_with_print('setRTokenLedger', [ledger_hash])
+assert engine.state == VMState.HALT
+engine.invoke_method_of_arbitrary_contract(ledger_hash, 'getRuler')
+assert engine.analyze_results(result_decoded=True)[1] == engine.contract.hash.to_array()
+
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate])
+assert engine.state == VMState.HALT and engine.result_stack.peek() == IntegerStackItem(1)
+engine.invoke_method_with_print('getPairAttributes', params=[1], result_interpreted_as_iterator=True, further_interpreter=EngineResultInterpreter.interpret_getPairAttribtutes)
+pair_attributes = engine.previous_processed_result
+assert pair_attributes['usesLedger'] == 1
+assert pair_attributes['rcToken'] == pair_attributes['rrToken']
+rc_token_id, rr_token_id = b'\x01_RC', b'\x01_RR'
+
+engine.set_NEP17_token_balance(neo, contract_owner_hash)
+engine.set_NEP17_token_balance(gas, contract_owner_hash)
+
+engine.invoke_method_with_print("deposit", params=[contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, 100],
+                                signers=[Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)])
+assert engine.state == VMState.HALT
+engine.invoke_method_of_arbitrary_contract(ledger_hash, 'balanceOfToken', [rc_token_id, contract_owner_hash])
+print('balanceOf my rcToken:', end=' '); engine.print_results()
+assert engine.previous_processed_result == str(100 * mint_ratio)
+engine.invoke_method_of_arbitrary_contract(ledger_hash, 'balanceOfToken', [rr_token_id, contract_owner_hash])
+print('balanceOf my rrToken:', end=' '); engine.print_results()
+assert engine.previous_processed_result == str(100 * mint_ratio)
+
+engine.invoke_method_with_print("repay", params=[contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, 700000000])
+assert engine.state == VMState.HALT
+engine.invoke_method_of_arbitrary_contract(ledger_hash, 'totalSupplyOf', [rr_token_id])
+print('totalSupply of rrToken:', end=' '); engine.print_results()
+assert engine.previous_processed_result == str(100 * mint_ratio - 700000000)
+
+engine.invoke_method_with_print('redeem', [contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, 700000000])
+assert engine.state == VMState.HALT
+engine.invoke_method_of_arbitrary_contract(ledger_hash, 'balanceOfToken', [rc_token_id, contract_owner_hash])
+print('balanceOf my rcToken after redeem:', end=' '); engine.print_results()
+assert engine.previous_processed_result == str(100 * mint_ratio - 700000000)
+
+# only the ruler can mint in the ledger
+engine.invoke_method_of_arbitrary_contract(ledger_hash, 'mint', [rc_token_id, random_hash, 1], signers=[random_hash])
+assert engine.state == VMState.FAULT
+
+# only the ruler can deploy a facade, in setLedgerFacade, which checks the token of the facade
+facade_hash = engine.deploy_another_contract('rTokenFacade.nef')
+engine.invoke_method_of_arbitrary_contract(facade_hash, 'deploy', [ledger_hash, rr_token_id])
+assert engine.state == VMState.FAULT
+engine.invoke_method_with_print('setLedgerFacade', [1, b'RR', facade_hash], signers=[random_hash])
+assert engine.state == VMState.FAULT
+engine.invoke_method_with_print('setLedgerFacade', [1, b'RR', facade_hash])
+assert engine.state == VMState.HALT
+engine.invoke_method_with_print('setLedgerFacade', [1, b'RC', facade_hash])
+assert engine.state == VMState.FAULT  # the facade is of the rrToken
+engine.invoke_method_of_arbitrary_contract(facade_hash, 'onLedgerTransfer', [random_hash, contract_owner_hash, 1])
+assert engine.state == VMState.FAULT
+
+# with a facade, balance changes of the rrToken fire NEP-17 Transfer events from the facade
+engine.invoke_method_with_print("repay", params=[contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, 700000000])
+assert engine.state == VMState.HALT
+facade_transfers = [state for contract, event_name, state in engine.history[-1].notifications
+                    if event_name == 'Transfer' and contract == Hash160Str.from_UInt160(facade_hash)]
+assert [amount for _, to_address, amount in facade_transfers if to_address is None] == [700000000]  # burned
+engine.invoke_method_of_arbitrary_contract(facade_hash, 'transfer', [contract_owner_hash, random_hash, 1, None])
+assert engine.state == VMState.HALT and engine.result_stack.peek().to_boolean() is True
+facade_transfers = [state for contract, event_name, state in engine.history[-1].notifications
+                    if event_name == 'Transfer' and contract == Hash160Str.from_UInt160(facade_hash)]
+assert len(facade_transfers) == 1
+engine.invoke_method_of_arbitrary_contract(facade_hash, 'balanceOf', [random_hash])
+assert engine.result_stack.peek() == IntegerStackItem(1)
+# the rcToken has no facade
+engine.invoke_method_of_arbitrary_contract(ledger_hash, 'transferToken', [rc_token_id, contract_owner_hash, random_hash, 1, None])
+assert engine.state == VMState.HALT
+assert [event_name for _, event_name, _ in engine.history[-1].notifications] == ['LedgerTransfer']
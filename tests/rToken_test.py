@@ -25,3 +25,41 @@ engine.invoke_method_with_print("totalSupply")
 engine.invoke_method_with_print("burnByRuler", params=[contract_owner_hash, 90])
 engine.invoke_method_with_print("balanceOf", params=[contract_owner_hash])
 engine.invoke_method_with_print("totalSupply")
+another_hash = '1' * 40
+engine.invoke_method_with_print("mint", params=[contract_owner_hash, 100])
+engine.invoke_method_with_print("transferMany", params=[contract_owner_hash, [random_hash, another_hash, contract_owner_hash], [30, 20, 10], None])
+assert engine.result_stack.peek().to_boolean() is True
+engine.invoke_method_with_print("balanceOf", params=[random_hash])
+assert engine.previous_processed_result == '30'
+engine.invoke_method_with_print("balanceOf", params=[another_hash])
+assert engine.previous_processed_result == '20'
+engine.invoke_method_with_print("balanceOf", params=[contract_owner_hash])
+assert engine.previous_processed_result == '50'
+engine.invoke_method_with_print("transferMany", params=[contract_owner_hash, [random_hash, another_hash], [30, 30], None])
+assert engine.result_stack.peek().to_boolean() is False  # cannot pay the sum; nothing transferred
+engine.invoke_method_with_print("transferMany", params=[random_hash, [another_hash], [30], None], signers=[another_hash])
+assert engine.result_stack.peek().to_boolean() is False  # no witness
+engine.invoke_method_with_print("getHolders", params=[b'', 2], result_interpreted_as_array=True)
+cursor, holders = engine.previous_processed_result
+assert len(holders) == 2 and cursor != b''
+engine.invoke_method_with_print("getHolders", params=[cursor, 2], result_interpreted_as_array=True)
+cursor, last_holders = engine.previous_processed_result
+assert len(last_holders) == 1 and cursor == b''
+assert sum(int.from_bytes(balance, 'little') for _, balance in holders + last_holders) == 100
+engine.invoke_method_with_print("burnByRuler", params=[another_hash, 20])
+engine.invoke_method_with_print("getHolders", params=[b'', 10], result_interpreted_as_array=True)
+assert len(engine.previous_processed_result[1]) == 2
+# the cursor holder empties its balance before the next page, which resumes from the holder after it.
+# Keys are compared as unsigned bytes: 0xff... is the last holder
+last_hash = 'f' * 40
+engine.invoke_method_with_print("mint", params=[another_hash, 20])
+engine.invoke_method_with_print("mint", params=[last_hash, 5])
+engine.invoke_method_with_print("getHolders", params=[b'', 10], result_interpreted_as_array=True)
+all_holders = engine.previous_processed_result[1]
+assert len(all_holders) == 4 and all_holders[-1][0] == bytes.fromhex(last_hash)
+engine.invoke_method_with_print("getHolders", params=[b'', 2], result_interpreted_as_array=True)
+cursor, first_holders = engine.previous_processed_result
+assert first_holders == all_holders[:2] and cursor == all_holders[2][0]
+engine.invoke_method_with_print("burnByRuler", params=[cursor, int.from_bytes(all_holders[2][1], 'little')])
+engine.invoke_method_with_print("getHolders", params=[cursor, 10], result_interpreted_as_array=True)
+assert engine.previous_processed_result == [b'', all_holders[3:]]
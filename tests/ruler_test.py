@@ -52,6 +52,13 @@ print('balanceOf my rcToken:', end=' '); engine.print_results()
 engine.get_rToken_balance(rrToken_address, contract_owner_hash)
 print('balanceOf my rrToken:', end=' '); engine.print_results()
 
+# rcTokens deployed by the ruler are built from the template of rToken.py, including transferMany
+engine.invoke_method_of_arbitrary_contract(rcToken_address, 'transferMany', [contract_owner_hash, [random_hash], [1], None])
+assert engine.state == VMState.HALT and engine.result_stack.peek().to_boolean() is True
+engine.get_rToken_balance(rcToken_address, random_hash)
+print('balanceOf rcToken of random_hash:', end=' '); engine.print_results()
+assert engine.previous_processed_result == '1'
+
 engine.invoke_method_of_arbitrary_contract(neo.hash, 'balanceOf', [contract_owner_hash])
 print('invoke method balanceOf my NEO:', end=' '); engine.print_results()
 engine.invoke_method_with_print("repay", params=[contract_owner_hash, pair_attributes['collateralToken'], pair_attributes['pairedToken'], pair_attributes['expiry'], pair_attributes['mintRatio'], 700000000])
@@ -65,7 +72,19 @@ print('balanceOf my rrToken:', end=' '); engine.print_results()
 engine.invoke_method_of_arbitrary_contract(neo.hash, 'balanceOf', [contract_owner_hash])
 print('invoke method balanceOf my NEO:', end=' '); engine.print_results()
 
-# collecting would never succeed because there is no concept of ever-changing time for the vm
+# collecting fails before expiry
 engine.invoke_method_with_print("collect", params=[contract_owner_hash, pair_attributes['collateralToken'], pair_attributes['pairedToken'], pair_attributes['expiry'], pair_attributes['mintRatio'], 700000000])
 engine.get_rToken_balance(rcToken_address, contract_owner_hash)
 print('balanceOf my rcToken:', end=' '); engine.print_results()
+
+engine.invoke_method_with_print('getPairSnapshot', params=[a_pair_index], result_interpreted_as_array=True, further_interpreter=EngineResultInterpreter.interpret_getPairSnapshot)
+pair_snapshot = engine.previous_processed_result
+assert pair_snapshot['rcToken'] == rcToken_address and pair_snapshot['rrToken'] == rrToken_address
+assert pair_snapshot['expired'] is False
+
+# collect after expiry, with the virtual clock of the vm
+engine.set_time(pair_attributes['expiry'] + 1)
+engine.invoke_method_with_print("collect", params=[contract_owner_hash, pair_attributes['collateralToken'], pair_attributes['pairedToken'], pair_attributes['expiry'], pair_attributes['mintRatio'], 700000000])
+assert engine.state == VMState.HALT
+engine.invoke_method_with_print('getPairSnapshot', params=[a_pair_index], result_interpreted_as_array=True, further_interpreter=EngineResultInterpreter.interpret_getPairSnapshot)
+assert engine.previous_processed_result['expired'] is True and engine.previous_processed_result['settled'] is True
@@ -0,0 +1,50 @@
+from neo_test_with_vm import TestEngine, run_scenarios
+
+from neo3.core.types import UInt160
+from neo3.network.payloads import Signer, WitnessScope
+from neo3.vm import IntegerStackItem
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+fee_rate = 0 * DECIMAL_BASE
+
+
+def setup(engine: TestEngine):
+    # run once in each worker
+    engine.invoke_method('deploy', [contract_owner_hash])
+    engine.invoke_method("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate])
+    engine.set_NEP17_token_balance(neo, contract_owner_hash)
+    engine.set_NEP17_token_balance(gas, contract_owner_hash)
+
+
+def deposit_and_redeem(engine: TestEngine):
+    signers = [Signer(UInt160.from_string(contract_owner_hash), WitnessScope.GLOBAL)]
+    engine.invoke_method('deposit', [contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, 10], signers=signers)
+    engine.invoke_method('redeem', [contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, 7 * mint_ratio], signers=signers)
+    return int(str(engine.result_stack.peek()))
+
+
+def addPair_twice(engine: TestEngine):
+    engine.invoke_method("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate])
+
+
+def broken_assertion(engine: TestEngine):
+    assert engine.invoke_method('get_decimal_base').result_stack.peek() == IntegerStackItem(1)
+
+
+if __name__ == '__main__':
+    results = run_scenarios([deposit_and_redeem, addPair_twice, broken_assertion, deposit_and_redeem],
+                            signers=[contract_owner_hash], setup=setup, max_workers=2)
+    for result in results:
+        print(result)
+    assert results[0].state == 'HALT' and results[0].result == 7 and results[0].gas_consumed > 0
+    assert results[3].result == results[0].result  # scenarios do not see each other's state
+    assert results[1].state == 'FAULT' and 'addPair' in results[1].fault_messages[0]
+    assert results[2].state == 'ERROR' and 'AssertionError' in results[2].error
+    script_results = run_scenarios(['tests/pause_test.py', 'tests/rToken_test.py'], nef_path='', max_workers=2)
+    assert all(result.passed for result in script_results)
@@ -0,0 +1,55 @@
+from neo_test_with_vm import TestEngine
+from neo_test_with_vm.storage_layout import int_to_vm_bytes, vm_bytes_to_int, deserialize
+
+from neo3.vm import VMState
+from neo3.contracts import NeoToken, GasToken
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds, Hash160Str, EngineResultInterpreter
+
+# integers are encoded as `int.to_bytes()` in contracts
+for i in [0, 1, -1, 127, 128, -128, -129, 255, 2 ** 63, -2 ** 63]:
+    assert vm_bytes_to_int(int_to_vm_bytes(i)) == i
+assert int_to_vm_bytes(0) == b'' and int_to_vm_bytes(128) == b'\x80\x00' and int_to_vm_bytes(-128) == b'\x80'
+assert deserialize(b'\x40\x03\x20\x01\x21\x01\x07\x28\x02ab') == [True, 7, b'ab']
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+fee_rate = 0 * DECIMAL_BASE
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate])
+ruler = engine.ruler_storage()
+assert ruler.get('administrator') == Hash160Str(contract_owner_hash)
+assert ruler.collaterals() == [Hash160Str.from_UInt160(neo.hash)]
+pair_index = ruler.pair_index(neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio)
+assert pair_index == 1 and ruler.pair_index(gas.hash, neo.hash, _30_days_later_ending_milisecond, mint_ratio) is None
+assert ruler.pair(2) is None
+
+# the pair read from the storage is the same as the snapshot returned by the contract
+pair = ruler.pair(pair_index)
+engine.invoke_method('getPairSnapshot', [pair_index])
+state, snapshot = engine.analyze_results(result_decoded=True)
+snapshot = dict(zip(EngineResultInterpreter.pair_snapshot_fields, snapshot))
+for attribute, value in pair.items():
+    if attribute in EngineResultInterpreter.pair_token_fields:
+        assert value == EngineResultInterpreter.bytes_to_Hash160str(snapshot[attribute])
+    else:
+        assert value == snapshot[attribute], (attribute, value, snapshot[attribute])
+assert pair['mintRatio'] == mint_ratio and pair['expiry'] == _30_days_later_ending_milisecond
+assert pair['collateralToken'] == Hash160Str.from_UInt160(neo.hash) and pair['settled'] is False
+
+# balances read from the storage are the same as balanceOf
+engine.set_NEP17_token_balance(neo, contract_owner_hash)
+engine.invoke_method_with_print("deposit", params=[contract_owner_hash, neo.hash, gas.hash, _30_days_later_ending_milisecond, mint_ratio, 100])
+assert engine.state == VMState.HALT
+rcToken = engine.rToken_storage(ruler.pair(pair_index)['rcToken'])
+engine.get_rToken_balance(pair['rcToken'], contract_owner_hash)
+balance = engine.analyze_results(result_decoded=True)[1]
+assert balance == rcToken.balance_of(contract_owner_hash) == engine.read_rToken_balance(pair['rcToken'], contract_owner_hash) > 0
+assert rcToken.total_supply() == balance and rcToken.decimals() == pair['rDecimals']
+assert list(rcToken.holders().values()) == [balance]
+assert ruler.pair(pair_index)['colTotal'] == 100
@@ -163,6 +163,17 @@ class Signer:
 
 
 class ResultInterpreter:
+    # fields returned by `getPairSnapshot` of ruler, in order
+    pair_snapshot_fields = ['active', 'feeRate', 'mintRatio', 'expiry', 'pairedToken', 'collateralToken',
+                            'rcToken', 'rrToken', 'colTotal',
+                            'colDecimals', 'pairedDecimals', 'rDecimals',
+                            'colToRMultiplier', 'colToRDivisor', 'rToColMultiplier', 'rToColDivisor',
+                            'usesLedger',
+                            'settled', 'defaultedLoanAmt', 'rcTokensEligibleAtExpiry',
+                            'rcTotalSupply', 'rrTotalSupply', 'pairedFees', 'expired']
+    pair_token_fields = {'pairedToken', 'collateralToken', 'rcToken', 'rrToken'}
+    pair_bool_fields = {'active', 'usesLedger', 'settled', 'expired'}
+
     @staticmethod
     def bytes_to_int(bytes_: bytes):
         return int.from_bytes(bytes_, byteorder='little', signed=False)
@@ -201,16 +212,48 @@ class EngineResultInterpreter(ResultInterpreter):
 
     @staticmethod
     def interpret_getPairAttribtutes(Pair: Dict[bytes, bytes]) -> Dict[str, Any]:
+        """
+        :param Pair: {attribute_name: value} returned by the packed pair layout,
+            or {b'pair_'{index}_{attribute_name}: value} returned by the legacy layout
+        """
         pair_attributes = dict()
         for k, v in zip(Pair.keys(), Pair.values()):
-            attribute_name = k.split(b'_')[2].decode()
-            if 'Token' in attribute_name:
+            if k.startswith(b'pair_'):
+                attribute_name = k.split(b'_')[2].decode()
+            else:
+                attribute_name = k.decode()
+            if attribute_name in EngineResultInterpreter.pair_token_fields:
                 attribute_value = EngineResultInterpreter.bytes_to_Hash160str(v)
             else:
                 attribute_value = ClientResultInterpreter.bytes_to_int(v)
             pair_attributes[attribute_name] = attribute_value
         return pair_attributes
 
+    @staticmethod
+    def interpret_getLivePairs(page: List) -> Tuple[bytes, List[int]]:
+        """
+        :param page: the array returned by `getLivePairs` (invoke with result_interpreted_as_array=True)
+        :return: cursor for the next page, [pair_index]
+        """
+        cursor, pair_indexes = page
+        return cursor, [EngineResultInterpreter.bytes_to_int(i) for i in pair_indexes]
+
+    @staticmethod
+    def interpret_getPairSnapshot(snapshot: List[bytes]) -> Dict[str, Any]:
+        """
+        :param snapshot: the array returned by `getPairSnapshot`, with each item as bytes
+            (invoke with result_interpreted_as_array=True)
+        """
+        pair_snapshot = dict()
+        for field, v in zip(EngineResultInterpreter.pair_snapshot_fields, snapshot):
+            if field in EngineResultInterpreter.pair_token_fields:
+                pair_snapshot[field] = EngineResultInterpreter.bytes_to_Hash160str(v)
+            elif field in EngineResultInterpreter.pair_bool_fields:
+                pair_snapshot[field] = EngineResultInterpreter.bytes_to_int(v) != 0
+            else:
+                pair_snapshot[field] = EngineResultInterpreter.bytes_to_int(v)
+        return pair_snapshot
+
 
 class ClientResultInterpreter(ResultInterpreter):
     @staticmethod
@@ -252,11 +295,41 @@ class ClientResultInterpreter(ResultInterpreter):
             fees_dict[ClientResultInterpreter.bytes_to_Hash160str(k[len(b'feesMap'):])] = ClientResultInterpreter.bytes_to_int(v)
         return fees_dict
     
+    @staticmethod
+    def interpret_getLivePairs(page: List) -> Tuple[bytes, List[int]]:
+        """
+        :param page: the array returned by `getLivePairs`, parsed by TestClient
+        :return: cursor for the next page, [pair_index]
+        """
+        cursor, pair_indexes = page
+        if type(cursor) is str:
+            cursor = cursor.encode()
+        elif type(cursor) is Hash160Str:
+            cursor = cursor.to_UInt160().to_array()
+        return cursor, pair_indexes
+
+    @staticmethod
+    def interpret_getPairSnapshot(snapshot: List) -> Dict[str, Any]:
+        """
+        :param snapshot: the array returned by `getPairSnapshot`, parsed by TestClient
+        """
+        pair_snapshot = dict()
+        for field, v in zip(ClientResultInterpreter.pair_snapshot_fields, snapshot):
+            if field in ClientResultInterpreter.pair_token_fields and type(v) is not Hash160Str:
+                v = ClientResultInterpreter.bytes_to_Hash160str(v if type(v) is bytes else v.encode())
+            pair_snapshot[field] = v
+        return pair_snapshot
+
     @staticmethod
     def interpret_getPairAttribtutes(Pair):
         pair_attributes = dict()
         for k, v in zip(Pair.keys(), Pair.values()):
-            if b'Token' in k:
+            if type(k) is str:
+                # Map returned by the packed pair layout, already parsed by TestClient
+                if k in ClientResultInterpreter.pair_token_fields and type(v) is not Hash160Str:
+                    v = ClientResultInterpreter.bytes_to_Hash160str(v if type(v) is bytes else v.encode())
+                pair_attributes[k] = v
+            elif b'Token' in k:
                 pair_attributes[k.split(b'_')[-1].decode()] = ClientResultInterpreter.bytes_to_Hash160str(v)
             else:
                 pair_attributes[k.split(b'_')[-1].decode()] = ClientResultInterpreter.bytes_to_int(v)
@@ -0,0 +1,42 @@
+from neo_test_with_vm import TestEngine
+
+from neo3.vm import IntegerStackItem, VMState
+from neo3.contracts import NeoToken, GasToken, LedgerContract
+neo, gas = NeoToken(), GasToken()
+from tests.utils import gen_expiry_timestamp_and_str_in_seconds
+
+contract_owner_hash = "6d629e44cceaf8722c99a41d5fb98cf3472c286a"
+engine = TestEngine('ruler.nef', signers=[contract_owner_hash])
+
+_30_days_later_ending_milisecond, _30_days_later_date_str = gen_expiry_timestamp_and_str_in_seconds(30)
+DECIMAL_BASE = 100_000_000
+mint_ratio = 7 * DECIMAL_BASE
+fee_rate = 0 * DECIMAL_BASE
+
+engine.invoke_method_with_print('deploy', [contract_owner_hash])
+engine.set_time(_30_days_later_ending_milisecond - 60_000)
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, mint_ratio, str(mint_ratio), fee_rate])
+assert engine.state == VMState.HALT and engine.result_stack.peek() == IntegerStackItem(1)
+
+# expiry earlier than the virtual time
+engine.advance(60)
+assert engine.time == _30_days_later_ending_milisecond
+engine.invoke_method_with_print("addPair", params=[neo.hash, gas.hash, _30_days_later_ending_milisecond, _30_days_later_date_str, 2 * mint_ratio, str(2 * mint_ratio), fee_rate])
+assert engine.state == VMState.FAULT
+
+engine.advance(0.001)
+engine.invoke_method_with_print('settle', [1])
+assert engine.state == VMState.HALT
+
+# block height
+height = engine.block_height
+checkpoint = engine.checkpoint()
+engine.advance_blocks(4)
+assert engine.block_height == height + 4
+assert engine.time == _30_days_later_ending_milisecond + 1 + 4 * TestEngine.MILLISECONDS_PER_BLOCK
+engine.invoke_method_of_arbitrary_contract(LedgerContract().hash, 'currentIndex')
+assert engine.result_stack.peek() == IntegerStackItem(height + 4)
+engine.restore(checkpoint)
+assert engine.block_height == height and engine.time == _30_days_later_ending_milisecond + 1
+engine.invoke_method_of_arbitrary_contract(LedgerContract().hash, 'currentIndex')
+assert engine.result_stack.peek() == IntegerStackItem(height)